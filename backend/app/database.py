@@ -2,12 +2,14 @@
 Database configuration and session management
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
+from app.services.telemetry import instrument_engine
+
 load_dotenv()
 
 # Database URL - defaults to SQLite for development
@@ -26,6 +28,8 @@ if DATABASE_URL.startswith("sqlite"):
 else:
     engine = create_engine(DATABASE_URL)
 
+instrument_engine(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -39,3 +43,64 @@ def get_db():
     finally:
         db.close()
 
+
+def add_columns(engine, table, names):
+    """Add columns introduced since a table was created; create_all skips existing tables
+
+    Only for nullable columns. Returns the names that were added.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    added = [name for name in names if name not in existing]
+    with engine.begin() as conn:
+        for name in added:
+            column_type = table.c[name].type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+    return added
+
+
+# Columns added to tables since they were first created
+NEW_COLUMNS = {
+    "videos": ["thumbnail_key", "transcript_model", "transcript_status", "transcript_job_id"],
+}
+
+
+def init_db():
+    """Create tables, then the columns, indexes and search index create_all skips on existing tables,
+    and convert JSON embedding columns to packed bytes
+
+    Every entry point (API, workers, CLIs) calls this before its first query,
+    so whichever opens an older database first brings it up to date.
+    """
+    # Models and services import this module
+    from app import models  # noqa: F401  (registers the tables)
+    from app.services.embedding_store import migrate_embedding_columns
+    from app.services.search_service import search_service
+
+    Base.metadata.create_all(bind=engine)
+
+    for name, columns in NEW_COLUMNS.items():
+        table = Base.metadata.tables[name]
+        try:
+            added = add_columns(engine, table, columns)
+            if added:
+                print(f"Added columns to {name}: {', '.join(added)}")
+        except Exception as e:
+            print(f"Error adding columns to {name}: {e}")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    # Embedding columns were JSON; convert any old values to packed bytes
+    try:
+        converted = migrate_embedding_columns(engine)
+        if converted:
+            print(f"Converted JSON embedding columns: {converted}")
+    except Exception as e:
+        print(f"Error converting embedding columns: {e}")
+
+    # Full-text index and the triggers that keep it current
+    if search_service is not None:
+        try:
+            search_service.ensure_index()
+        except Exception as e:
+            print(f"Error creating search index: {e}")
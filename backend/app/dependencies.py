@@ -2,6 +2,8 @@
 Dependencies for FastAPI routes
 """
 
+import os
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -11,6 +13,9 @@ from app.auth import decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# Comma-separated emails allowed to use the admin routes
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
 
 def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -43,3 +48,12 @@ def get_current_user(
     
     return user
 
+
+def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """Get current user, requiring their email to be listed in ADMIN_EMAILS"""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
@@ -2,16 +2,27 @@
 Main FastAPI application entry point
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import os
+import time
 
-from app.database import engine, Base
-from app.routers import auth, videos, documents, study_area, users
+from app.database import engine, init_db
+from app.routers import auth, videos, documents, study_area, users, thumbnails, traces, admin, search
+from app.services.chat_store import chat_store
+from app.services.executors import loop_monitor
+from app.services.fair_queue import CLASS_NAMES
+from app.services.http_cache import CompressionMiddleware
+from app.services.llm_service import generation_pool
+from app.services.profiler import request_profiler, instrument_engine as profile_engine
+from app.services.recommendation_service import recommendation_service
+from app.services.telemetry import HTTP_SECONDS, METRICS_ENABLED, registry, tracer
+from app.services.transcription_scheduler import transcription_scheduler
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create tables and bring older databases up to date
+init_db()
 
 app = FastAPI(
     title="NEST.ai API",
@@ -28,12 +39,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Brotli or gzip for JSON bodies; streams and media pass through
+app.add_middleware(CompressionMiddleware)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span and latency histogram per request; X-Trace-Id links to /api/traces"""
+    if not METRICS_ENABLED or request.url.path == "/metrics":
+        return await call_next(request)
+    
+    started = time.perf_counter()
+    status_code = 500
+    with tracer.span("http.request", method=request.method, path=request.url.path) as span:
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            # Label by route template, not raw path, to keep label cardinality bounded
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            span.set_attribute("route", route)
+            span.set_attribute("status", status_code)
+            HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                 route=route, status=status_code)
+    response.headers["X-Trace-Id"] = span.trace_id
+    return response
+
+
+async def profile_requests(request: Request, call_next):
+    """Sample-profile a fraction of requests, keeping any that run past PROFILE_SLOW_MS"""
+    capture = request_profiler.start(request.method, request.url.path)
+    if capture is None:
+        return await call_next(request)
+
+    started = time.perf_counter()
+    response = None
+    try:
+        response = await call_next(request)
+        return response
+    finally:
+        request_profiler.finish(
+            capture, (time.perf_counter() - started) * 1000,
+            status=response.status_code if response else 500,
+            route=getattr(request.scope.get("route"), "path", "unmatched"),
+            trace_id=response.headers.get("X-Trace-Id") if response else None
+        )
+
+
+# Registered only when enabled, so the default costs nothing per request
+if request_profiler.enabled:
+    profile_engine(engine)
+    app.middleware("http")(profile_requests)
+
+
+# Queue depths are read from the queues at scrape time
+def _transcription_jobs():
+    counts = transcription_scheduler.broker.counts()
+    return {(name, state): counts.get((priority, state), {"jobs": 0})["jobs"]
+            for priority, name in CLASS_NAMES.items() for state in ("queued", "running")}
+
+
+registry.gauge(
+    "nest_transcription_jobs", "Transcription jobs by priority class and state", ["class", "state"],
+    callback=_transcription_jobs
+)
+registry.gauge(
+    "nest_transcription_backlog_seconds", "Seconds of audio awaiting a first transcript",
+    callback=lambda: {(): transcription_scheduler.backlog_seconds}
+)
+registry.gauge(
+    "nest_generation_pending", "Chat answers being generated or waiting for a worker",
+    callback=lambda: {(): generation_pool.pending}
+)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(videos.router, prefix="/api/videos", tags=["Videos"])
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(study_area.router, prefix="/api/study", tags=["Study Area"])
+app.include_router(thumbnails.router, prefix="/api/thumbnails", tags=["Thumbnails"])
+app.include_router(traces.router, prefix="/api/traces", tags=["Traces"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 # Mount static files for uploaded content
 os.makedirs("uploads/videos", exist_ok=True)
@@ -43,11 +130,34 @@ os.makedirs("uploads/thumbnails", exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 
+@app.on_event("startup")
+async def resume_background_work():
+    """Re-queue transcriptions pending when the server stopped; schedule recommendation builds and chat archiving"""
+    transcription_scheduler.recover()
+    # Logs the stack of anything that stalls the event loop past LOOP_BLOCK_MS
+    loop_monitor.start()
+    # Builds at once if the lists are missing or stale, then every RECOMMEND_REBUILD_SECONDS
+    recommendation_service.start()
+    chat_store.start()
+
+
+@app.on_event("shutdown")
+async def flush_chat_history():
+    """Write chat turns still queued in memory before the process exits"""
+    chat_store.flush()
+
+
 @app.get("/")
 async def root():
     return {"message": "NEST.ai API", "version": "1.0.0"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy"}
@@ -2,7 +2,7 @@
 Database models
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Boolean, JSON, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -36,12 +36,16 @@ class Video(Base):
     description = Column(Text, nullable=True)
     file_path = Column(String, nullable=False)
     thumbnail_path = Column(String, nullable=True)
+    thumbnail_key = Column(String, nullable=True, index=True)  # content hash of the thumbnail cache entry
     duration = Column(Float, nullable=True)  # in seconds
     subject = Column(String, nullable=True)
     topic = Column(String, nullable=True)
     level = Column(String, nullable=True)  # e.g., "High School", "College"
     transcript = Column(Text, nullable=True)
-    transcript_embeddings = Column(JSON, nullable=True)  # Store embeddings for AI context
+    transcript_model = Column(String, nullable=True)  # Whisper tier that produced the transcript
+    transcript_status = Column(String, nullable=True)  # queued, processing, draft, completed, failed
+    transcript_job_id = Column(String, nullable=True)  # latest background job for the transcript
+    transcript_embeddings = Column(LargeBinary, nullable=True)  # indexed vector, see embedding_store.pack_embedding
     uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     views_count = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -52,6 +56,17 @@ class Video(Base):
     watch_history = relationship("WatchHistory", back_populates="video")
 
 
+class TranscriptSegments(Base):
+    """Whisper segment timings of a video transcript, packed as little-endian uint32 arrays"""
+    __tablename__ = "transcript_segments"
+
+    video_id = Column(Integer, ForeignKey("videos.id"), primary_key=True)
+    count = Column(Integer, nullable=False)
+    offsets = Column(LargeBinary, nullable=False)  # character offset of each segment in Video.transcript
+    starts = Column(LargeBinary, nullable=False)  # milliseconds
+    ends = Column(LargeBinary, nullable=False)  # milliseconds
+
+
 class Document(Base):
     """Document model"""
     __tablename__ = "documents"
@@ -61,7 +76,7 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_type = Column(String, nullable=False)  # pdf, docx, pptx, txt
     content = Column(Text, nullable=True)  # Extracted text content
-    content_embeddings = Column(JSON, nullable=True)  # Store embeddings for AI context
+    content_embeddings = Column(LargeBinary, nullable=True)  # indexed vector, see embedding_store.pack_embedding
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -86,6 +101,29 @@ class WatchHistory(Base):
     user = relationship("User", back_populates="watch_history")
     video = relationship("Video", back_populates="watch_history")
 
+    __table_args__ = (
+        Index("ix_watch_history_user_video", "user_id", "video_id"),
+    )
+
+
+class RecommendationList(Base):
+    """Precomputed top-N videos: related to a video, picked for a user, or popular overall"""
+    __tablename__ = "recommendations"
+
+    key = Column(String, primary_key=True)  # "video:<id>", "user:<id>" or "popular"
+    items = Column(JSON, nullable=False)  # [[video_id, score, source], ...] best first
+    built_at = Column(Float, nullable=False)  # epoch seconds
+
+
+class LearningContext(Base):
+    """Materialized learning-context summary of one user, updated as they watch and upload"""
+    __tablename__ = "learning_contexts"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    summary = Column(JSON, nullable=False)  # recent items with short extracts, counts, subjects
+    built_at = Column(Float, nullable=False)  # last full rebuild, epoch seconds
+    updated_at = Column(Float, nullable=False)  # last change of any kind, epoch seconds
+
 
 class ChatHistory(Base):
     """Chat history for Study Area"""
@@ -102,3 +140,50 @@ class ChatHistory(Base):
     # Relationships
     user = relationship("User", back_populates="chat_history")
 
+    __table_args__ = (
+        # Newest-first pages and keyset cursors for one user
+        Index("ix_chat_history_user_created", "user_id", "created_at", "id"),
+    )
+
+
+class ChatArchive(Base):
+    """Chat turns past retention, compacted into one compressed blob per run and user"""
+    __tablename__ = "chat_archives"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    first_id = Column(Integer, nullable=False)  # ChatHistory ids covered, oldest and newest
+    last_id = Column(Integer, nullable=False)
+    first_at = Column(DateTime(timezone=True), nullable=True)
+    last_at = Column(DateTime(timezone=True), nullable=True)
+    turns = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False)  # JSON size before compression
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed JSON list of turns, oldest first
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_chat_archives_user_last", "user_id", "last_id"),
+    )
+
+
+class BackgroundJob(Base):
+    """Queued media work shared by API servers and workers (JOB_BROKER=database)"""
+    __tablename__ = "background_jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, index=True)  # queued, running, completed, failed
+    priority = Column(Integer, nullable=False)
+    tenant = Column(String, nullable=True)
+    cost = Column(Float, default=1.0)
+    virtual_start = Column(Float, default=0.0)  # fair-queuing tags, see DatabaseBroker
+    virtual_finish = Column(Float, default=0.0)
+    enqueued_at = Column(Float, nullable=False)  # epoch seconds, compared across nodes
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(Float, nullable=True)
+    progress = Column(Float, default=0.0)
+    data = Column(JSON, nullable=False)  # full job record
+
+    __table_args__ = (
+        Index("ix_background_jobs_claim", "status", "priority", "virtual_finish"),
+    )
@@ -1,4 +1,4 @@
 # Router modules
-from . import auth, videos, documents, study_area, users
+from . import auth, videos, documents, study_area, users, thumbnails, traces, admin, search
 
-__all__ = ['auth', 'videos', 'documents', 'study_area', 'users']
+__all__ = ['auth', 'videos', 'documents', 'study_area', 'users', 'thumbnails', 'traces', 'admin', 'search']
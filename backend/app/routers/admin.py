@@ -0,0 +1,131 @@
+"""
+Admin routes
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.dependencies import get_admin_user
+from app.models import User
+from app.services.ai_service import get_ai_service
+from app.services.chat_store import chat_store
+from app.services.executors import loop_monitor, runs_in
+from app.services.profiler import request_profiler
+from app.services.recommendation_service import recommendation_service
+from app.services.search_service import search_service
+
+router = APIRouter()
+
+
+@router.get("/profiles")
+async def list_profiles(
+    limit: int = 20,
+    admin: User = Depends(get_admin_user)
+):
+    """Recent sampled and slow-request captures, newest first"""
+    return {
+        "enabled": request_profiler.enabled,
+        "sample_rate": request_profiler.sample_rate,
+        "slow_ms": request_profiler.slow_ms,
+        "captures": request_profiler.recent(min(max(limit, 1), 200))
+    }
+
+
+@router.get("/profiles/{capture_id}")
+async def get_profile(
+    capture_id: int,
+    top: int = 20,
+    admin: User = Depends(get_admin_user)
+):
+    """One capture with its SQL statements and hottest stacks"""
+    capture = request_profiler.get(capture_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return capture.to_dict(top=min(max(top, 1), 500))
+
+
+@router.get("/profiles/{capture_id}/folded")
+async def get_profile_folded(
+    capture_id: int,
+    admin: User = Depends(get_admin_user)
+):
+    """Collapsed stacks for flamegraph.pl, speedscope or inferno"""
+    capture = request_profiler.get(capture_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return PlainTextResponse(capture.folded())
+
+
+@router.post("/search/rebuild")
+@runs_in("db")
+def rebuild_search_index(admin: User = Depends(get_admin_user)):
+    """Re-read all videos and documents into the full-text index"""
+    if search_service is None:
+        raise HTTPException(status_code=503, detail="Search is not available for this database")
+    search_service.rebuild()
+    return {"backend": search_service.name, "status": "rebuilt"}
+
+
+@router.post("/recommendations/rebuild")
+@runs_in("db")
+def rebuild_recommendations(
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute related videos and user picks now; returns counts and stage timings"""
+    return recommendation_service.build(db)
+
+
+@router.get("/recommendations")
+@runs_in("db")
+def get_recommendation_stats(
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """When the lists were last built, and the last build's numbers from this process"""
+    return {"built_at": recommendation_service.built_at(db), "last_build": recommendation_service.last_build}
+
+
+@router.post("/chat/archive")
+@runs_in("db")
+def archive_chat_history(
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Compact chat turns past CHAT_ARCHIVE_AFTER_DAYS and apply CHAT_ARCHIVE_KEEP_DAYS now"""
+    return chat_store.archive(db)
+
+
+@router.get("/chat")
+@runs_in("db")
+def get_chat_storage_stats(
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Live and archived chat turns, archive compression and unwritten turns in this process"""
+    return chat_store.stats(db)
+
+
+@router.get("/vectors")
+@runs_in("embedding")
+def get_vector_store_stats(admin: User = Depends(get_admin_user)):
+    """Vector store backend, rows, deleted rows awaiting compaction and file sizes"""
+    return get_ai_service().vector_stats()
+
+
+@router.post("/vectors/compact")
+@runs_in("db")
+def compact_vector_store(admin: User = Depends(get_admin_user)):
+    """Rewrite the mmap vector store without deleted rows and rebuild its IVF lists now"""
+    return get_ai_service().compact_vectors()
+
+
+@router.get("/loop")
+async def get_loop_stats(
+    limit: int = 20,
+    admin: User = Depends(get_admin_user)
+):
+    """Event-loop lag, recent stalls with the stack that caused them, and executor queues"""
+    return {**loop_monitor.stats(), "recent_blocks": loop_monitor.recent(min(max(limit, 1), 50))}
@@ -10,12 +10,14 @@ from app.models import User
 from app.schemas import UserCreate, UserResponse, Token
 from app.auth import verify_password, get_password_hash, create_access_token
 from app.dependencies import get_current_user
+from app.services.executors import runs_in
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+@runs_in("auth")
+def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
     existing_user = db.query(User).filter(User.email == user_data.email).first()
@@ -40,7 +42,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(
+@runs_in("auth")
+def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -14,6 +14,10 @@ from app.dependencies import get_current_user
 from app.models import User, Document
 from app.schemas import DocumentCreate, DocumentResponse
 from app.services.document_service import DocumentService
+from app.services.embedding_store import save_embeddings
+from app.services.executors import call, runs_in
+from app.services.learning_context import learning_context
+from app.services.telemetry import stage
 
 router = APIRouter()
 document_service = DocumentService()
@@ -22,7 +26,8 @@ ALLOWED_EXTENSIONS = {".pdf", ".docx", ".pptx", ".txt"}
 
 
 @router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
-async def upload_document(
+@runs_in("db")
+def upload_document(
     file: UploadFile = File(...),
     title: str = Form(...),
     current_user: User = Depends(get_current_user),
@@ -43,12 +48,12 @@ async def upload_document(
     
     # Save file
     file_path = upload_dir / f"{current_user.id}_{file.filename}"
-    with open(file_path, "wb") as buffer:
+    with stage("upload.write"), open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
     # Extract text content
     file_type = file_ext[1:]  # Remove the dot
-    content = document_service.extract_text(str(file_path), file_type)
+    content = call("extraction", document_service.extract_text, str(file_path), file_type)
     
     # Create document record
     db_document = Document(
@@ -59,26 +64,33 @@ async def upload_document(
         owner_id=current_user.id
     )
     db.add(db_document)
+    db.flush()
+    learning_context.add_document(db, db_document)
     db.commit()
     db.refresh(db_document)
     
-    # Store document in AI context
+    # Store document in AI context, and its vector with the row for rebuilding the index
     if content:
-        from app.services.ai_service import AIService
-        ai_service = AIService()
-        ai_service.store_context(
+        from app.services.ai_service import get_ai_service
+        vector = call(
+            "embedding",
+            get_ai_service().store_context,
             current_user.id,
             "document",
             db_document.id,
             content,
             {"title": title, "type": file_type}
         )
+        if vector is not None:
+            save_embeddings(db, "document", {db_document.id: vector})
+            db.commit()
     
     return DocumentResponse.from_orm(db_document)
 
 
 @router.get("/", response_model=List[DocumentResponse])
-async def list_documents(
+@runs_in("db")
+def list_documents(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -91,7 +103,8 @@ async def list_documents(
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
-async def get_document(
+@runs_in("db")
+def get_document(
     document_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -109,7 +122,8 @@ async def get_document(
 
 
 @router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_document(
+@runs_in("db")
+def delete_document(
     document_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -126,6 +140,12 @@ async def delete_document(
     if os.path.exists(document.file_path):
         os.remove(document.file_path)
     
+    # Remove document from AI context
+    if document.content:
+        from app.services.ai_service import get_ai_service
+        call("embedding", get_ai_service().remove_context, current_user.id, "document", document.id)
+    
+    learning_context.remove_document(db, current_user.id, document.id)
     db.delete(document)
     db.commit()
     return None
@@ -0,0 +1,54 @@
+"""
+Search routes
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.dependencies import get_current_user
+from app.models import User
+from app.services.executors import runs_in
+from app.services.search_service import KINDS, search_service
+from app.services.transcript_segments import find_moments
+
+router = APIRouter()
+
+
+@router.get("/")
+@runs_in("db")
+def search(
+    q: str,
+    kind: Optional[str] = Query(None, alias="type"),
+    skip: int = 0,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """Ranked full-text search over videos and your documents, with highlighted snippets"""
+    if search_service is None:
+        raise HTTPException(status_code=503, detail="Search is not available for this database")
+    if kind and kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"type must be one of: {', '.join(KINDS)}")
+    
+    skip, limit = max(skip, 0), min(max(limit, 1), 100)
+    result = search_service.search(q, current_user.id, kind=kind, skip=skip, limit=limit)
+    result.update(skip=skip, limit=limit)
+    return result
+
+
+@router.get("/moments")
+@runs_in("db")
+def search_moments(
+    q: str,
+    video_id: Optional[int] = None,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Where in a video something is said: timestamped transcript segments with deep links"""
+    if video_id is None and search_service is None:
+        raise HTTPException(status_code=503, detail="Search is not available for this database")
+    
+    limit = min(max(limit, 1), 100)
+    return {"query": q, "moments": find_moments(db, q, current_user.id, video_id=video_id, limit=limit)}
@@ -2,79 +2,294 @@
 Study Area (AI Chatbot) routes
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import json
+import time
 
 from app.database import get_db
 from app.dependencies import get_current_user
-from app.models import User, ChatHistory
+from app.models import User
 from app.schemas import ChatMessage, ChatResponse, ChatHistoryResponse
-from app.services.ai_service import AIService
+from app.services.ai_service import get_ai_service
+from app.services.chat_cache import chat_cache
+from app.services.chat_store import chat_store
+from app.services.conversation import conversation
+from app.services.executors import run, runs_in
+from app.services.http_cache import etag_response, make_etag, not_modified, not_modified_response
+from app.services.learning_context import CONTEXT_PAGE_CHARS, learning_context
+from app.services.llm_service import GenerationQueueFull, Prompt, generation_pool
 
 router = APIRouter()
-ai_service = AIService()
+ai_service = get_ai_service()
+
+# Sources retrieved per question; the context packer picks passages from them
+CONTEXT_CANDIDATES = 5
+
+
+class _ChatTurn:
+    """Retrieval result for one chat message, including any cached answer"""
+
+    def __init__(self, user_id: int, message: str, max_tokens: Optional[int] = None):
+        self.user_id = user_id
+        self.message = message
+        self.max_tokens = generation_pool.budget(max_tokens)
+        self.started = time.perf_counter()
+        ai_service.sync_chat_cache(user_id)
+        self.version = chat_cache.corpus_version(user_id)
+        self.query_embedding = None
+        self.response: Optional[str] = None
+        self.citations: List[dict] = []
+        self.built: Optional[Prompt] = None
+        
+        # Follow-ups are searched and cached under a standalone query
+        self.plan = conversation.plan(user_id, message, self.version)
+        self.query = self.plan.query
+        
+        # Exact repeat of a question: reuse the whole answer
+        cached = chat_cache.get_answer(user_id, self.query, self.max_tokens)
+        if cached is not None:
+            self.outcome = "exact"
+            self.contexts = cached["contexts"]
+            self.response = cached["response"]
+            self.citations = cached.get("citations") or []
+            return
+        
+        # Follow-up about the last answer: reuse its packed context, no search
+        if self.plan.kind == "reuse":
+            self.outcome = "reuse"
+            self.contexts = self.plan.previous.sources
+            return
+        
+        # Near-duplicate question: reuse the retrieved sources, fetched again by id
+        self.query_embedding = ai_service.embed_query(self.query)
+        cached_refs = chat_cache.get_contexts(user_id, self.query_embedding)
+        self.contexts = ai_service.get_contexts(user_id, cached_refs) if cached_refs else None
+        self.outcome = "semantic"
+        if not self.contexts:
+            self.outcome = "miss"
+            self.contexts = ai_service.search_relevant_context(
+                user_id,
+                self.query,
+                top_k=CONTEXT_CANDIDATES,
+                query_embedding=self.query_embedding
+            )
+    
+    @property
+    def context_used(self) -> Optional[str]:
+        if self.contexts:
+            return self.contexts[0]['metadata'].get('type', 'general')
+        return None
+    
+    def prompt(self):
+        """Reranked, budget-packed prompt; records the citations it used"""
+        if self.outcome == "reuse":
+            # Same context text as the last answer, so prefix caching applies too
+            previous = self.plan.previous
+            prompt = Prompt(question=self.plan.question, context=previous.context, citations=previous.citations)
+        else:
+            prompt = ai_service.build_prompt(self.query, self.contexts, self.query_embedding)
+            prompt.question = self.plan.question
+        self.built = prompt
+        self.citations = prompt.citations
+        return prompt
+    
+    def finish(self, response_text: str):
+        """Cache a newly generated answer, remember the turn and record cache metrics"""
+        if self.outcome != "exact":
+            chat_cache.put(self.user_id, self.query,
+                           self.query_embedding if self.outcome == "miss" else None,
+                           self.contexts, response_text, version=self.version,
+                           citations=self.citations, max_tokens=self.max_tokens)
+        if self.outcome != "reuse":
+            chat_cache.record(self.outcome, time.perf_counter() - self.started)
+        
+        # Passage text stays in the packed context; sources keep only what context_used needs
+        sources = [{key: value for key, value in context.items() if key != 'content'}
+                   for context in self.contexts or []]
+        conversation.record(self.user_id, self.message, self.query, self.version,
+                            context=self.built.context if self.built else None,
+                            citations=self.citations, sources=sources)
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     message: ChatMessage,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Send a message to the AI study assistant"""
-    # Search for relevant context
-    contexts = ai_service.search_relevant_context(
-        current_user.id,
-        message.message,
-        top_k=3
-    )
+    # Query embedding, vector search and reranking run on the embedding pool
+    turn = await run("embedding", _ChatTurn, current_user.id, message.message, message.max_tokens)
     
-    # Generate response
-    response_text = ai_service.generate_response(message.message, contexts)
+    response_text = turn.response
+    if response_text is None:
+        if not turn.contexts:
+            response_text = ai_service.generate_response(message.message, turn.contexts)
+        else:
+            # Generate response on the bounded generation pool
+            try:
+                prompt = await run("embedding", turn.prompt)
+                response_text = await generation_pool.generate(prompt, message.max_tokens)
+            except GenerationQueueFull as e:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    turn.finish(response_text)
     
-    # Determine context used
-    context_used = None
-    if contexts:
-        context_used = contexts[0]['metadata'].get('type', 'general')
+    # Written in the next batch, off the response path
+    chat_store.add(current_user.id, message.message, response_text,
+                   message.context_type or turn.context_used, message.context_id)
     
-    # Save to chat history
-    chat_entry = ChatHistory(
-        user_id=current_user.id,
-        message=message.message,
+    return ChatResponse(
         response=response_text,
-        context_type=message.context_type or context_used,
-        context_id=message.context_id
+        context_used=turn.context_used,
+        citations=turn.citations
     )
-    db.add(chat_entry)
-    db.commit()
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    message: ChatMessage,
+    current_user: User = Depends(get_current_user)
+):
+    """Send a message and stream the answer as server-sent events"""
+    # Query embedding, vector search and reranking run on the embedding pool
+    turn = await run("embedding", _ChatTurn, current_user.id, message.message, message.max_tokens)
     
-    return ChatResponse(
-        response=response_text,
-        context_used=context_used
+    if turn.response is None and turn.contexts and generation_pool.pending >= generation_pool.capacity:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many answers are being generated, try again shortly"
+        )
+    
+    async def events():
+        yield _sse({"context_used": turn.context_used}, event="start")
+        
+        if turn.response is not None:
+            tokens = [turn.response]
+        elif not turn.contexts:
+            tokens = [ai_service.generate_response(message.message, turn.contexts)]
+        else:
+            tokens = None
+        
+        parts = []
+        try:
+            if tokens is not None:
+                for token in tokens:
+                    parts.append(token)
+                    yield _sse({"token": token})
+            else:
+                prompt = await run("embedding", turn.prompt)
+                yield _sse({"citations": turn.citations}, event="citations")
+                async for token in generation_pool.stream(prompt, message.max_tokens):
+                    parts.append(token)
+                    yield _sse({"token": token})
+        except GenerationQueueFull as e:
+            yield _sse({"detail": str(e)}, event="error")
+            return
+        
+        response_text = "".join(parts)
+        turn.finish(response_text)
+        chat_store.add(current_user.id, message.message, response_text,
+                       message.context_type or turn.context_used, message.context_id)
+        yield _sse({"context_used": turn.context_used, "citations": turn.citations}, event="done")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
 @router.get("/history", response_model=List[ChatHistoryResponse])
-async def get_chat_history(
+@runs_in("db")
+def get_chat_history(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    limit: int = 50
+    limit: int = 50,
+    before: Optional[int] = None
 ):
-    """Get chat history"""
-    history = db.query(ChatHistory).filter(
-        ChatHistory.user_id == current_user.id
-    ).order_by(ChatHistory.created_at.desc()).limit(limit).all()
+    """Get chat history, oldest first; pass X-Next-Before as before= for the page preceding it"""
+    # Turns still queued for writing belong on the newest page
+    if before is None and chat_store.pending(current_user.id):
+        chat_store.flush()
+    
+    limit = min(max(limit, 1), 200)
+    history, next_before = chat_store.page(db, current_user.id, limit=limit, before=before)
     
-    return [ChatHistoryResponse.from_orm(entry) for entry in reversed(history)]
+    # Chat entries are never edited, so the ids on the page are its version
+    etag = make_etag(current_user.id, limit, before, [entry["id"] for entry in history])
+    if not_modified(request, etag):
+        return not_modified_response(etag, private=True)
+    response = etag_response([ChatHistoryResponse(**entry) for entry in reversed(history)], etag, private=True)
+    if next_before is not None:
+        response.headers["X-Next-Before"] = str(next_before)
+    return response
 
 
 @router.get("/context")
-async def get_learning_context(
+@runs_in("db")
+def get_learning_context(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get user's learning context summary: recent items with extracts, counts and subjects"""
+    row = learning_context.get(db, current_user.id)
+    etag = make_etag(current_user.id, row.updated_at)
+    if not_modified(request, etag):
+        return not_modified_response(etag, private=True)
+    return etag_response(row.summary, etag, private=True)
+
+
+@router.get("/context/videos")
+@runs_in("db")
+def get_context_videos(
+    skip: int = 0,
+    limit: int = 20,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's learning context summary"""
-    context = ai_service.get_user_context(current_user.id, db)
-    return context
+    """Page through every watched video as context summary entries"""
+    return learning_context.watched_page(db, current_user.id, max(skip, 0), min(max(limit, 1), 100))
+
+
+@router.get("/context/documents")
+@runs_in("db")
+def get_context_documents(
+    skip: int = 0,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Page through every document as context summary entries"""
+    return learning_context.documents_page(db, current_user.id, max(skip, 0), min(max(limit, 1), 100))
+
+
+@router.get("/context/{kind}/{item_id}/content")
+@runs_in("db")
+def get_context_content(
+    kind: str,
+    item_id: int,
+    offset: int = 0,
+    length: int = CONTEXT_PAGE_CHARS,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Full transcript or document text, one page of characters at a time"""
+    page = learning_context.content_page(db, current_user.id, kind, item_id, offset, length)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Content not found")
+    return page
+
 
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """Chat cache hit ratio and latency saved, and how often follow-ups skipped retrieval"""
+    return {**chat_cache.stats(), "conversation": conversation.stats()}
@@ -0,0 +1,39 @@
+"""
+Thumbnail routes
+"""
+
+import re
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from app.services.thumbnail_service import thumbnail_service, CACHE_FILES
+
+router = APIRouter()
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".vtt": "text/vtt",
+}
+
+# Cache keys are content hashes, so a URL never changes meaning
+CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+
+@router.get("/{key}/{name}")
+async def get_thumbnail(key: str, name: str):
+    """Serve a cached thumbnail, sprite sheet or sprite VTT index"""
+    if not KEY_PATTERN.match(key) or name not in CACHE_FILES:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    path = thumbnail_service.cache_path(key) / name
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[path.suffix],
+        headers=CACHE_HEADERS
+    )
@@ -0,0 +1,32 @@
+"""
+Trace routes
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.dependencies import get_admin_user
+from app.models import User
+from app.services.telemetry import tracer
+
+router = APIRouter()
+
+
+@router.get("/")
+async def list_traces(
+    limit: int = 20,
+    admin: User = Depends(get_admin_user)
+):
+    """Latest traces kept in memory, newest first"""
+    return tracer.recent(min(max(limit, 1), 200))
+
+
+@router.get("/{trace_id}")
+async def get_trace(
+    trace_id: str,
+    admin: User = Depends(get_admin_user)
+):
+    """All spans of one trace in start order (trace ids are returned in X-Trace-Id)"""
+    spans = tracer.trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": trace_id, "spans": spans}
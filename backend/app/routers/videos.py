@@ -2,25 +2,38 @@
 Video routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status, UploadFile, File, Form
+from sqlalchemy.orm import Session, joinedload
 from typing import Optional, List
+from datetime import datetime, timezone
 import os
 import shutil
 from pathlib import Path
 
 from app.database import get_db
-from app.dependencies import get_current_user
-from app.models import User, Video, WatchHistory
+from app.dependencies import get_admin_user, get_current_user
+from app.models import RecommendationList, TranscriptSegments, User, Video, WatchHistory
 from app.schemas import VideoCreate, VideoResponse, VideoListResponse, WatchHistoryCreate, WatchHistoryResponse
+from app.services.executors import call, runs_in
+from app.services.http_cache import (
+    cache_headers, etag_response, make_etag, not_modified, not_modified_response, row_version,
+    video_list_cache
+)
+from app.services.learning_context import learning_context
+from app.services.recommendation_service import recommendation_service
 from app.services.video_service import VideoService
+from app.services.thumbnail_service import generate_video_thumbnails
+from app.services.telemetry import stage, tracer
+from app.services.transcription_scheduler import transcription_scheduler
 
 router = APIRouter()
 video_service = VideoService()
 
 
 @router.post("/upload", response_model=VideoResponse, status_code=status.HTTP_201_CREATED)
-async def upload_video(
+@runs_in("db")
+def upload_video(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: str = Form(...),
     description: Optional[str] = Form(None),
@@ -37,53 +50,34 @@ async def upload_video(
     
     # Save file
     file_path = upload_dir / f"{current_user.id}_{file.filename}"
-    with open(file_path, "wb") as buffer:
+    with stage("upload.write"), open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
     # Get video duration
-    duration = video_service.get_video_duration(str(file_path))
-    
-    # Generate thumbnail
-    thumbnail_dir = Path("uploads/thumbnails")
-    thumbnail_dir.mkdir(parents=True, exist_ok=True)
-    thumbnail_path = thumbnail_dir / f"{file_path.stem}.jpg"
-    video_service.generate_thumbnail(str(file_path), str(thumbnail_path))
+    duration = call("media", video_service.get_video_duration, str(file_path))
     
     # Create video record
     db_video = Video(
         title=title,
         description=description,
         file_path=str(file_path),
-        thumbnail_path=str(thumbnail_path) if thumbnail_path.exists() else None,
         duration=duration,
         subject=subject,
         topic=topic,
         level=level,
+        transcript_status="queued",
         uploader_id=current_user.id
     )
     db.add(db_video)
     db.commit()
     db.refresh(db_video)
+    video_list_cache.invalidate()
     
-    # Transcribe video in background (async processing)
-    try:
-        transcription = video_service.transcribe_video(str(file_path))
-        db_video.transcript = transcription.get("text", "")
-        db.commit()
-        
-        # Store transcript in AI context
-        from app.services.ai_service import AIService
-        ai_service = AIService()
-        if db_video.transcript:
-            ai_service.store_context(
-                current_user.id,
-                "video",
-                db_video.id,
-                db_video.transcript,
-                {"title": title, "subject": subject, "topic": topic}
-            )
-    except Exception as e:
-        print(f"Error transcribing video: {e}")
+    # Thumbnails and the preview sprite are rendered off the request path
+    background_tasks.add_task(generate_video_thumbnails, db_video.id, str(file_path), tracer.context())
+    
+    # Transcribe in the background; the tier depends on the current backlog
+    transcription_scheduler.submit(db_video.id, current_user.id, str(file_path), duration)
     
     # Add uploader name
     response = VideoResponse.from_orm(db_video)
@@ -92,7 +86,9 @@ async def upload_video(
 
 
 @router.get("/", response_model=VideoListResponse)
-async def list_videos(
+@runs_in("db")
+def list_videos(
+    request: Request,
     subject: Optional[str] = None,
     topic: Optional[str] = None,
     level: Optional[str] = None,
@@ -101,6 +97,15 @@ async def list_videos(
     db: Session = Depends(get_db)
 ):
     """List all videos with optional filters"""
+    # The catalog is the same for every visitor, so pages are cached briefly
+    key = (subject, topic, level, skip, limit)
+    cached = video_list_cache.get(key)
+    if cached is not None:
+        etag, body = cached
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        return Response(content=body, media_type="application/json", headers=cache_headers(etag))
+    
     query = db.query(Video)
     
     if subject:
@@ -111,8 +116,15 @@ async def list_videos(
         query = query.filter(Video.level == level)
     
     total = query.count()
-    videos = query.order_by(Video.created_at.desc()).offset(skip).limit(limit).all()
+    page = query.order_by(Video.created_at.desc()).offset(skip).limit(limit)
     
+    # Check the client's copy against row versions before loading full rows
+    versions = page.with_entities(Video.id, Video.updated_at, Video.created_at, Video.views_count).all()
+    etag = make_etag(key, total, [row_version(v) for v in versions])
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    videos = page.all()
     video_responses = []
     for video in videos:
         vr = VideoResponse.from_orm(video)
@@ -120,12 +132,44 @@ async def list_videos(
             vr.uploader_name = video.uploader.full_name or video.uploader.email
         video_responses.append(vr)
     
-    return VideoListResponse(videos=video_responses, total=total)
+    response = etag_response(VideoListResponse(videos=video_responses, total=total),
+                             make_etag(key, total, [row_version(v) for v in videos]))
+    video_list_cache.put(key, response.headers["etag"], response.body)
+    return response
+
+
+@router.get("/transcription/queue")
+@runs_in("db")
+def get_transcription_queue(admin: User = Depends(get_admin_user)):
+    """Transcription backlog, model tier settings and what each worker is running"""
+    return transcription_scheduler.stats()
+
+
+@router.get("/{video_id}/transcription")
+@runs_in("db")
+def get_transcription_status(
+    video_id: int,
+    db: Session = Depends(get_db)
+):
+    """Transcript status and progress of the latest transcription job"""
+    video = db.query(Video).filter(Video.id == video_id).first()
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    job = transcription_scheduler.job_status(video.transcript_job_id) if video.transcript_job_id else None
+    return {
+        "video_id": video.id,
+        "status": video.transcript_status,
+        "model": video.transcript_model,
+        "job": job
+    }
 
 
 @router.get("/{video_id}", response_model=VideoResponse)
-async def get_video(
+@runs_in("db")
+def get_video(
     video_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Get video details"""
@@ -133,37 +177,132 @@ async def get_video(
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    # Increment view count
-    video.views_count += 1
+    # Revalidating a copy the client already has is not a new view
+    etag = make_etag(row_version(video))
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    # Increment view count atomically, leaving updated_at to content changes
+    db.query(Video).filter(Video.id == video_id).update(
+        {Video.views_count: Video.views_count + 1, Video.updated_at: Video.updated_at},
+        synchronize_session=False
+    )
     db.commit()
+    db.refresh(video)
     
     response = VideoResponse.from_orm(video)
     if video.uploader:
         response.uploader_name = video.uploader.full_name or video.uploader.email
-    return response
+    return etag_response(response, make_etag(row_version(video)))
+
+
+def _ranked_videos(db: Session, items: List[List]) -> List[VideoResponse]:
+    """Responses for recommendation items in their order, skipping videos deleted since the build"""
+    video_ids = [item[0] for item in items]
+    if not video_ids:
+        return []
+    videos = {video.id: video for video in
+              db.query(Video).options(joinedload(Video.uploader)).filter(Video.id.in_(video_ids)).all()}
+    responses = []
+    for video_id in video_ids:
+        video = videos.get(video_id)
+        if video is None:
+            continue
+        vr = VideoResponse.from_orm(video)
+        if video.uploader:
+            vr.uploader_name = video.uploader.full_name or video.uploader.email
+        responses.append(vr)
+    return responses
+
+
+@router.get("/{video_id}/related", response_model=List[VideoResponse])
+@runs_in("db")
+def get_related_videos(
+    video_id: int,
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    """Videos watched by the same viewers or close in content, from the precomputed lists"""
+    return _ranked_videos(db, recommendation_service.related(db, video_id, limit))
+
+
+@router.delete("/{video_id}", status_code=status.HTTP_204_NO_CONTENT)
+@runs_in("db")
+def delete_video(
+    video_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a video"""
+    video = db.query(Video).filter(Video.id == video_id).first()
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    if video.uploader_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Delete file
+    if os.path.exists(video.file_path):
+        os.remove(video.file_path)
+    
+    # Remove the transcript from AI context; queued transcription jobs skip missing videos
+    if video.transcript:
+        from app.services.ai_service import get_ai_service
+        call("embedding", get_ai_service().remove_context, current_user.id, "video", video.id)
+    
+    learning_context.invalidate_video(db, video.id)
+    db.query(WatchHistory).filter(WatchHistory.video_id == video.id).delete(synchronize_session=False)
+    db.query(TranscriptSegments).filter(TranscriptSegments.video_id == video.id).delete(synchronize_session=False)
+    db.query(RecommendationList).filter(RecommendationList.key == f"video:{video.id}").delete(synchronize_session=False)
+    db.delete(video)
+    db.commit()
+    video_list_cache.invalidate()
+    return None
 
 
 @router.get("/my/uploaded", response_model=List[VideoResponse])
-async def get_my_videos(
+@runs_in("db")
+def get_my_videos(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get current user's uploaded videos"""
-    videos = db.query(Video).filter(Video.uploader_id == current_user.id).all()
+    query = db.query(Video).filter(Video.uploader_id == current_user.id).order_by(Video.id)
+    
+    versions = query.with_entities(Video.id, Video.updated_at, Video.created_at, Video.views_count).all()
+    etag = make_etag(current_user.id, current_user.full_name, [row_version(v) for v in versions])
+    if not_modified(request, etag):
+        return not_modified_response(etag, private=True)
     
+    videos = query.all()
     video_responses = []
     for video in videos:
         vr = VideoResponse.from_orm(video)
         vr.uploader_name = current_user.full_name or current_user.email
         video_responses.append(vr)
     
-    return video_responses
+    etag = make_etag(current_user.id, current_user.full_name, [row_version(v) for v in videos])
+    return etag_response(video_responses, etag, private=True)
+
+
+@router.get("/my/recommendations", response_model=List[VideoResponse])
+@runs_in("db")
+def get_recommendations(
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Unwatched videos picked for the current user from their watch history"""
+    return _ranked_videos(db, recommendation_service.for_user(db, current_user.id, limit))
 
 
 @router.post("/{video_id}/watch", response_model=WatchHistoryResponse)
-async def record_watch(
+@runs_in("db")
+def record_watch(
     video_id: int,
     watch_data: WatchHistoryCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -178,9 +317,13 @@ async def record_watch(
         WatchHistory.video_id == video_id
     ).first()
     
+    now = datetime.now(timezone.utc)
     if existing:
+        previous_completion = existing.completion_percentage or 0
         existing.watch_duration = watch_data.watch_duration
         existing.completion_percentage = watch_data.completion_percentage
+        existing.last_watched_at = now
+        learning_context.record_watch(db, current_user.id, video, existing, previous_completion)
         db.commit()
         db.refresh(existing)
         return WatchHistoryResponse.from_orm(existing)
@@ -189,24 +332,49 @@ async def record_watch(
             user_id=current_user.id,
             video_id=video_id,
             watch_duration=watch_data.watch_duration,
-            completion_percentage=watch_data.completion_percentage
+            completion_percentage=watch_data.completion_percentage,
+            last_watched_at=now
         )
         db.add(watch_history)
+        learning_context.record_watch(db, current_user.id, video, watch_history)
         db.commit()
         db.refresh(watch_history)
+        # A new video in the history changes this user's picks; progress updates do not
+        background_tasks.add_task(recommendation_service.refresh_user, current_user.id)
         return WatchHistoryResponse.from_orm(watch_history)
 
 
+def _history_version(h, video_version) -> tuple:
+    return (h.id, h.watch_duration, h.completion_percentage, str(h.last_watched_at), video_version)
+
+
 @router.get("/my/history", response_model=List[WatchHistoryResponse])
-async def get_watch_history(
+@runs_in("db")
+def get_watch_history(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get current user's watch history"""
-    history = db.query(WatchHistory).filter(
+    query = db.query(WatchHistory).filter(
         WatchHistory.user_id == current_user.id
-    ).order_by(WatchHistory.last_watched_at.desc()).all()
+    ).order_by(WatchHistory.last_watched_at.desc(), WatchHistory.id.desc())
+    
+    # Watch rows carry no updated_at, so their version is their (small) contents
+    versions = query.outerjoin(Video, WatchHistory.video_id == Video.id).with_entities(
+        WatchHistory.id, WatchHistory.watch_duration, WatchHistory.completion_percentage,
+        WatchHistory.last_watched_at, Video.id.label("video_id"), Video.updated_at,
+        Video.created_at, Video.views_count
+    ).all()
+    etag = make_etag(current_user.id, [
+        _history_version(v, (v.video_id, str(v.updated_at or v.created_at), v.views_count)
+                         if v.video_id else None)
+        for v in versions
+    ])
+    if not_modified(request, etag):
+        return not_modified_response(etag, private=True)
     
+    history = query.all()
     history_responses = []
     for h in history:
         hr = WatchHistoryResponse.from_orm(h)
@@ -214,5 +382,8 @@ async def get_watch_history(
             hr.video = VideoResponse.from_orm(h.video)
         history_responses.append(hr)
     
-    return history_responses
+    etag = make_etag(current_user.id, [
+        _history_version(h, row_version(h.video) if h.video else None) for h in history
+    ])
+    return etag_response(history_responses, etag, private=True)
 
@@ -53,7 +53,10 @@ class VideoResponse(VideoBase):
     id: int
     file_path: str
     thumbnail_path: Optional[str] = None
+    thumbnail_key: Optional[str] = None
     duration: Optional[float] = None
+    transcript_model: Optional[str] = None
+    transcript_status: Optional[str] = None
     uploader_id: int
     views_count: int
     created_at: datetime
@@ -112,11 +115,22 @@ class ChatMessage(BaseModel):
     message: str
     context_type: Optional[str] = None  # "video", "document", "general"
     context_id: Optional[int] = None
+    max_tokens: Optional[int] = None  # capped at LLM_MAX_TOKENS
+
+
+class Citation(BaseModel):
+    type: str
+    id: Optional[int] = None
+    title: Optional[str] = None
+    page: Optional[int] = None  # document page or slide
+    start: Optional[float] = None  # video timestamp in seconds
+    end: Optional[float] = None
 
 
 class ChatResponse(BaseModel):
     response: str
     context_used: Optional[str] = None
+    citations: List[Citation] = []
 
 
 class ChatHistoryResponse(BaseModel):
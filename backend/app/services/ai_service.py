@@ -3,12 +3,24 @@ AI service for Study Area chatbot
 """
 
 from typing import List, Optional, Dict
-from sqlalchemy.orm import Session
-from app.models import User, Video, Document, WatchHistory, ChatHistory
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
 import os
+import threading
+import time
+
+from app.services.bm25_index import bm25_index, reciprocal_rank_fusion
+from app.services.chat_cache import chat_cache
+from app.services.context_packer import ContextPacker
+from app.services.embedding_backends import create_embedder
+from app.services.llm_service import Prompt, generation_pool
+from app.services.model_server import MODEL_SERVER_ADDRESS, ModelClient, RemoteEmbedder
+from app.services.telemetry import record_model_load, stage
+from app.services.transcript_segments import attach_segments
+from app.services.vector_stores import open_vector_store
+
+# Retrieval settings
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+CANDIDATE_MULTIPLIER = 4  # candidates pulled from each retriever per requested result
+RRF_K = 60
 
 
 class AIService:
@@ -16,147 +28,169 @@ class AIService:
     
     def __init__(self):
         """Initialize AI models and vector store"""
-        # Initialize sentence transformer for embeddings
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # Initialize ChromaDB for vector storage
-        chroma_dir = os.path.join(os.getcwd(), "chroma_db")
-        os.makedirs(chroma_dir, exist_ok=True)
+        # Initialize sentence embedder (backend chosen by EMBEDDING_BACKEND)
+        started = time.perf_counter()
+        self.embedder = create_embedder()
+        record_model_load("embedding", self.embedder.name, time.perf_counter() - started)
+        self.packer = ContextPacker(self.embedder)
         
-        self.client = chromadb.PersistentClient(
-            path=chroma_dir,
-            settings=Settings(anonymized_telemetry=False)
-        )
-    
-    def get_user_context(self, user_id: int, db: Session) -> Dict:
-        """Get user's learning context (watched videos, uploaded documents)"""
-        # Get watched videos
-        watch_history = db.query(WatchHistory).filter(
-            WatchHistory.user_id == user_id
-        ).order_by(WatchHistory.last_watched_at.desc()).limit(10).all()
+        # Vector storage (backend chosen by VECTOR_STORE)
+        self.store = open_vector_store()
+    
+    def store_context(self, user_id: int, context_type: str, context_id: int, 
+                     content: str, metadata: Dict = None):
+        """Store context in vector database; returns its vector, or None if storing failed"""
+        try:
+            return self.store_contexts(user_id, [{
+                "type": context_type,
+                "id": context_id,
+                "content": content,
+                "metadata": metadata
+            }])[0]
+        except Exception as e:
+            print(f"Error storing context: {e}")
+            return None
+    
+    def store_contexts(self, user_id: int, items: List[Dict]):
+        """Store several contexts in one vector database write
         
-        watched_videos = []
-        for watch in watch_history:
-            video = db.query(Video).filter(Video.id == watch.video_id).first()
-            if video and video.transcript:
-                watched_videos.append({
-                    "id": video.id,
-                    "title": video.title,
-                    "transcript": video.transcript,
-                    "subject": video.subject,
-                    "topic": video.topic
-                })
+        Each item has "type", "id", "content", optional "metadata" and an
+        optional precomputed "embedding"; missing embeddings are computed
+        in a single batch. Returns the stored vectors in item order, for
+        saving with the rows (see embedding_store).
+        """
+        if not items:
+            return []
         
-        # Get user's documents
-        documents = db.query(Document).filter(
-            Document.owner_id == user_id
-        ).all()
+        # Generate embeddings
+        missing = [i for i, item in enumerate(items) if item.get("embedding") is None]
+        embeddings = [item.get("embedding") for item in items]
+        if missing:
+            with stage("embedding", count=len(missing)):
+                encoded = self.embedder.encode([items[i]["content"] for i in missing])
+            for i, vector in zip(missing, encoded):
+                embeddings[i] = vector
         
-        user_docs = []
-        for doc in documents:
-            if doc.content:
-                user_docs.append({
-                    "id": doc.id,
-                    "title": doc.title,
-                    "content": doc.content,
-                    "type": doc.file_type
-                })
+        doc_ids = [f"{item['type']}_{item['id']}" for item in items]
+        # Upsert so re-transcribed or re-extracted content replaces the old vector
+        with stage("vectors.write", count=len(items)):
+            self.store.upsert(
+                user_id,
+                doc_ids,
+                embeddings,
+                [item["content"] for item in items],
+                [{
+                    "type": item["type"],
+                    "id": item["id"],
+                    # Chroma rejects None metadata values
+                    **{k: v for k, v in (item.get("metadata") or {}).items() if v is not None}
+                } for item in items]
+            )
         
-        return {
-            "watched_videos": watched_videos,
-            "documents": user_docs
-        }
+        # Keep the keyword index in step with the vector store
+        self._ensure_keyword_index(user_id)
+        for doc_id, item in zip(doc_ids, items):
+            bm25_index.add(user_id, doc_id, item["content"])
+        chat_cache.invalidate(user_id)
+        return embeddings
     
-    def store_context(self, user_id: int, context_type: str, context_id: int, 
-                     content: str, metadata: Dict = None):
-        """Store context in vector database"""
-        collection_name = f"user_{user_id}_context"
+    def remove_context(self, user_id: int, context_type: str, context_id: int):
+        """Remove stored context from the vector database"""
+        doc_id = f"{context_type}_{context_id}"
         
         try:
-            collection = self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"user_id": user_id}
-            )
-            
-            # Generate embedding
-            embedding = self.embedder.encode(content).tolist()
-            
-            # Store in ChromaDB
-            collection.add(
-                embeddings=[embedding],
-                documents=[content],
-                ids=[f"{context_type}_{context_id}"],
-                metadatas=[{
-                    "type": context_type,
-                    "id": context_id,
-                    **(metadata or {})
-                }]
-            )
+            self.store.delete(user_id, [doc_id])
+            bm25_index.remove(user_id, doc_id)
+            chat_cache.invalidate(user_id)
         except Exception as e:
-            print(f"Error storing context: {e}")
+            print(f"Error removing context: {e}")
+    
+    def _ensure_keyword_index(self, user_id: int):
+        """Build the BM25 index from the vector store the first time a user is seen"""
+        if bm25_index.is_loaded(user_id):
+            return
+        stored = self.store.get(user_id)
+        bm25_index.load(user_id, ((doc_id, doc["content"]) for doc_id, doc in stored.items()))
+    
+    def sync_chat_cache(self, user_id: int):
+        """Content changes in this process already invalidate the chat cache"""
+    
+    def embed_query(self, query: str):
+        """Embed a query once so callers can reuse it for caching and search"""
+        with stage("embedding", count=1):
+            return self.embedder.encode(query)
     
-    def search_relevant_context(self, user_id: int, query: str, top_k: int = 3) -> List[Dict]:
+    def search_relevant_context(self, user_id: int, query: str, top_k: int = 3,
+                                query_embedding=None) -> List[Dict]:
         """Search for relevant context based on query"""
-        collection_name = f"user_{user_id}_context"
-        
         try:
-            collection = self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"user_id": user_id}
-            )
+            count = self.store.count(user_id)
+            if count == 0:
+                return []
+            n_candidates = min(count, top_k * CANDIDATE_MULTIPLIER if HYBRID_SEARCH else top_k)
             
             # Generate query embedding
-            query_embedding = self.embedder.encode(query).tolist()
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
             
-            # Search
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
-            )
+            # Dense search
+            with stage("vectors.query", candidates=n_candidates):
+                results = self.store.query(user_id, query_embedding, n_candidates)
+            found = dict(results)
+            dense_ranking = [doc_id for doc_id, _ in results]
+            
+            if not HYBRID_SEARCH:
+                return [found[doc_id] for doc_id in dense_ranking[:top_k]]
             
-            contexts = []
-            if results['documents'] and len(results['documents'][0]) > 0:
-                for i, doc in enumerate(results['documents'][0]):
-                    contexts.append({
-                        "content": doc,
-                        "metadata": results['metadatas'][0][i] if results['metadatas'] else {}
-                    })
+            # Keyword search, fused with the dense ranking
+            self._ensure_keyword_index(user_id)
+            keyword_ranking = [
+                doc_id for doc_id, _ in bm25_index.search(user_id, query, n_candidates)
+            ]
+            fused = reciprocal_rank_fusion([dense_ranking, keyword_ranking], k=RRF_K)
+            selected = [doc_id for doc_id, _ in fused[:top_k]]
             
-            return contexts
+            # Fetch keyword-only hits that the vector query did not return
+            missing = [doc_id for doc_id in selected if doc_id not in found]
+            if missing:
+                found.update(self.store.get(user_id, missing))
+            
+            return [found[doc_id] for doc_id in selected if doc_id in found]
         except Exception as e:
             print(f"Error searching context: {e}")
             return []
     
-    def generate_response(self, query: str, contexts: List[Dict]) -> str:
+    def get_contexts(self, user_id: int, refs: List[Dict]) -> List[Dict]:
+        """Passages again for cached context metadata, in the same order; removed ones are skipped"""
+        try:
+            doc_ids = [f"{ref['metadata'].get('type')}_{ref['metadata'].get('id')}" for ref in refs]
+            found = self.store.get(user_id, doc_ids)
+            return [found[doc_id] for doc_id in doc_ids if doc_id in found]
+        except Exception as e:
+            print(f"Error fetching context: {e}")
+            return []
+    
+    def vector_stats(self) -> Dict:
+        return self.store.stats()
+    
+    def compact_vectors(self) -> Dict:
+        """Rewrite the vector store without deleted rows (mmap backend; Chroma manages its own files)"""
+        return self.store.compact()
+    
+    def build_prompt(self, query: str, contexts: List[Dict], query_embedding=None) -> Prompt:
+        """Rerank and pack retrieved passages into the generation prompt"""
+        attach_segments(contexts)  # video citations then carry segment timestamps
+        packed = self.packer.pack(query, contexts, query_embedding=query_embedding)
+        return Prompt(question=query, context=packed["text"], citations=packed["citations"])
+    
+    def generate_response(self, query: str, contexts: List[Dict],
+                          max_tokens: Optional[int] = None) -> str:
         """Generate AI response based on query and context"""
-        # Simple context-aware response generation
-        # In production, use a proper LLM like Llama, GPT, etc.
-        
         if not contexts:
             return self._default_response(query)
         
-        # Build context string
-        context_text = "\n\n".join([
-            f"From {ctx['metadata'].get('type', 'source')}:\n{ctx['content'][:500]}"
-            for ctx in contexts[:2]
-        ])
-        
-        # Simple template-based response (replace with actual LLM)
-        response = f"""Based on the content you've been learning:
-
-{context_text}
-
-Regarding your question "{query}": 
-
-This is a simplified response. In production, this would use a proper language model like Llama or GPT to generate detailed, contextual answers based on your learning materials.
-
-Key points from your learning context:
-- The content covers topics you've been studying
-- This answer is based on videos and documents you've accessed
-- Continue learning to get more personalized responses
-"""
-        
-        return response
+        prompt = self.build_prompt(query, contexts)
+        return generation_pool.backend.generate(prompt, generation_pool.budget(max_tokens))
     
     def _default_response(self, query: str) -> str:
         """Default response when no context is available"""
@@ -173,3 +207,77 @@ Your question: "{query}"
 
 Once you start learning on the platform, I'll be able to provide context-aware answers!"""
 
+
+class RemoteAIService(AIService):
+    """AIService whose embedder and vector store live in the model server process
+    
+    Only prompt building (reranking through the remote embedder) and answer
+    generation run in this process.
+    """
+    
+    def __init__(self, client: ModelClient):
+        self.model_server = client
+        self.embedder = RemoteEmbedder(client)
+        self.packer = ContextPacker(self.embedder)
+        self._versions: Dict[int, int] = {}
+    
+    def store_contexts(self, user_id: int, items: List[Dict]):
+        if not items:
+            return []
+        embeddings = self.model_server.call("store_contexts", user_id, items)
+        chat_cache.invalidate(user_id)
+        return embeddings
+    
+    def remove_context(self, user_id: int, context_type: str, context_id: int):
+        try:
+            self.model_server.call("remove_context", user_id, context_type, context_id)
+            chat_cache.invalidate(user_id)
+        except Exception as e:
+            print(f"Error removing context: {e}")
+    
+    def search_relevant_context(self, user_id: int, query: str, top_k: int = 3,
+                                query_embedding=None) -> List[Dict]:
+        try:
+            return self.model_server.call("search_relevant_context", user_id, query,
+                                          top_k=top_k, query_embedding=query_embedding)
+        except Exception as e:
+            print(f"Error searching context: {e}")
+            return []
+    
+    def get_contexts(self, user_id: int, refs: List[Dict]) -> List[Dict]:
+        try:
+            return self.model_server.call("get_contexts", user_id, refs)
+        except Exception as e:
+            print(f"Error fetching context: {e}")
+            return []
+    
+    def vector_stats(self) -> Dict:
+        return self.model_server.call("vector_stats")
+    
+    def compact_vectors(self) -> Dict:
+        return self.model_server.call("compact_vectors")
+    
+    def sync_chat_cache(self, user_id: int):
+        """Drop this process's cached answers for a user whose content another process changed"""
+        try:
+            version = self.model_server.call("corpus_version", user_id)
+        except Exception as e:
+            print(f"Error reading corpus version: {e}")
+            return
+        if self._versions.get(user_id, version) != version:
+            chat_cache.invalidate(user_id)
+        self._versions[user_id] = version
+
+
+_shared_service: Optional[AIService] = None
+_shared_lock = threading.Lock()
+
+
+def get_ai_service() -> AIService:
+    """Process-wide AIService, so models load once; a model server client if MODEL_SERVER_ADDRESS is set"""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_lock:
+            if _shared_service is None:
+                _shared_service = RemoteAIService(ModelClient()) if MODEL_SERVER_ADDRESS else AIService()
+    return _shared_service
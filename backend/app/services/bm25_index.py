@@ -0,0 +1,127 @@
+"""
+In-memory BM25 keyword index for hybrid retrieval
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Keeps course codes ("cs-101"), versions ("2.1") and names together as one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-_][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or "
+    "that the this to was were what when where which who why will with you".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into index terms"""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+class _UserIndex:
+    """Postings and length statistics for a single user's collection"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def add(self, doc_id: str, text: str):
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+
+class BM25Index:
+    """Per-user inverted index scored with Okapi BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._indexes: Dict[int, _UserIndex] = {}
+        self._lock = threading.RLock()
+
+    def is_loaded(self, user_id: int) -> bool:
+        """Whether this process has built the index for a user yet"""
+        return user_id in self._indexes
+
+    def load(self, user_id: int, documents: Iterable[Tuple[str, str]]):
+        """Replace a user's index with (doc_id, text) pairs"""
+        index = _UserIndex()
+        for doc_id, text in documents:
+            index.add(doc_id, text or "")
+        with self._lock:
+            self._indexes[user_id] = index
+
+    def add(self, user_id: int, doc_id: str, text: str):
+        """Index or re-index a single document"""
+        with self._lock:
+            self._indexes.setdefault(user_id, _UserIndex()).add(doc_id, text)
+
+    def remove(self, user_id: int, doc_id: str):
+        """Drop a document from a user's index"""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                index.remove(doc_id)
+
+    def search(self, user_id: int, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return (doc_id, score) pairs ranked by BM25"""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None or not index.doc_lengths:
+                return []
+
+            n_docs = len(index.doc_lengths)
+            avg_length = index.total_length / n_docs or 1.0
+            scores: Dict[str, float] = defaultdict(float)
+
+            for term in set(tokenize(query)):
+                posting = index.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = 1 - self.b + self.b * index.doc_lengths[doc_id] / avg_length
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60,
+                           weights: Optional[List[float]] = None) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists into one using RRF"""
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += weight / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+# Shared across AIService instances so every ingest path updates the same index
+bm25_index = BM25Index()
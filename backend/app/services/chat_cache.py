@@ -0,0 +1,176 @@
+"""
+Two-level cache for Study Area chat: exact answers and semantic retrieval reuse
+
+Entries keep the retrieved contexts' metadata only, not their text; a
+semantic hit fetches the passages again by id.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_backends import to_storage
+from app.services.telemetry import registry
+
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "2048"))
+SEMANTIC_CACHE_PER_USER = int(os.getenv("SEMANTIC_CACHE_PER_USER", "128"))
+SEMANTIC_CACHE_USERS = int(os.getenv("SEMANTIC_CACHE_USERS", "256"))  # least recently active users dropped past this
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+CHAT_CACHE_LOOKUPS = registry.counter(
+    "nest_chat_cache_lookups_total", "Chat cache lookups by outcome: exact, semantic or miss", ["outcome"])
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and strip punctuation so trivially different questions match"""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", query.lower())).strip()
+
+
+def context_refs(contexts: List[Dict]) -> List[Dict]:
+    """Contexts without their passage text or segment timings, as kept in the cache"""
+    return [{"metadata": context.get("metadata") or {}} for context in contexts or []]
+
+
+class ChatCache:
+    """Exact-match LRU of answers plus a per-user semantic cache of retrieved contexts"""
+
+    def __init__(self, max_entries: int = CHAT_CACHE_SIZE,
+                 semantic_per_user: int = SEMANTIC_CACHE_PER_USER,
+                 semantic_users: int = SEMANTIC_CACHE_USERS,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.semantic_per_user = semantic_per_user
+        self.semantic_users = semantic_users
+        self.threshold = threshold
+
+        self._exact: "OrderedDict[Tuple[int, int, int, str], Dict]" = OrderedDict()
+        self._semantic: "OrderedDict[int, List[Tuple[np.ndarray, List[Dict]]]]" = OrderedDict()
+        self._versions: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "seconds_saved": 0.0,
+        }
+        self._miss_latency = 0.0  # moving average of uncached request time
+
+    def corpus_version(self, user_id: int) -> int:
+        """Version of the user's indexed content; bumped on every change"""
+        return self._versions[user_id]
+
+    def invalidate(self, user_id: int):
+        """Drop everything cached for a user after their indexed content changed"""
+        with self._lock:
+            self._versions[user_id] += 1
+            self._semantic.pop(user_id, None)
+            stale = [key for key in self._exact if key[0] == user_id]
+            for key in stale:
+                del self._exact[key]
+            self._stats["invalidations"] += 1
+
+    def get_answer(self, user_id: int, query: str, max_tokens: int) -> Optional[Dict]:
+        """Exact-match lookup at a token budget; returns {"contexts", "response", "citations"} or None"""
+        key = (user_id, self._versions[user_id], max_tokens, normalize_query(query))
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None:
+                self._exact.move_to_end(key)
+        return entry
+
+    def get_contexts(self, user_id: int, embedding) -> Optional[List[Dict]]:
+        """Semantic lookup; returns the metadata of contexts retrieved for a near-identical query"""
+        vector = _unit(embedding)
+        with self._lock:
+            entries = self._semantic.get(user_id)
+            if not entries:
+                return None
+            self._semantic.move_to_end(user_id)
+            matrix = np.stack([cached for cached, _ in entries]).astype(np.float32)
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return entries[best][1]
+
+    def put(self, user_id: int, query: str, embedding, contexts: List[Dict], response: str,
+            version: Optional[int] = None, citations: Optional[List[Dict]] = None, max_tokens: int = 0):
+        """Cache a freshly computed answer and its retrieved contexts' metadata
+
+        Pass the corpus version read before retrieval so results computed
+        against content that changed mid-request are not cached, and the
+        token budget the answer was generated with.
+        """
+        refs = context_refs(contexts)
+        with self._lock:
+            current = self._versions[user_id]
+            if version is not None and version != current:
+                return
+            key = (user_id, current, max_tokens, normalize_query(query))
+            self._exact[key] = {"contexts": refs, "response": response, "citations": citations}
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+            if embedding is not None:
+                entries = self._semantic.setdefault(user_id, [])
+                self._semantic.move_to_end(user_id)
+                entries.append((to_storage(_unit(embedding)), refs))
+                if len(entries) > self.semantic_per_user:
+                    del entries[0]
+                while len(self._semantic) > self.semantic_users:
+                    self._semantic.popitem(last=False)
+
+    def record(self, outcome: str, elapsed: float):
+        """Record a lookup outcome ("exact", "semantic" or "miss") and its latency"""
+        CHAT_CACHE_LOOKUPS.inc(outcome=outcome)
+        with self._lock:
+            if outcome == "miss":
+                self._stats["misses"] += 1
+                n = self._stats["misses"]
+                self._miss_latency += (elapsed - self._miss_latency) / min(n, 100)
+                return
+            self._stats[f"{outcome}_hits"] += 1
+            self._stats["seconds_saved"] += max(0.0, self._miss_latency - elapsed)
+
+    def stats(self) -> Dict:
+        """Hit ratio and latency saved since startup"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._exact)
+            semantic_users = len(self._semantic)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_ratio"] = hits / lookups if lookups else 0.0
+        stats["avg_miss_seconds"] = self._miss_latency
+        stats["exact_entries"] = entries
+        stats["semantic_users"] = semantic_users
+        return stats
+
+
+def _unit(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+chat_cache = ChatCache()
+
+registry.gauge(
+    "nest_chat_cache_hit_ratio", "Share of chat messages answered from the exact or semantic cache",
+    callback=lambda: {(): chat_cache.stats()["hit_ratio"]}
+)
+registry.gauge(
+    "nest_chat_cache_seconds_saved", "Estimated answer time saved by chat cache hits since startup",
+    callback=lambda: {(): chat_cache.stats()["seconds_saved"]}
+)
+
@@ -0,0 +1,287 @@
+"""
+Chat storage services: batched writes, keyset pages and compressed archives
+
+Chat turns are the fastest-growing table, and every answer used to be
+committed on the response path. Now a turn is queued in memory and a
+writer thread inserts queued turns in batches every CHAT_WRITE_FLUSH_MS.
+History pages are read newest first from the (user_id, created_at, id)
+index. The cursor is the id of the oldest turn on the previous page,
+so a deep page costs the same as the first. A periodic job moves turns
+older than CHAT_ARCHIVE_AFTER_DAYS into chat_archives as zlib-compressed
+JSON, one blob per user and run. Pages continue into those archives, and
+archives older than CHAT_ARCHIVE_KEEP_DAYS are deleted.
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+
+from app.models import ChatArchive, ChatHistory
+from app.services.telemetry import registry
+
+CHAT_WRITE_FLUSH_MS = float(os.getenv("CHAT_WRITE_FLUSH_MS", "250"))
+CHAT_WRITE_BATCH = int(os.getenv("CHAT_WRITE_BATCH", "200"))  # flush early once this many turns are queued
+CHAT_WRITE_MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", "10000"))  # oldest queued turns dropped past this
+CHAT_WRITE_ATTEMPTS = int(os.getenv("CHAT_WRITE_ATTEMPTS", "240"))  # a turn that fails on its own this often is dropped
+CHAT_ARCHIVE_AFTER_DAYS = float(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90"))  # 0 = never archive
+CHAT_ARCHIVE_KEEP_DAYS = float(os.getenv("CHAT_ARCHIVE_KEEP_DAYS", "0"))  # delete turns older than this; 0 = keep
+CHAT_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", "86400"))  # 0 = admin only
+CHAT_ARCHIVE_BATCH = int(os.getenv("CHAT_ARCHIVE_BATCH", "1000"))  # most turns per archive blob
+
+CHAT_WRITES = registry.counter(
+    "nest_chat_writes_total", "Chat turns written, dropped or retried by the batched writer", ["outcome"])
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    """ISO 8601 in UTC; SQLite returns naive UTC datetimes"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def _entry(row) -> Dict:
+    return {"id": row.id, "message": row.message, "response": row.response, "context_type": row.context_type,
+            "context_id": row.context_id, "created_at": _iso(row.created_at)}
+
+
+def pack_turns(turns: List[Dict]) -> Tuple[bytes, int]:
+    """Compressed blob and raw JSON size for turns, oldest first"""
+    raw = json.dumps(turns, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, 6), len(raw)
+
+
+def unpack_turns(data: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(data))
+
+
+class ChatStore:
+    """Queues chat turns for batched writes, pages history and archives old turns"""
+
+    def __init__(self, flush_ms: float = CHAT_WRITE_FLUSH_MS, batch: int = CHAT_WRITE_BATCH,
+                 max_pending: int = CHAT_WRITE_MAX_PENDING, interval: float = CHAT_ARCHIVE_INTERVAL_SECONDS):
+        self.flush_interval = flush_ms / 1000
+        self.batch = batch
+        self.max_pending = max_pending
+        self.interval = interval
+        self.last_archive: Optional[Dict] = None
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one insert at a time keeps turns in order
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._archiver: Optional[threading.Thread] = None
+
+    def add(self, user_id: int, message: str, response: str, context_type: Optional[str] = None,
+            context_id: Optional[int] = None):
+        """Queue a turn; it is written within CHAT_WRITE_FLUSH_MS"""
+        row = {"user_id": user_id, "message": message, "response": response, "context_type": context_type,
+               "context_id": context_id, "created_at": datetime.now(timezone.utc)}
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                del self._pending[0]
+                CHAT_WRITES.inc(outcome="dropped")
+                print("Error queueing chat turn: too many unwritten turns, dropped the oldest")
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="chat-writer", daemon=True)
+                self._writer.start()
+        if full:
+            self._wake.set()
+
+    def pending(self, user_id: Optional[int] = None) -> List[Dict]:
+        """Queued turns not yet written, oldest first"""
+        with self._lock:
+            return [dict(row) for row in self._pending if user_id is None or row["user_id"] == user_id]
+
+    def flush(self) -> int:
+        """Write every queued turn now; returns how many were written
+
+        A batch that fails is retried one turn at a time, so one bad turn
+        does not hold back the rest. A turn that keeps failing on its own is
+        dropped after CHAT_WRITE_ATTEMPTS flushes.
+        """
+        from app.database import SessionLocal
+
+        with self._write_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            db = SessionLocal()
+            try:
+                try:
+                    self._insert(db, rows)
+                    CHAT_WRITES.inc(len(rows), outcome="written")
+                    return len(rows)
+                except Exception as e:
+                    db.rollback()
+                    print(f"Error writing chat history, retrying {len(rows)} turns one at a time: {e}")
+                written, failed = 0, []
+                for row in rows:
+                    try:
+                        self._insert(db, [row])
+                        written += 1
+                    except Exception as e:
+                        db.rollback()
+                        row["attempts"] = row.get("attempts", 0) + 1
+                        if row["attempts"] >= CHAT_WRITE_ATTEMPTS:
+                            CHAT_WRITES.inc(outcome="dropped")
+                            print(f"Error writing chat turn for user {row['user_id']}, dropped it "
+                                  f"after {row['attempts']} attempts: {e}")
+                        else:
+                            failed.append(row)
+                CHAT_WRITES.inc(written, outcome="written")
+                if failed:
+                    # Put them back in front of newer turns for the next flush
+                    with self._lock:
+                        self._pending[:0] = failed[-self.max_pending:]
+                    CHAT_WRITES.inc(len(failed), outcome="retried")
+                return written
+            finally:
+                db.close()
+
+    @staticmethod
+    def _insert(db, rows: List[Dict]):
+        db.execute(ChatHistory.__table__.insert(),
+                   [{k: v for k, v in row.items() if k != "attempts"} for row in rows])
+        db.commit()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def page(self, db, user_id: int, limit: int = 50, before: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+        """Up to limit turns older than turn `before`, newest first, and the cursor for the next page"""
+        items: List[Dict] = []
+        anchor = None
+        if before is not None:
+            anchor = db.query(ChatHistory.created_at).filter(
+                ChatHistory.id == before, ChatHistory.user_id == user_id
+            ).scalar()
+        # A cursor that is not a live turn points into the archives
+        if before is None or anchor is not None:
+            query = db.query(ChatHistory).filter(ChatHistory.user_id == user_id)
+            if anchor is not None:
+                query = query.filter(or_(ChatHistory.created_at < anchor,
+                                         and_(ChatHistory.created_at == anchor, ChatHistory.id < before)))
+            rows = query.order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc()).limit(limit + 1).all()
+            items = [_entry(row) for row in rows]
+        if len(items) <= limit:
+            cursor = items[-1]["id"] if items else before
+            items += self._archived(db, user_id, limit + 1 - len(items), cursor)
+        if len(items) > limit:
+            return items[:limit], items[limit - 1]["id"]
+        return items, None
+
+    def _archived(self, db, user_id: int, count: int, before: Optional[int]) -> List[Dict]:
+        """Archived turns older than id `before`, newest first"""
+        query = db.query(ChatArchive).filter(ChatArchive.user_id == user_id)
+        if before is not None:
+            query = query.filter(ChatArchive.first_id < before)
+        items = []
+        for archive in query.order_by(ChatArchive.last_id.desc()).yield_per(4):
+            for turn in reversed(unpack_turns(archive.data)):
+                if before is None or turn["id"] < before:
+                    items.append(turn)
+                    if len(items) >= count:
+                        return items
+        return items
+
+    def archive(self, db, after_days: float = CHAT_ARCHIVE_AFTER_DAYS, keep_days: float = CHAT_ARCHIVE_KEEP_DAYS,
+                batch: int = CHAT_ARCHIVE_BATCH) -> Dict:
+        """Compact turns older than after_days into archives and delete turns older than keep_days"""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        stats = {"archived_turns": 0, "archives": 0, "raw_bytes": 0, "compressed_bytes": 0,
+                 "deleted_turns": 0, "deleted_archives": 0, "skipped_users": 0}
+
+        if keep_days > 0:
+            keep_cutoff = now - timedelta(days=keep_days)
+            stats["deleted_turns"] = db.query(ChatHistory).filter(
+                ChatHistory.created_at < keep_cutoff).delete(synchronize_session=False)
+            stats["deleted_archives"] = db.query(ChatArchive).filter(
+                ChatArchive.last_at < keep_cutoff).delete(synchronize_session=False)
+            db.commit()
+
+        if after_days > 0:
+            cutoff = now - timedelta(days=after_days)
+            users = [u for (u,) in db.query(ChatHistory.user_id).filter(ChatHistory.created_at < cutoff).distinct()]
+            for user_id in users:
+                while True:
+                    rows = db.query(ChatHistory).filter(
+                        ChatHistory.user_id == user_id, ChatHistory.created_at < cutoff
+                    ).order_by(ChatHistory.created_at, ChatHistory.id).limit(batch).all()
+                    if not rows:
+                        break
+                    data, raw_bytes = pack_turns([_entry(row) for row in rows])
+                    ids = [row.id for row in rows]
+                    db.add(ChatArchive(user_id=user_id, first_id=min(ids), last_id=max(ids),
+                                       first_at=rows[0].created_at, last_at=rows[-1].created_at,
+                                       turns=len(rows), raw_bytes=raw_bytes, data=data))
+                    deleted = db.query(ChatHistory).filter(ChatHistory.id.in_(ids)).delete(synchronize_session=False)
+                    if deleted != len(ids):
+                        # Another process archived some of these turns first
+                        db.rollback()
+                        stats["skipped_users"] += 1
+                        break
+                    db.commit()
+                    db.expunge_all()
+                    stats["archived_turns"] += len(ids)
+                    stats["archives"] += 1
+                    stats["raw_bytes"] += raw_bytes
+                    stats["compressed_bytes"] += len(data)
+                    if len(rows) < batch:
+                        break
+
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        self.last_archive = stats
+        return stats
+
+    def stats(self, db) -> Dict:
+        archives = db.query(func.count(ChatArchive.id), func.coalesce(func.sum(ChatArchive.turns), 0),
+                            func.coalesce(func.sum(ChatArchive.raw_bytes), 0),
+                            func.coalesce(func.sum(func.length(ChatArchive.data)), 0)).one()
+        return {
+            "live_turns": db.query(func.count(ChatHistory.id)).scalar(),
+            "archives": archives[0],
+            "archived_turns": archives[1],
+            "archived_raw_bytes": archives[2],
+            "archived_compressed_bytes": archives[3],
+            "pending_writes": len(self._pending),
+            "last_archive": self.last_archive,
+        }
+
+    def start(self):
+        """Archive every CHAT_ARCHIVE_INTERVAL_SECONDS in a background thread"""
+        if self.interval <= 0 or self._archiver is not None:
+            return
+        self._archiver = threading.Thread(target=self._archive_loop, name="chat-archive", daemon=True)
+        self._archiver.start()
+
+    def _archive_loop(self):
+        from app.database import SessionLocal
+
+        while True:
+            db = SessionLocal()
+            try:
+                self.archive(db)
+            except Exception as e:
+                db.rollback()
+                print(f"Error archiving chat history: {e}")
+            finally:
+                db.close()
+            time.sleep(self.interval)
+
+
+chat_store = ChatStore()
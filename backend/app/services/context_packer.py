@@ -0,0 +1,332 @@
+"""
+Context assembly: rerank, de-duplicate and pack retrieved passages into a prompt budget
+"""
+
+import bisect
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.bm25_index import tokenize
+from app.services.embedding_backends import to_storage
+
+# Packing settings
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_PACK_BUDGET_MS = float(os.getenv("CONTEXT_PACK_BUDGET_MS", "150"))
+CONTEXT_RERANKER = os.getenv("CONTEXT_RERANKER", "mmr")  # "mmr" or "cross_encoder"
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Passages embedded per source and query; longer sources are pre-ranked by BM25 against the query
+CONTEXT_PASSAGES_PER_SOURCE = int(os.getenv("CONTEXT_PASSAGES_PER_SOURCE", "64"))
+
+PASSAGE_TOKENS = 120        # target passage size
+BM25_K1 = 1.5
+BM25_B = 0.75
+MMR_LAMBDA = 0.7            # relevance vs. diversity trade-off
+DUPLICATE_JACCARD = 0.6     # token overlap above which two passages are the same text
+DUPLICATE_COSINE = 0.95
+EMBED_BATCH_SIZE = 64
+PASSAGE_CACHE_SIZE = 256    # sources whose passage embeddings are kept
+
+PAGE_BREAK = "\f"           # document extractors separate pages/slides with form feeds
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\f")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)"""
+    return max(1, len(text) // 4)
+
+
+class Passage:
+    """A span of a retrieved source with its citation"""
+
+    def __init__(self, text: str, source: Dict, start_char: int, term_counts: Optional[Counter] = None):
+        self.text = text
+        self.source = source
+        self.start_char = start_char
+        self.tokens = estimate_tokens(text)
+        self.term_counts = term_counts if term_counts is not None else Counter(tokenize(text))
+        self.terms = set(self.term_counts)
+
+    def citation(self) -> Dict:
+        metadata = self.source["metadata"]
+        citation = {
+            "type": metadata.get("type", "source"),
+            "id": metadata.get("id"),
+            "title": metadata.get("title"),
+        }
+        content = self.source["content"]
+        if PAGE_BREAK in content:
+            citation["page"] = content.count(PAGE_BREAK, 0, self.start_char) + 1
+        segment = self._segment()
+        if segment is not None:
+            citation["start"] = segment["start"]
+            citation["end"] = segment["end"]
+        return citation
+
+    def _segment(self) -> Optional[Dict]:
+        """Transcript segment this passage begins in, when timings are known
+
+        Segments are [{"offset", "start", "end"}] with character offsets into
+        the source content, see transcript_segments.
+        """
+        segments = self.source.get("segments")
+        if not segments:
+            return None
+        offsets = [segment["offset"] for segment in segments]
+        return segments[max(0, bisect.bisect_right(offsets, self.start_char) - 1)]
+
+
+def split_passages(source: Dict) -> List[Passage]:
+    """Split a source into sentence-aligned passages of about PASSAGE_TOKENS"""
+    content = source["content"] or ""
+    passages: List[Passage] = []
+    sentences: List[Tuple[int, str]] = []
+    position = 0
+    for match in _SENTENCE_END.finditer(content):
+        sentences.append((position, content[position:match.start()]))
+        position = match.end()
+    sentences.append((position, content[position:]))
+
+    current: List[Tuple[int, str]] = []
+    size = 0
+    for start, sentence in sentences:
+        if not sentence.strip():
+            continue
+        current.append((start, sentence))
+        size += estimate_tokens(sentence)
+        if size >= PASSAGE_TOKENS:
+            passages.append(_join(current, source))
+            # Carry the last sentence over so answers spanning a boundary survive
+            current = current[-1:]
+            size = estimate_tokens(current[0][1])
+    if current and (not passages or len(current) > 1):
+        passages.append(_join(current, source))
+    return passages
+
+
+def _join(sentences: List[Tuple[int, str]], source: Dict) -> Passage:
+    text = " ".join(sentence.strip() for _, sentence in sentences)
+    return Passage(text, source, sentences[0][0])
+
+
+def candidate_passages(query: str, passages: List[Passage],
+                       limit: int = CONTEXT_PASSAGES_PER_SOURCE) -> List[int]:
+    """Indexes of the passages worth embedding for a query, in source order
+
+    Short sources keep every passage. Longer ones keep the limit best by
+    BM25 against the query, so the end of a long lecture can still be cited,
+    and spread any remaining slots evenly over the rest of the source.
+    """
+    if len(passages) <= limit:
+        return list(range(len(passages)))
+    terms = set(tokenize(query))
+    lengths = [sum(p.term_counts.values()) for p in passages]
+    average = sum(lengths) / len(lengths) or 1.0
+    scores = [0.0] * len(passages)
+    for term in terms:
+        df = sum(1 for p in passages if term in p.term_counts)
+        if not df:
+            continue
+        idf = math.log(1 + (len(passages) - df + 0.5) / (df + 0.5))
+        for i, p in enumerate(passages):
+            tf = p.term_counts.get(term, 0)
+            if tf:
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / average))
+
+    ranked = sorted((i for i in range(len(passages)) if scores[i] > 0), key=lambda i: -scores[i])
+    chosen = set(ranked[:limit])
+    rest = [i for i in range(len(passages)) if i not in chosen]
+    slots = limit - len(chosen)
+    if slots > 0:
+        chosen.update(rest[int(k * len(rest) / slots)] for k in range(slots))
+    return sorted(chosen)
+
+
+class ContextPacker:
+    """Reranks passages from retrieved sources and packs them into a token budget"""
+
+    def __init__(self, embedder, reranker: str = CONTEXT_RERANKER):
+        self.embedder = embedder
+        self.reranker = reranker
+        self._cross_encoder = None
+        # source key -> ([(text, start_char, term counts)], {passage index: vector})
+        self._cache: "OrderedDict[str, Tuple[List[Tuple[str, int, Counter]], Dict[int, np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pack(self, query: str, contexts: List[Dict], query_embedding=None,
+             token_budget: int = CONTEXT_TOKEN_BUDGET) -> Dict:
+        """Return {"text", "citations", "elapsed_ms"} for the prompt"""
+        started = time.perf_counter()
+        if not contexts:
+            return {"text": "", "citations": [], "elapsed_ms": 0.0}
+
+        if query_embedding is None:
+            query_embedding = self.embedder.encode(query)
+        query_vector = _unit_rows(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+
+        passages, vectors = self._embed_sources(query, contexts, started)
+        if not passages:
+            return {"text": "", "citations": [], "elapsed_ms": (time.perf_counter() - started) * 1000}
+        relevance = vectors @ query_vector
+        if self.reranker == "cross_encoder" and self._within_budget(started):
+            relevance = self._cross_encode(query, passages)
+
+        selected = self._select(passages, vectors, relevance, token_budget)
+
+        blocks, citations = [], []
+        for number, passage in enumerate(selected, start=1):
+            citation = passage.citation()
+            citations.append(citation)
+            blocks.append(f"[{number}] {_label(citation)}\n{passage.text}")
+
+        return {
+            "text": "\n\n".join(blocks),
+            "citations": citations,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    def _within_budget(self, started: float) -> bool:
+        return (time.perf_counter() - started) * 1000 < CONTEXT_PACK_BUDGET_MS
+
+    def _embed_sources(self, query: str, contexts: List[Dict],
+                       started: float) -> Tuple[List[Passage], np.ndarray]:
+        """Candidate passages and unit embeddings for all sources, embedding uncached ones in one batch
+
+        The cache keeps each source's passages and the vectors embedded so
+        far, so a later question about another part of a long source only
+        embeds the passages it adds.
+        """
+        entries = []  # (source passages, candidate indexes, cached rows)
+        missing: List[Tuple[Dict, int, str]] = []
+
+        for source in contexts:
+            key = _source_key(source)
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+            if cached is not None:
+                spans, rows = cached
+                source_passages = [Passage(text, source, start, counts) for text, start, counts in spans]
+            else:
+                source_passages = split_passages(source)
+                rows = {}
+                with self._lock:
+                    self._cache[key] = ([(p.text, p.start_char, p.term_counts) for p in source_passages], rows)
+                    while len(self._cache) > PASSAGE_CACHE_SIZE:
+                        self._cache.popitem(last=False)
+            picked = candidate_passages(query, source_passages)
+            entries.append((source_passages, picked, rows))
+            missing.extend((rows, i, source_passages[i].text) for i in picked if i not in rows)
+
+        computed = {}
+        if missing:
+            vectors = self._encode([text for _, _, text in missing], started)
+            with self._lock:
+                for (rows, i, _), vector in zip(missing, vectors):
+                    computed[id(rows), i] = vector
+                    if vector.any():  # zero rows were cut off by the latency budget; retry next time
+                        rows[i] = to_storage(vector)
+
+        passages: List[Passage] = []
+        matrix: List[np.ndarray] = []
+        for source_passages, picked, rows in entries:
+            for i in picked:
+                passages.append(source_passages[i])
+                vector = computed.get((id(rows), i))
+                matrix.append(vector if vector is not None else rows[i].astype(np.float32))
+        if not passages:
+            return [], np.zeros((0, 1), dtype=np.float32)
+        return passages, np.vstack(matrix)
+
+    def _encode(self, texts: List[str], started: float) -> np.ndarray:
+        """Batch-encode passages; stop embedding once the latency budget is spent"""
+        if not texts:
+            return np.zeros((0, 1), dtype=np.float32)
+        rows = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            if rows and not self._within_budget(started):
+                # Out of time: remaining passages get a zero vector and rank last
+                rows.append(np.zeros((len(texts) - i, rows[0].shape[1]), dtype=np.float32))
+                break
+            batch = self.embedder.encode(texts[i:i + EMBED_BATCH_SIZE], batch_size=EMBED_BATCH_SIZE)
+            rows.append(_unit_rows(np.asarray(batch, dtype=np.float32)))
+        return np.vstack(rows)
+
+    def _cross_encode(self, query: str, passages: List[Passage]) -> np.ndarray:
+        if self._cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+            self._cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL)
+        scores = self._cross_encoder.predict([(query, p.text) for p in passages],
+                                             batch_size=EMBED_BATCH_SIZE)
+        return np.asarray(scores, dtype=np.float32)
+
+    def _select(self, passages: List[Passage], vectors: np.ndarray, relevance: np.ndarray,
+                token_budget: int) -> List[Passage]:
+        """Maximal marginal relevance with de-duplication, bounded by token_budget"""
+        if not passages:
+            return []
+        if relevance.max() > relevance.min():
+            relevance = (relevance - relevance.min()) / (relevance.max() - relevance.min())
+
+        remaining = list(range(len(passages)))
+        chosen: List[int] = []
+        used = 0
+        redundancy = np.zeros(len(passages), dtype=np.float32)
+
+        while remaining and used < token_budget:
+            scores = MMR_LAMBDA * relevance[remaining] - (1 - MMR_LAMBDA) * redundancy[remaining]
+            pick = remaining.pop(int(np.argmax(scores)))
+            passage = passages[pick]
+
+            if passage.tokens > token_budget - used or self._is_duplicate(pick, chosen, passages, vectors):
+                continue
+
+            chosen.append(pick)
+            used += passage.tokens
+            redundancy = np.maximum(redundancy, vectors @ vectors[pick])
+
+        return [passages[i] for i in chosen]
+
+    def _is_duplicate(self, candidate: int, chosen: List[int], passages: List[Passage],
+                      vectors: np.ndarray) -> bool:
+        terms = passages[candidate].terms
+        for other in chosen:
+            if float(vectors[candidate] @ vectors[other]) >= DUPLICATE_COSINE:
+                return True
+            other_terms = passages[other].terms
+            union = len(terms | other_terms)
+            if union and len(terms & other_terms) / union >= DUPLICATE_JACCARD:
+                return True
+        return False
+
+
+def _source_key(source: Dict) -> str:
+    metadata = source.get("metadata") or {}
+    digest = hashlib.sha1((source.get("content") or "").encode("utf-8")).hexdigest()
+    return f"{metadata.get('type')}_{metadata.get('id')}_{digest}"
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _label(citation: Dict) -> str:
+    """Human-readable source label, e.g. "Video: Limits (at 12:05)" """
+    label = f"{citation['type'].capitalize()}: {citation.get('title') or citation.get('id')}"
+    if "start" in citation:
+        minutes, seconds = divmod(int(citation["start"]), 60)
+        label += f" (at {minutes}:{seconds:02d})"
+    elif "page" in citation:
+        label += f" (page {citation['page']})"
+    return label
@@ -0,0 +1,207 @@
+"""
+Conversation services: recent chat turns per user for follow-up questions
+
+Each chat message used to be retrieved for on its own, so "explain that
+again with an example" searched for "explain", "again" and "example".
+ConversationStore keeps a bounded window of each user's recent turns in
+memory. The window is loaded from chat history the first time a user is
+seen. Each new message is classified against the previous turn:
+
+- new: a question that stands on its own; retrieved as before
+- reuse: a follow-up about the last answer, such as "why?", "give an
+  example" or a repeat of the last question, whose words the last
+  answer's sources already cover. The last answer's packed context is
+  reused as is, so no embedding, vector search or reranking runs, and an
+  LLM prefix cache sees the same context again.
+- expand: a follow-up that brings new words, such as "what about
+  entropy?". It is searched with the previous question prepended.
+
+Only the latest turn keeps its packed context. Older turns keep their
+text, so memory stays bounded per user and by CONVERSATION_USERS. Under
+serve.py each API worker keeps its own windows; a keep-alive connection
+stays on one worker, so a conversation usually does too.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+
+from app.services.bm25_index import TOKEN_PATTERN, tokenize
+from app.services.chat_cache import normalize_query
+
+CONVERSATION_TURNS = int(os.getenv("CONVERSATION_TURNS", "6"))  # recent turns kept per user
+CONVERSATION_USERS = int(os.getenv("CONVERSATION_USERS", "5000"))  # least recently active users dropped past this
+CONVERSATION_FOLLOW_UP_SECONDS = float(os.getenv("CONVERSATION_FOLLOW_UP_SECONDS", "900"))  # older turns start fresh
+CONVERSATION_MAX_NEW_TERMS = int(os.getenv("CONVERSATION_MAX_NEW_TERMS", "4"))  # more new words = a new question
+CONVERSATION_QUERY_WORDS = 48  # longest rewritten query, so chains of follow-ups stay bounded
+
+# Words that point back at the previous answer
+REFERENCES = frozenset(
+    "it its that this these those they them their there above previous earlier last again more "
+    "another same further also else".split()
+)
+# Asking for a different treatment of the same material, not for new material
+REQUESTS = frozenset(
+    "explain elaborate clarify expand rephrase summarize summarise simplify simpler simply example examples "
+    "detail details detailed mean means meant show give tell describe continue go please can could would "
+    "me us about do does did understand understood get got still not don't didn't doesn't sure again "
+    "more another other some one bit little like instance e.g eg so but then ok okay thanks".split()
+)
+OPENERS = ("and ", "but ", "so ", "then ", "what about", "how about", "what if", "why")
+
+
+class ConversationTurn:
+    """One question in a user's window; the latest also keeps what it was answered from"""
+
+    __slots__ = ("message", "query", "at", "version", "context", "citations", "sources", "vocabulary")
+
+    def __init__(self, message: str, query: str, at: float, version: Optional[int] = None,
+                 context: Optional[str] = None, citations: Optional[List[Dict]] = None,
+                 sources: Optional[List[Dict]] = None):
+        self.message = message
+        self.query = query  # standalone form used for retrieval
+        self.at = at
+        self.version = version  # chat cache corpus version the context was retrieved at
+        self.context = context
+        self.citations = citations or []
+        self.sources = sources or []
+        self.vocabulary = frozenset(tokenize(context)) if context else frozenset()
+
+    def forget_context(self):
+        self.context, self.citations, self.sources, self.vocabulary = None, [], [], frozenset()
+
+
+class FollowUp:
+    """How to answer a message given the conversation so far"""
+
+    def __init__(self, kind: str, query: str, question: str, previous: Optional[ConversationTurn] = None):
+        self.kind = kind  # "new", "reuse" or "expand"
+        self.query = query  # retrieval and reranking query
+        self.question = question  # question shown to the LLM
+        self.previous = previous
+
+
+class ConversationStore:
+    """Per-user windows of recent turns, loaded from chat history on first use"""
+
+    def __init__(self, turns: int = CONVERSATION_TURNS, max_users: int = CONVERSATION_USERS,
+                 follow_up_seconds: float = CONVERSATION_FOLLOW_UP_SECONDS,
+                 max_new_terms: int = CONVERSATION_MAX_NEW_TERMS):
+        self.turns = turns
+        self.max_users = max_users
+        self.follow_up_seconds = follow_up_seconds
+        self.max_new_terms = max_new_terms
+        self._windows: "OrderedDict[int, Deque[ConversationTurn]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"new": 0, "reuse": 0, "expand": 0}
+
+    def window(self, user_id: int) -> List[ConversationTurn]:
+        """The user's recent turns, oldest first"""
+        with self._lock:
+            window = self._windows.get(user_id)
+            if window is not None:
+                self._windows.move_to_end(user_id)
+                return list(window)
+        turns = self._load(user_id)
+        with self._lock:
+            # Another request may have recorded a turn meanwhile; it is newer than history
+            window = self._windows.setdefault(user_id, deque(turns, maxlen=self.turns))
+            self._evict()
+            return list(window)
+
+    def _load(self, user_id: int) -> List[ConversationTurn]:
+        from app.database import SessionLocal
+        from app.services.chat_store import chat_store
+
+        db = SessionLocal()
+        try:
+            history, _ = chat_store.page(db, user_id, limit=self.turns)
+        except Exception as e:
+            print(f"Error loading conversation: {e}")
+            history = []
+        finally:
+            db.close()
+        turns = [ConversationTurn(entry["message"], entry["message"], _timestamp(entry["created_at"]))
+                 for entry in reversed(history)]
+        turns += [ConversationTurn(row["message"], row["message"], row["created_at"].timestamp())
+                  for row in chat_store.pending(user_id)]
+        return turns[-self.turns:]
+
+    def _evict(self):
+        while len(self._windows) > self.max_users:
+            self._windows.popitem(last=False)
+
+    def plan(self, user_id: int, message: str, version: Optional[int] = None) -> FollowUp:
+        """Classify a message as a new question or a follow-up to the user's last turn"""
+        window = self.window(user_id)
+        previous = window[-1] if window else None
+        kind = self._classify(message, previous, version)
+        with self._lock:
+            self._counts[kind] += 1
+        if kind == "new":
+            return FollowUp(kind, message, message)
+        if normalize_query(message) == normalize_query(previous.message):
+            # Asked again: same search, and the answer cache holds the answer under the same query
+            query = previous.query
+        else:
+            words = previous.query.split()[:max(CONVERSATION_QUERY_WORDS - len(message.split()), 0)]
+            query = " ".join(words + [message])
+        question = message if normalize_query(query) == normalize_query(message) else \
+            f'{message}\n(Follow-up to the earlier question: "{previous.message}")'
+        return FollowUp(kind, query, question, previous)
+
+    def _classify(self, message: str, previous: Optional[ConversationTurn], version: Optional[int]) -> str:
+        if previous is None or time.time() - previous.at > self.follow_up_seconds:
+            return "new"
+        reusable = previous.context is not None and previous.version == version
+        if normalize_query(message) == normalize_query(previous.message):
+            return "reuse" if reusable else "expand"
+
+        lowered = message.lower().strip()
+        words = set(TOKEN_PATTERN.findall(lowered))
+        terms = [t for t in tokenize(message) if t not in REFERENCES and t not in REQUESTS]
+        referring = bool(words & REFERENCES) or lowered.startswith(OPENERS) or not terms
+        if not referring or len(terms) > self.max_new_terms:
+            return "new"
+        if reusable and all(t in previous.vocabulary for t in terms):
+            return "reuse"
+        return "expand"
+
+    def record(self, user_id: int, message: str, query: str, version: Optional[int] = None,
+               context: Optional[str] = None, citations: Optional[List[Dict]] = None,
+               sources: Optional[List[Dict]] = None):
+        """Add an answered turn; context is the packed prompt context it was answered from"""
+        turn = ConversationTurn(message, query, time.time(), version, context, citations, sources)
+        self.window(user_id)  # loads history first, so the new turn lands after it
+        with self._lock:
+            window = self._windows.setdefault(user_id, deque(maxlen=self.turns))
+            if window:
+                window[-1].forget_context()
+            window.append(turn)
+            self._windows.move_to_end(user_id)
+            self._evict()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+            users = len(self._windows)
+        total = sum(counts.values())
+        return {**counts, "users": users,
+                "follow_up_ratio": (counts["reuse"] + counts["expand"]) / total if total else 0.0,
+                "searches_avoided": counts["reuse"]}
+
+
+def _timestamp(value) -> float:
+    """Epoch seconds from a chat entry's ISO created_at"""
+    if value is None:
+        return 0.0
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+conversation = ConversationStore()
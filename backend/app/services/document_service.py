@@ -9,6 +9,8 @@ import PyPDF2
 from docx import Document as DocxDocument
 from pptx import Presentation
 
+from app.services.telemetry import stage
+
 
 class DocumentService:
     """Service for document processing and text extraction"""
@@ -16,16 +18,17 @@ class DocumentService:
     def extract_text(self, file_path: str, file_type: str) -> str:
         """Extract text from document"""
         try:
-            if file_type == "pdf":
-                return self._extract_from_pdf(file_path)
-            elif file_type == "docx":
-                return self._extract_from_docx(file_path)
-            elif file_type == "pptx":
-                return self._extract_from_pptx(file_path)
-            elif file_type == "txt":
-                return self._extract_from_txt(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_type}")
+            with stage("extraction", file_type=file_type):
+                if file_type == "pdf":
+                    return self._extract_from_pdf(file_path)
+                elif file_type == "docx":
+                    return self._extract_from_docx(file_path)
+                elif file_type == "pptx":
+                    return self._extract_from_pptx(file_path)
+                elif file_type == "txt":
+                    return self._extract_from_txt(file_path)
+                else:
+                    raise ValueError(f"Unsupported file type: {file_type}")
         except Exception as e:
             print(f"Error extracting text: {e}")
             return ""
@@ -36,7 +39,8 @@ class DocumentService:
         with open(file_path, "rb") as file:
             pdf_reader = PyPDF2.PdfReader(file)
             for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+                # Form feed marks page boundaries for citations
+                text += page.extract_text() + "\f"
         return text
     
     def _extract_from_docx(self, file_path: str) -> str:
@@ -53,6 +57,7 @@ class DocumentService:
             for shape in slide.shapes:
                 if hasattr(shape, "text"):
                     text += shape.text + "\n"
+            text += "\f"
         return text
     
     def _extract_from_txt(self, file_path: str) -> str:
@@ -0,0 +1,184 @@
+"""
+Sentence embedding backends: PyTorch, int8-quantized PyTorch and ONNX Runtime
+"""
+
+import os
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+
+# Backend selection
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, torch_int8, onnx, onnx_int8
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "models/minilm-onnx")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = runtime default
+EMBEDDING_MAX_LENGTH = 256  # all-MiniLM-L6-v2 truncates at 256 word pieces
+
+# Output shape and the dtype vectors are kept in once computed. Changing
+# EMBEDDING_DIM requires re-indexing existing Chroma collections.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))  # 0 = native model dimension
+EMBEDDING_STORAGE_DTYPE = np.dtype(os.getenv("EMBEDDING_STORAGE_DTYPE", "float32"))
+
+
+class EmbeddingBackend:
+    """Interface compatible with SentenceTransformer.encode
+
+    A single string returns a 1-D vector, a list returns a 2-D array. Vectors
+    are L2-normalized float32, truncated to EMBEDDING_DIM when set.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, dimension: int = EMBEDDING_DIM):
+        self.model_name = model_name
+        self.output_dim = dimension
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return np.zeros((0, self.output_dim or 0), dtype=np.float32)
+
+        vectors = np.asarray(self._encode(batch, batch_size), dtype=np.float32)
+        if self.output_dim and self.output_dim < vectors.shape[1]:
+            vectors = vectors[:, :self.output_dim]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return len(self.encode("dimension probe"))
+
+
+class TorchBackend(EmbeddingBackend):
+    """Reference SentenceTransformer model in fp32"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, dimension: int = EMBEDDING_DIM):
+        super().__init__(model_name, dimension)
+        from sentence_transformers import SentenceTransformer
+        if EMBEDDING_THREADS > 0:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+        self.model = self._load(SentenceTransformer(model_name, device="cpu"))
+
+    def _load(self, model):
+        return model
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """SentenceTransformer with int8 dynamic quantization of Linear layers"""
+
+    name = "torch_int8"
+
+    def _load(self, model):
+        import torch
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """ONNX Runtime on CPU with mean pooling, optionally int8-quantized"""
+
+    name = "onnx"
+    quantized = False
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, dimension: int = EMBEDDING_DIM,
+                 model_dir: str = EMBEDDING_ONNX_DIR):
+        super().__init__(model_name, dimension)
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise Exception(f"EMBEDDING_BACKEND={self.name} requires onnxruntime and transformers")
+
+        model_dir = Path(model_dir)
+        model_file = model_dir / ("model_quantized.onnx" if self.quantized else "model.onnx")
+        if not model_file.exists():
+            export_onnx(model_name, model_dir, quantize=self.quantized)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMBEDDING_THREADS > 0:
+            options.intra_op_num_threads = EMBEDDING_THREADS
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        outputs = []
+        for i in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=EMBEDDING_MAX_LENGTH,
+                return_tensors="np"
+            )
+            inputs = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            hidden = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real tokens, as the SentenceTransformer model does
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            outputs.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        return np.vstack(outputs)
+
+
+class QuantizedOnnxBackend(OnnxBackend):
+    """ONNX Runtime with dynamic int8 weights"""
+
+    name = "onnx_int8"
+    quantized = True
+
+
+def export_onnx(model_name: str, output_dir: Path, quantize: bool = True):
+    """Export a SentenceTransformer model to ONNX (and int8) with optimum"""
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise Exception(f"No ONNX model in {output_dir}; exporting one requires optimum[onnxruntime]")
+
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    output_dir = Path(output_dir)
+    print(f"Exporting {hub_name} to ONNX in {output_dir}...")
+    model = ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(hub_name).save_pretrained(output_dir)
+
+    if quantize:
+        quantizer = ORTQuantizer.from_pretrained(model)
+        config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=output_dir, quantization_config=config)
+
+
+def to_storage(vectors) -> np.ndarray:
+    """Cast vectors to the configured storage dtype (float16 halves memory)"""
+    return np.asarray(vectors, dtype=EMBEDDING_STORAGE_DTYPE)
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    QuantizedTorchBackend.name: QuantizedTorchBackend,
+    OnnxBackend.name: OnnxBackend,
+    QuantizedOnnxBackend.name: QuantizedOnnxBackend,
+}
+
+
+def create_embedder(name: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL,
+                    dimension: int = EMBEDDING_DIM) -> EmbeddingBackend:
+    """Instantiate an embedding backend by name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_name, dimension)
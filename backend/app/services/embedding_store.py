@@ -0,0 +1,172 @@
+"""
+Embedding column services: packed vectors in Video and Document rows
+
+Video.transcript_embeddings and Document.content_embeddings hold the
+vector their text was indexed with, so the vector store can be rebuilt
+from SQL without running the model. A value is a 12-byte header (magic,
+dtype code, ndim, rows, dimension) followed by the raw little-endian
+array. A 384-dimensional float16 vector takes 780 bytes; as a JSON list
+it took about 8 KB. unpack_embedding returns a read-only NumPy view of
+the bytes, with no parsing or copying.
+
+The columns used to be JSON. migrate_embedding_columns converts such
+values in place on startup: on SQLite it rewrites the text values, and on
+PostgreSQL it swaps each json column for a bytea column.
+"""
+
+import json
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import inspect, text
+
+from app.models import Document, Video
+
+EMBEDDING_COLUMN_DTYPE = np.dtype(os.getenv("EMBEDDING_COLUMN_DTYPE", "float16"))  # float16 or float32
+
+MAGIC = b"EV"
+HEADER = struct.Struct("<2sBBII")  # magic, dtype code, ndim, rows, dimension
+DTYPES = {1: np.dtype("<f2"), 2: np.dtype("<f4")}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+MIGRATE_BATCH = 500
+
+# (table, key column, embedding column) of every packed embedding column
+COLUMNS = (
+    ("videos", "id", "transcript_embeddings"),
+    ("documents", "id", "content_embeddings"),
+)
+
+
+def pack_embedding(vectors, dtype: np.dtype = EMBEDDING_COLUMN_DTYPE) -> bytes:
+    """Header and raw array bytes for one vector or a matrix of vectors"""
+    dtype = np.dtype(dtype).newbyteorder("<")
+    array = np.asarray(vectors, dtype=dtype)
+    if array.ndim not in (1, 2):
+        raise ValueError(f"Embeddings must be a vector or a matrix, got {array.ndim} dimensions")
+    rows, dimension = (1, array.shape[0]) if array.ndim == 1 else array.shape
+    return HEADER.pack(MAGIC, DTYPE_CODES[dtype], array.ndim, rows, dimension) + array.tobytes()
+
+
+def unpack_embedding(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    """Read-only view of a packed value; None stays None"""
+    if blob is None:
+        return None
+    magic, code, ndim, rows, dimension = HEADER.unpack_from(blob)
+    if magic != MAGIC or code not in DTYPES:
+        raise ValueError("Not a packed embedding")
+    array = np.frombuffer(blob, dtype=DTYPES[code], count=rows * dimension, offset=HEADER.size)
+    return array if ndim == 1 else array.reshape(rows, dimension)
+
+
+def _from_json(value) -> Optional[bytes]:
+    """Packed form of a legacy JSON value, or None for null and values that are not vectors"""
+    if isinstance(value, (str, bytes)):
+        value = json.loads(value)
+    if not value:
+        return None
+    try:
+        return pack_embedding(np.asarray(value, dtype=np.float32))
+    except (TypeError, ValueError):
+        return None
+
+
+def migrate_embedding_columns(engine) -> Dict[str, int]:
+    """Convert JSON embedding values to packed bytes; returns converted counts by column"""
+    converted = {}
+    for table, key, column in COLUMNS:
+        if engine.dialect.name == "sqlite":
+            count = _migrate_sqlite(engine, table, key, column)
+        elif engine.dialect.name == "postgresql":
+            count = _migrate_postgres(engine, table, key, column)
+        else:
+            continue
+        if count:
+            converted[f"{table}.{column}"] = count
+    return converted
+
+
+def _convert(engine, table: str, key: str, where: str, source: str, target: str) -> int:
+    """Rewrite JSON values selected by where into the target column, in batches by key"""
+    count, after = 0, None
+    select = f"SELECT {key}, {source} FROM {table} WHERE {where}"
+    while True:
+        with engine.begin() as conn:
+            keyset = f" AND {key} > :after" if after is not None else ""
+            rows = conn.execute(text(f"{select}{keyset} ORDER BY {key} LIMIT :limit"),
+                                {"after": after, "limit": MIGRATE_BATCH}).fetchall()
+            if not rows:
+                return count
+            conn.execute(text(f"UPDATE {table} SET {target} = :value WHERE {key} = :key"),
+                         [{"key": row[0], "value": _from_json(row[1])} for row in rows])
+            count += len(rows)
+            after = rows[-1][0]
+
+
+def _migrate_sqlite(engine, table: str, key: str, column: str) -> int:
+    # SQLite keeps the declared JSON type but stores any value; JSON was written as text
+    return _convert(engine, table, key, f"typeof({column}) = 'text'", column, column)
+
+
+def _migrate_postgres(engine, table: str, key: str, column: str) -> int:
+    columns = {c["name"]: c for c in inspect(engine).get_columns(table)}
+    if column not in columns or columns[column]["type"].__class__.__name__ not in ("JSON", "JSONB"):
+        return 0
+    packed = f"{column}_packed"
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {packed} BYTEA"))
+    count = _convert(engine, table, key, f"{column} IS NOT NULL", f"{column}::text", packed)
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {packed} TO {column}"))
+    return count
+
+
+def save_embeddings(db, kind: str, vectors: Dict[int, np.ndarray]):
+    """Store each row's indexed vector; the caller commits"""
+    model, column = (Video, "transcript_embeddings") if kind == "video" else (Document, "content_embeddings")
+    if vectors:
+        db.bulk_update_mappings(model, [{"id": row_id, column: pack_embedding(vector)}
+                                        for row_id, vector in vectors.items()])
+
+
+def video_embeddings(db, video_ids: Iterable[int]) -> Dict[int, np.ndarray]:
+    """Stored transcript vectors by video id; videos without one are left out"""
+    ids = list(video_ids)
+    found = {}
+    for offset in range(0, len(ids), MIGRATE_BATCH):
+        rows = db.query(Video.id, Video.transcript_embeddings).filter(
+            Video.id.in_(ids[offset:offset + MIGRATE_BATCH]), Video.transcript_embeddings.isnot(None))
+        for video_id, blob in rows:
+            found[video_id] = unpack_embedding(blob)
+    return found
+
+
+def stored_contexts(db, batch: int = MIGRATE_BATCH) -> Iterator[Tuple[int, List[Dict]]]:
+    """(owner id, store_contexts items with their stored vectors) in batches, for rebuilding a vector store"""
+    queries = (
+        ("video", db.query(Video.id, Video.uploader_id, Video.transcript, Video.transcript_embeddings,
+                           Video.title, Video.subject, Video.topic)),
+        ("document", db.query(Document.id, Document.owner_id, Document.content, Document.content_embeddings,
+                              Document.title, Document.file_type)),
+    )
+    for kind, query in queries:
+        model = Video if kind == "video" else Document
+        last_id = 0
+        while True:
+            rows = query.filter(model.id > last_id).order_by(model.id).limit(batch).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            by_owner: Dict[int, List[Dict]] = {}
+            for row in rows:
+                if not row[2] or row[3] is None:
+                    continue
+                # Same metadata the upload paths pass to AIService.store_context
+                metadata = {"title": row[4], "subject": row[5], "topic": row[6]} if kind == "video" else \
+                    {"title": row[4], "type": row[5]}
+                by_owner.setdefault(row[1], []).append({"type": kind, "id": row[0], "content": row[2],
+                                                        "embedding": unpack_embedding(row[3]),
+                                                        "metadata": metadata})
+            yield from by_owner.items()
@@ -0,0 +1,209 @@
+"""
+Executor services: named thread pools for blocking work and an event-loop lag monitor
+
+Nothing that blocks runs on the event loop. Route handlers that use the
+sync SQLAlchemy session are plain functions marked @runs_in("db"), which
+awaits them on the db pool. Heavier calls inside a handler go to a pool
+sized for that kind of work with call(name, fn, ...):
+
+- db: route handlers and their session work
+- auth: bcrypt hashing and verification
+- media: ffprobe, ffmpeg and OpenCV (each already multi-threaded, so few at once)
+- extraction: PDF, DOCX and PPTX text extraction
+- embedding: query embeddings, vector search and reranking
+
+Calls keep the caller's context variables, so traces and profiles follow the
+work into the pool. LoopMonitor measures how late the loop wakes up, and a
+watchdog thread logs the loop thread's stack whenever it stalls longer than
+LOOP_BLOCK_MS, which names the blocking call.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.services.profiler import fold_stack
+from app.services.telemetry import registry
+
+EXECUTOR_SIZES = {
+    "db": int(os.getenv("EXECUTOR_DB_THREADS", "16")),
+    "auth": int(os.getenv("EXECUTOR_AUTH_THREADS", "4")),
+    "media": int(os.getenv("EXECUTOR_MEDIA_THREADS", "2")),
+    "extraction": int(os.getenv("EXECUTOR_EXTRACTION_THREADS", "4")),
+    "embedding": int(os.getenv("EXECUTOR_EMBEDDING_THREADS", "2")),
+}
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_BLOCK_MS = float(os.getenv("LOOP_BLOCK_MS", "100"))  # log the loop's stack past this stall; 0 = off
+LOOP_BLOCKS_KEPT = 50
+
+EXECUTOR_WAIT_SECONDS = registry.histogram(
+    "nest_executor_wait_seconds", "Time calls wait for a thread in each executor", ["executor"])
+LOOP_LAG_SECONDS = registry.histogram(
+    "nest_event_loop_lag_seconds", "How late the event loop woke from a timed sleep",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_BLOCKS = registry.counter(
+    "nest_event_loop_blocks_total", "Event loop stalls longer than LOOP_BLOCK_MS")
+
+
+class NamedExecutor:
+    """Thread pool with a name, a fixed size and counts of queued and running calls"""
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.queued = 0
+        self.running = 0
+        self._pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=name)
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        context = contextvars.copy_context()
+        enqueued = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def task():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            self._threads.add(threading.get_ident())
+            EXECUTOR_WAIT_SECONDS.observe(time.perf_counter() - enqueued, executor=self.name)
+            try:
+                return context.run(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        return self._pool.submit(task)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run fn on this pool and wait for it; inline if already on one of its threads"""
+        if threading.get_ident() in self._threads:
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Await fn on this pool without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict:
+        return {"size": self.size, "queued": self.queued, "running": self.running}
+
+
+executors: Dict[str, NamedExecutor] = {name: NamedExecutor(name, size) for name, size in EXECUTOR_SIZES.items()}
+
+
+def call(name: str, fn: Callable, *args, **kwargs):
+    """Run a blocking call on the named pool from sync code, e.g. a handler on the db pool"""
+    return executors[name].call(fn, *args, **kwargs)
+
+
+async def run(name: str, fn: Callable, *args, **kwargs):
+    """Await a blocking call on the named pool from async code"""
+    return await executors[name].run(fn, *args, **kwargs)
+
+
+def runs_in(name: str):
+    """Serve a sync route handler from the named pool instead of the event loop
+
+    FastAPI reads the handler's signature through functools.wraps, so
+    dependencies and parameters work as on the plain function.
+    """
+    executor = executors[name]
+
+    def decorate(fn: Callable):
+        @functools.wraps(fn)
+        async def handler(*args, **kwargs):
+            return await executor.run(fn, *args, **kwargs)
+        return handler
+
+    return decorate
+
+
+class LoopMonitor:
+    """Measures event-loop lag and records the loop thread's stack when it stalls"""
+
+    def __init__(self, interval_ms: float = LOOP_LAG_INTERVAL_MS, block_ms: float = LOOP_BLOCK_MS,
+                 keep: int = LOOP_BLOCKS_KEPT):
+        self.interval = interval_ms / 1000
+        self.block = block_ms / 1000
+        self.blocks: deque = deque(maxlen=keep)
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._stall: Optional[Dict] = None  # block being recorded, finished by the next tick
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.block > 0
+
+    def start(self):
+        """Start measuring the running loop; call from inside it, e.g. at startup"""
+        if not self.enabled or self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        threading.Thread(target=self._watch, name="loop-monitor", daemon=True).start()
+
+    def stop(self):
+        """Stop measuring; call from the loop that started it"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stopped.set()
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            LOOP_LAG_SECONDS.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._beat = now
+            stall, self._stall = self._stall, None
+            if stall is not None:
+                stall["blocked_ms"] = round(lag * 1000, 1)
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.block or (self._stall is not None and self._stall["beat"] == beat):
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = fold_stack(frame).split(";") if frame is not None else []
+            del frame
+            self._stall = {"beat": beat, "at": time.time(), "blocked_ms": round(stalled * 1000, 1),
+                           "stack": stack[-20:]}
+            self.blocks.append(self._stall)
+            LOOP_BLOCKS.inc()
+            print(f"Event loop blocked for {stalled * 1000:.0f} ms in {stack[-1] if stack else 'unknown'}")
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        return [{k: v for k, v in block.items() if k != "beat"} for block in list(self.blocks)[-limit:][::-1]]
+
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, "block_ms": self.block * 1000, "max_lag_ms": round(self.max_lag * 1000, 1),
+                "blocks": len(self.blocks), "executors": {name: e.stats() for name, e in executors.items()}}
+
+
+registry.gauge(
+    "nest_executor_calls", "Calls queued or running in each named executor", ["executor", "state"],
+    callback=lambda: {(name, state): e.stats()[state] for name, e in executors.items()
+                      for state in ("queued", "running")}
+)
+
+loop_monitor = LoopMonitor()
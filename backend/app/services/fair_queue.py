@@ -0,0 +1,146 @@
+"""
+Priority classes with per-tenant weighted fair queuing for background jobs
+"""
+
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional
+
+# Priority classes, served strictly in this order
+PRIORITY_INTERACTIVE = 0   # a user waiting on their own upload
+PRIORITY_BULK = 1          # backfills and bulk uploads
+PRIORITY_RETRANSCRIBE = 2  # quality upgrades of existing drafts
+
+CLASS_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BULK: "bulk",
+    PRIORITY_RETRANSCRIBE: "retranscribe",
+}
+
+# Queue-age objectives: a job waiting longer than this counts as an SLO miss
+QUEUE_SLO_SECONDS = {
+    PRIORITY_INTERACTIVE: float(os.getenv("QUEUE_SLO_INTERACTIVE", "120")),
+    PRIORITY_BULK: float(os.getenv("QUEUE_SLO_BULK", "3600")),
+    PRIORITY_RETRANSCRIBE: float(os.getenv("QUEUE_SLO_RETRANSCRIBE", "86400")),
+}
+
+WAIT_SAMPLES = 1000  # recent queue waits kept per class for percentiles
+
+
+class _ClassQueue:
+    """Start-time fair queuing between tenants inside one priority class"""
+
+    def __init__(self):
+        self.heap = []
+        self.virtual_time = 0.0
+        self.last_finish: Dict[Any, float] = {}
+        self.queued_by_tenant: Dict[Any, int] = defaultdict(int)
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.dispatched = 0
+        self.slo_misses = 0
+
+    def push(self, sequence: int, item, tenant, cost: float, weight: float):
+        # A tenant's next job starts where its previous one finished, so a
+        # tenant with many queued jobs falls behind tenants with few
+        start = max(self.virtual_time, self.last_finish.get(tenant, 0.0))
+        finish = start + cost / weight
+        self.last_finish[tenant] = finish
+        self.queued_by_tenant[tenant] += 1
+        heapq.heappush(self.heap, (finish, sequence, start, tenant, time.time(), item))
+
+    def pop(self):
+        _, _, start, tenant, enqueued_at, item = heapq.heappop(self.heap)
+        self.virtual_time = start
+        self.queued_by_tenant[tenant] -= 1
+        if not self.queued_by_tenant[tenant]:
+            del self.queued_by_tenant[tenant]
+            if self.last_finish.get(tenant, 0.0) <= self.virtual_time:
+                del self.last_finish[tenant]
+        return enqueued_at, item
+
+    def oldest_age(self, now: float) -> float:
+        return max((now - entry[4] for entry in self.heap), default=0.0)
+
+
+class FairQueue:
+    """Blocking queue: strict priority between classes, weighted fairness between tenants"""
+
+    def __init__(self, weights: Optional[Dict[Any, float]] = None,
+                 slo_seconds: Dict[int, float] = QUEUE_SLO_SECONDS, maxsize: int = 0):
+        self.weights = weights or {}
+        self.maxsize = maxsize
+        self.slo_seconds = slo_seconds
+        self._classes: Dict[int, _ClassQueue] = defaultdict(_ClassQueue)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._size = 0
+
+    def put(self, item, priority: int = PRIORITY_INTERACTIVE, tenant=None, cost: float = 1.0):
+        """Queue an item; cost is the job's expected work (e.g. minutes of audio)
+
+        Blocks while the queue holds maxsize items, when maxsize is set.
+        """
+        weight = self.weights.get(tenant, 1.0)
+        with self._cond:
+            if self.maxsize:
+                self._cond.wait_for(lambda: self._size < self.maxsize)
+            self._classes[priority].push(next(self._sequence), item, tenant, max(cost, 1e-6), weight)
+            self._size += 1
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None):
+        """Remove and return the next item, blocking until one is available"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size > 0, timeout):
+                raise queue.Empty
+            priority = min(p for p, c in self._classes.items() if c.heap)
+            cls = self._classes[priority]
+            enqueued_at, item = cls.pop()
+            self._size -= 1
+            self._cond.notify_all()
+
+            wait = time.time() - enqueued_at
+            cls.waits.append(wait)
+            cls.dispatched += 1
+            if wait > self.slo_seconds.get(priority, float("inf")):
+                cls.slo_misses += 1
+            return item
+
+    def qsize(self) -> int:
+        return self._size
+
+    def queued(self, tenant, priority: int) -> int:
+        """Items a tenant has waiting in one priority class"""
+        with self._cond:
+            cls = self._classes.get(priority)
+            return cls.queued_by_tenant.get(tenant, 0) if cls else 0
+
+    def stats(self) -> Dict:
+        """Depth, queue-age percentiles and SLO misses per priority class"""
+        now = time.time()
+        with self._cond:
+            stats = {}
+            for priority, cls in sorted(self._classes.items()):
+                waits = sorted(cls.waits)
+                stats[CLASS_NAMES.get(priority, str(priority))] = {
+                    "queued": len(cls.heap),
+                    "tenants": len(cls.queued_by_tenant),
+                    "oldest_age_seconds": cls.oldest_age(now),
+                    "dispatched": cls.dispatched,
+                    "wait_p50_seconds": _percentile(waits, 0.50),
+                    "wait_p95_seconds": _percentile(waits, 0.95),
+                    "slo_seconds": self.slo_seconds.get(priority),
+                    "slo_misses": cls.slo_misses,
+                }
+            return stats
+
+
+def _percentile(ordered, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -0,0 +1,224 @@
+"""
+HTTP caching services: response compression, ETags and a short response cache
+
+Conditional requests: routes derive a strong ETag from the versions of the
+rows they serialize. A row's version is its id, updated_at (or created_at)
+and view count. When the client's If-None-Match still matches, the route
+answers 304 before loading or serializing the rows.
+
+Compression: CompressionMiddleware picks Brotli (when the brotli package is
+installed) or gzip from Accept-Encoding for complete JSON and text bodies.
+Streamed responses pass through untouched: server-sent events, video files
+and range requests.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 4-5 is close to gzip -6 in speed, smaller output
+VIDEO_LIST_CACHE_SECONDS = float(os.getenv("VIDEO_LIST_CACHE_SECONDS", "10"))  # 0 disables
+VIDEO_LIST_CACHE_SIZE = int(os.getenv("VIDEO_LIST_CACHE_SIZE", "512"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+def row_version(row) -> Tuple:
+    """Version of a video-like row: id, last change and view count"""
+    return (row.id, str(row.updated_at or row.created_at), getattr(row, "views_count", None))
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag over the given version parts"""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _client_etags(request: Request) -> List[str]:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        # The compression middleware tags each encoding of a body separately
+        for suffix in ENCODING_SUFFIXES:
+            if tag.endswith(suffix + '"'):
+                tag = tag[:-len(suffix) - 1] + '"'
+        tags.append(tag)
+    return tags
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if If-None-Match lists this ETag (or *)"""
+    tags = _client_etags(request)
+    return "*" in tags or etag in tags
+
+
+def not_modified_response(etag: str, private: bool = False) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, private))
+
+
+def cache_headers(etag: str, private: bool = False) -> Dict[str, str]:
+    # no-cache: clients may store the body but revalidate it with the ETag each time
+    return {"ETag": etag, "Cache-Control": f"{'private' if private else 'public'}, no-cache"}
+
+
+def etag_response(content, etag: str, private: bool = False) -> JSONResponse:
+    """JSON response carrying its ETag and revalidation headers"""
+    return JSONResponse(content=jsonable_encoder(content), headers=cache_headers(etag, private))
+
+
+class ResponseCache:
+    """Serialized responses kept for a few seconds, keyed on request parameters"""
+
+    def __init__(self, ttl: float = VIDEO_LIST_CACHE_SECONDS, maxsize: int = VIDEO_LIST_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple, Tuple[float, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, bytes]]:
+        """(etag, body) if a fresh entry exists"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Tuple, etag: str, body: bytes):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0}
+
+
+def _accepted_encoding(headers: Iterable[Tuple[bytes, bytes]]) -> Optional[str]:
+    """Preferred supported encoding from Accept-Encoding, honouring q=0"""
+    accept = ""
+    for name, value in headers:
+        if name == b"accept-encoding":
+            accept = value.decode("latin-1").lower()
+            break
+    accepted = {}
+    for part in accept.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """Brotli or gzip for complete, compressible response bodies"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _accepted_encoding(scope["headers"])
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body") or not self._compressible(start, body):
+                # Streamed or unsuitable: send as is from here on
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = brotli.compress(body, quality=BROTLI_QUALITY) if encoding == "br" \
+                else gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers = [(k, v) for k, v in start["headers"]
+                       if k not in (b"content-length", b"etag", b"vary")]
+            for k, v in start["headers"]:
+                if k == b"etag":
+                    # A strong ETag names one exact representation, so tag each encoding
+                    headers.append((k, v[:-1] + f'-{encoding}"'.encode() if v.endswith(b'"') else v))
+                elif k == b"vary":
+                    headers.append((k, v if b"accept-encoding" in v.lower() else v + b", Accept-Encoding"))
+            if not any(k == b"vary" for k, _ in headers):
+                headers.append((b"vary", b"Accept-Encoding"))
+            headers += [(b"content-encoding", encoding.encode()),
+                        (b"content-length", str(len(compressed)).encode())]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, start, body: bytes) -> bool:
+        if len(body) < self.minimum_size or start["status"] in (204, 206, 304):
+            return False
+        content_type = ""
+        for k, v in start["headers"]:
+            if k == b"content-encoding":
+                return False
+            if k == b"content-type":
+                content_type = v.decode("latin-1").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES) and "text/event-stream" not in content_type
+
+
+video_list_cache = ResponseCache()
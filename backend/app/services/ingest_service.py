@@ -0,0 +1,469 @@
+"""
+Bulk ingestion pipeline for backfilling course videos and documents
+"""
+
+import csv
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.database import SessionLocal
+from app.models import User, Video, Document
+from app.services.embedding_store import pack_embedding, save_embeddings
+from app.services.fair_queue import FairQueue, PRIORITY_BULK, PRIORITY_RETRANSCRIBE
+from app.services.learning_context import learning_context
+from app.services.transcript_segments import save_segments
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".mkv", ".webm", ".avi"}
+DOCUMENT_EXTENSIONS = {".pdf", ".docx", ".pptx", ".txt"}
+
+_DONE = object()  # end-of-stream marker passed between stages
+_DONE_PRIORITY = PRIORITY_RETRANSCRIBE + 1  # end markers sort after every real job
+
+
+class IngestItem:
+    """One source file moving through the pipeline"""
+
+    def __init__(self, source: Path, kind: str, metadata: Dict, owner_email: str):
+        self.source = source
+        self.kind = kind  # "video" or "document"
+        self.metadata = metadata
+        self.owner_email = owner_email
+        self.file_path: Optional[Path] = None
+        self.content = ""
+        self.segments: Optional[List[Dict]] = None  # Whisper timings for video transcripts
+        self.duration: Optional[float] = None
+        self.thumbnail_key: Optional[str] = None
+        self.embedding = None
+        self.error: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        """Checkpoint key; changes if the source file is modified"""
+        stat = self.source.stat()
+        return f"{self.source.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Checkpoint:
+    """Append-only JSON lines log of finished items, used to resume"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.done = set()
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from an interrupted run
+                    if record.get("status") == "done":
+                        self.done.add(record["key"])
+
+    def record(self, items: List[IngestItem]):
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            for item in items:
+                status = "failed" if item.error else "done"
+                file.write(json.dumps({
+                    "key": item.key,
+                    "path": str(item.source),
+                    "status": status,
+                    "error": item.error,
+                }) + "\n")
+                if status == "done":
+                    self.done.add(item.key)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class StageStats:
+    """Item count and busy time for one pipeline stage"""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count: int, seconds: float, failed: int = 0):
+        with self._lock:
+            self.processed += count
+            self.failed += failed
+            self.busy += seconds
+
+    def line(self, elapsed: float) -> str:
+        rate = self.processed / elapsed if elapsed else 0.0
+        utilization = self.busy / (elapsed * self.workers) if elapsed else 0.0
+        return (f"{self.name:<11} {self.processed:>7} done {self.failed:>5} failed "
+                f"{rate:>8.2f}/s  {utilization:>5.0%} busy")
+
+
+def discover(root: Path, owner_email: str, defaults: Dict) -> Iterator[IngestItem]:
+    """Walk a directory for supported videos and documents"""
+    for path in sorted(Path(root).rglob("*")):
+        kind = _kind(path)
+        if kind and path.is_file():
+            metadata = {"title": path.stem.replace("_", " "), **defaults}
+            yield IngestItem(path, kind, metadata, owner_email)
+
+
+def read_manifest(manifest: Path, owner_email: str, defaults: Dict) -> Iterator[IngestItem]:
+    """Read a .csv or .jsonl manifest with path, title, description, subject, topic, level, owner_email"""
+    manifest = Path(manifest)
+    with open(manifest, "r", encoding="utf-8") as file:
+        if manifest.suffix.lower() == ".csv":
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [json.loads(line) for line in file if line.strip()]
+
+    for row in rows:
+        path = Path(row["path"])
+        if not path.is_absolute():
+            path = manifest.parent / path
+        kind = _kind(path)
+        if not kind:
+            print(f"Skipping unsupported file: {path}")
+            continue
+        metadata = {"title": path.stem.replace("_", " "), **defaults}
+        metadata.update({
+            field: row[field] for field in ("title", "description", "subject", "topic", "level")
+            if row.get(field)
+        })
+        yield IngestItem(path, kind, metadata, row.get("owner_email") or owner_email)
+
+
+def _kind(path: Path) -> Optional[str]:
+    suffix = path.suffix.lower()
+    if suffix in VIDEO_EXTENSIONS:
+        return "video"
+    if suffix in DOCUMENT_EXTENSIONS:
+        return "document"
+    return None
+
+
+class IngestPipeline:
+    """Extract -> transcribe -> embed -> write, with bounded queues between stages"""
+
+    def __init__(self, checkpoint: Checkpoint, extract_workers: int = 4,
+                 transcribe_workers: int = 1, queue_size: int = 64, batch_size: int = 32,
+                 copy_files: bool = True, report_interval: float = 10.0):
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.copy_files = copy_files
+        self.report_interval = report_interval
+
+        self.workers = {"extract": extract_workers, "transcribe": transcribe_workers,
+                        "embed": 1, "write": 1}
+        self.queues = {name: queue.Queue(maxsize=queue_size)
+                       for name in ("extract", "embed", "write")}
+        # Transcription is the slow stage: interleave owners so one teacher's
+        # backlog does not hold everyone else's videos behind it
+        self.queues["transcribe"] = FairQueue(maxsize=queue_size)
+        self.stats = {name: StageStats(name, count) for name, count in self.workers.items()}
+
+        self._services: Dict[str, object] = {}
+        self._services_lock = threading.Lock()
+        self._owners: Dict[str, int] = {}
+
+    def _service(self, name: str):
+        """Load heavy services only once a stage actually needs them"""
+        with self._services_lock:
+            if name not in self._services:
+                if name == "video":
+                    from app.services.video_service import VideoService
+                    self._services[name] = VideoService()
+                elif name == "document":
+                    from app.services.document_service import DocumentService
+                    self._services[name] = DocumentService()
+                elif name == "thumbnail":
+                    from app.services.thumbnail_service import thumbnail_service
+                    self._services[name] = thumbnail_service
+                elif name == "ai":
+                    from app.services.ai_service import get_ai_service
+                    self._services[name] = get_ai_service()
+            return self._services[name]
+
+    def run(self, items: Iterator[IngestItem]):
+        """Run the pipeline to completion and print per-stage throughput"""
+        started = time.perf_counter()
+        stages = [
+            ("extract", [self._item_worker("extract", self._extract, self._route_extracted)
+                         for _ in range(self.workers["extract"])]),
+            ("transcribe", [self._item_worker("transcribe", self._transcribe,
+                                              lambda item: self.queues["embed"])
+                            for _ in range(self.workers["transcribe"])]),
+            ("embed", [self._batch_worker("embed", self._embed, lambda: self.queues["write"])]),
+            ("write", [self._batch_worker("write", self._write, None)]),
+        ]
+
+        running = []
+        for name, targets in stages:
+            threads = [threading.Thread(target=target, name=f"ingest-{name}", daemon=True)
+                       for target in targets]
+            for thread in threads:
+                thread.start()
+            running.append((name, threads))
+
+        stop = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(started, stop), daemon=True)
+        reporter.start()
+
+        skipped = 0
+        for item in items:
+            if item.key in self.checkpoint.done:
+                skipped += 1
+                continue
+            self.queues["extract"].put(item)
+
+        # Close stages in order: embed is fed by both extract and transcribe,
+        # so it only gets its end marker once both have drained
+        for name, threads in running:
+            for _ in threads:
+                self._forward(self.queues[name], _DONE)
+            for thread in threads:
+                thread.join()
+
+        stop.set()
+        reporter.join()
+        print(f"Skipped {skipped} items already in the checkpoint")
+        self._print_stats(started)
+
+    def _item_worker(self, stage: str, handler: Callable, route: Callable):
+        def work():
+            source = self.queues[stage]
+            while True:
+                item = source.get()
+                if item is _DONE:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    handler(item)
+                except Exception as e:
+                    item.error = f"{stage}: {e}"
+                self.stats[stage].add(1, time.perf_counter() - t0, failed=int(item.error is not None))
+                if item.error:
+                    self.checkpoint.record([item])
+                    print(f"Failed {item.source}: {item.error}")
+                else:
+                    self._forward(route(item), item)
+        return work
+
+    def _batch_worker(self, stage: str, handler: Callable, target: Optional[Callable]):
+        def work():
+            source = self.queues[stage]
+            finished = False
+            while not finished:
+                batch = []
+                item = source.get()
+                if item is _DONE:
+                    return
+                batch.append(item)
+                # Fill the batch with whatever is already waiting
+                while len(batch) < self.batch_size:
+                    try:
+                        item = source.get(timeout=0.2)
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                t0 = time.perf_counter()
+                try:
+                    handler(batch)
+                except Exception as e:
+                    for entry in batch:
+                        entry.error = f"{stage}: {e}"
+                failed = [entry for entry in batch if entry.error]
+                self.stats[stage].add(len(batch), time.perf_counter() - t0, failed=len(failed))
+                if failed:
+                    self.checkpoint.record(failed)
+                    for entry in failed:
+                        print(f"Failed {entry.source}: {entry.error}")
+                if target is not None:
+                    for entry in batch:
+                        if not entry.error:
+                            self._forward(target(), entry)
+        return work
+
+    def _forward(self, target, item):
+        """Put an item on the next stage's queue"""
+        if not isinstance(target, FairQueue):
+            target.put(item)
+        elif item is _DONE:
+            target.put(item, _DONE_PRIORITY)
+        else:
+            target.put(item, PRIORITY_BULK, tenant=item.owner_email,
+                       cost=max((item.duration or 0) / 60, 1.0))
+
+    def _route_extracted(self, item: IngestItem):
+        return self.queues["transcribe" if item.kind == "video" else "embed"]
+
+    # Stage handlers
+
+    def _extract(self, item: IngestItem):
+        """Copy the file into uploads and pull out text, duration and thumbnails"""
+        upload_dir = Path("uploads/videos" if item.kind == "video" else "uploads/documents")
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        if self.copy_files:
+            item.file_path = upload_dir / f"bulk_{item.source.stat().st_ino}_{item.source.name}"
+            if not item.file_path.exists():
+                shutil.copy2(item.source, item.file_path)
+        else:
+            item.file_path = item.source
+
+        if item.kind == "document":
+            file_type = item.file_path.suffix.lower()[1:]
+            item.content = self._service("document").extract_text(str(item.file_path), file_type)
+            return
+
+        item.duration = self._service("video").get_video_duration(str(item.file_path))
+        try:
+            item.thumbnail_key = self._service("thumbnail").generate(str(item.file_path))
+        except Exception as e:
+            print(f"Error generating thumbnails for {item.source}: {e}")
+
+    def _transcribe(self, item: IngestItem):
+        transcription = self._service("video").transcribe_video(str(item.file_path))
+        item.content = (transcription.get("text") or "").strip()
+        item.segments = transcription.get("segments")
+
+    def _embed(self, batch: List[IngestItem]):
+        texts = [item for item in batch if item.content]
+        if texts:
+            vectors = self._service("ai").embedder.encode([item.content for item in texts])
+            for item, vector in zip(texts, vectors):
+                item.embedding = vector
+
+    def _write(self, batch: List[IngestItem]):
+        """Insert rows in one transaction, then add their vectors per owner
+
+        A row already written for the same stored file is updated instead, so
+        resuming a batch that failed or was interrupted after its first commit
+        does not duplicate it.
+        """
+        from app.services.thumbnail_service import thumbnail_url
+
+        db = SessionLocal()
+        try:
+            owners = {}
+            for item in batch:
+                try:
+                    owners[item] = self._owner_id(db, item.owner_email)
+                except Exception as e:
+                    item.error = f"write: {e}"
+            written = [item for item in batch if not item.error]
+            existing = self._existing_rows(db, written)
+
+            rows = []
+            for item in written:
+                owner_id = owners[item]
+                packed = pack_embedding(item.embedding) if item.content and item.embedding is not None else None
+                if item.kind == "video":
+                    fields = dict(
+                        title=item.metadata["title"],
+                        description=item.metadata.get("description"),
+                        file_path=str(item.file_path),
+                        thumbnail_key=item.thumbnail_key,
+                        thumbnail_path=thumbnail_url(item.thumbnail_key) if item.thumbnail_key else None,
+                        duration=item.duration,
+                        subject=item.metadata.get("subject"),
+                        topic=item.metadata.get("topic"),
+                        level=item.metadata.get("level"),
+                        transcript=item.content or None,
+                        transcript_embeddings=packed,
+                        uploader_id=owner_id
+                    )
+                else:
+                    fields = dict(
+                        title=item.metadata["title"],
+                        file_path=str(item.file_path),
+                        file_type=item.file_path.suffix.lower()[1:],
+                        content=item.content or None,
+                        content_embeddings=packed,
+                        owner_id=owner_id
+                    )
+                row = existing.get((item.kind, owner_id, str(item.file_path)))
+                reused = row is not None
+                if reused:
+                    for name, value in fields.items():
+                        setattr(row, name, value)
+                else:
+                    row = (Video if item.kind == "video" else Document)(**fields)
+                    db.add(row)
+                rows.append((item, owner_id, row, reused))
+            db.flush()
+            for item, _, row, reused in rows:
+                if item.kind == "video" and (item.segments or reused):
+                    save_segments(db, row.id, item.content, item.segments)
+                    if reused:
+                        learning_context.invalidate_video(db, row.id)
+            learning_context.invalidate(db, (owner_id for item, owner_id, _, _ in rows if item.kind == "document"))
+            db.commit()
+
+            by_owner: Dict[int, List[Dict]] = {}
+            for item, owner_id, row, _ in rows:
+                if item.content:
+                    by_owner.setdefault(owner_id, []).append({
+                        "type": item.kind,
+                        "id": row.id,
+                        "content": item.content,
+                        "embedding": item.embedding,
+                        "metadata": {
+                            "title": item.metadata["title"],
+                            "subject": item.metadata.get("subject"),
+                            "topic": item.metadata.get("topic"),
+                        }
+                    })
+            for owner_id, contexts in by_owner.items():
+                vectors = self._service("ai").store_contexts(owner_id, contexts)
+                # Rows whose vectors the AI service computed get them saved now
+                computed = [(item, vector) for item, vector in zip(contexts, vectors) if item["embedding"] is None]
+                for kind in ("video", "document"):
+                    save_embeddings(db, kind, {item["id"]: vector for item, vector in computed if item["type"] == kind})
+            db.commit()
+        finally:
+            db.close()
+
+        # Items with an unknown owner are recorded as failed by the batch worker
+        self.checkpoint.record(written)
+
+    def _existing_rows(self, db, items: List[IngestItem]) -> Dict:
+        """Rows an earlier run wrote for these items, by (kind, owner id, stored file path)"""
+        found = {}
+        for kind, model, owner in (("video", Video, Video.uploader_id), ("document", Document, Document.owner_id)):
+            paths = [str(item.file_path) for item in items if item.kind == kind]
+            if paths:
+                for row in db.query(model).filter(model.file_path.in_(paths)):
+                    found[(kind, getattr(row, owner.key), row.file_path)] = row
+        return found
+
+    def _owner_id(self, db, email: str) -> int:
+        if email not in self._owners:
+            user = db.query(User).filter(User.email == email).first()
+            if user is None:
+                raise Exception(f"No user with email {email}")
+            self._owners[email] = user.id
+        return self._owners[email]
+
+    # Reporting
+
+    def _report(self, started: float, stop: threading.Event):
+        while not stop.wait(self.report_interval):
+            depths = "  ".join(f"{name}={q.qsize()}" for name, q in self.queues.items())
+            print(f"[{time.perf_counter() - started:7.0f}s] queues: {depths}")
+            self._print_stats(started)
+
+    def _print_stats(self, started: float):
+        elapsed = time.perf_counter() - started
+        for stats in self.stats.values():
+            print("  " + stats.line(elapsed))
@@ -0,0 +1,882 @@
+"""
+Job broker services for distributing media work across worker processes
+"""
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.services.fair_queue import CLASS_NAMES, FairQueue, PRIORITY_INTERACTIVE
+
+# Broker selection: "memory" keeps jobs in this process, "database" shares them
+# through the application database, "redis" through a Redis server
+JOB_BROKER = os.getenv("JOB_BROKER", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "90"))  # no heartbeat for this long = worker died
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = 0.5  # database and redis brokers poll for new work
+JOB_RETRY_MAX_SECONDS = 30.0  # longest back-off after broker errors
+JOB_REPORT_ATTEMPTS = 5  # tries to record a finished or failed job before leaving it to requeue_stale
+
+PRIORITIES = sorted(CLASS_NAMES)
+
+
+class Job:
+    """A unit of background work and its progress"""
+
+    def __init__(self, kind: str, payload: Dict, priority: int = PRIORITY_INTERACTIVE,
+                 tenant=None, cost: float = 1.0, id: Optional[str] = None):
+        self.id = id or uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.tenant = tenant
+        self.cost = cost
+        self.status = "queued"  # queued, running, completed, failed
+        self.progress = 0.0
+        self.attempts = 0
+        self.worker_id: Optional[str] = None
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.heartbeat_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Job":
+        job = cls(data["kind"], data["payload"], data["priority"], data.get("tenant"),
+                  data.get("cost", 1.0), data["id"])
+        for name in job.__dict__:
+            if name in data:
+                setattr(job, name, data[name])
+        return job
+
+    def status_dict(self) -> Dict:
+        """Public view of the job, without its payload"""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": CLASS_NAMES.get(self.priority, str(self.priority)),
+            "progress": self.progress,
+            "attempts": self.attempts,
+            "worker_id": self.worker_id,
+            "enqueued_at": self.enqueued_at,
+            "started_at": self.started_at,
+            "heartbeat_at": self.heartbeat_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    def _start(self, worker_id: str, now: float):
+        self.status = "running"
+        self.worker_id = worker_id
+        self.attempts += 1
+        self.started_at = self.heartbeat_at = now
+
+    def _requeue(self, error: Optional[str] = None) -> bool:
+        """Back to the queue after a failure or a lost worker, unless out of attempts"""
+        self.worker_id = None
+        self.error = error
+        if self.attempts >= JOB_MAX_ATTEMPTS:
+            self.status = "failed"
+            self.finished_at = time.time()
+            return False
+        self.status = "queued"
+        self.progress = 0.0
+        return True
+
+    def _finish(self, result: Optional[Dict]):
+        self.status = "completed"
+        self.progress = 1.0
+        self.result = result
+        self.error = None
+        self.finished_at = time.time()
+
+
+class JobBroker:
+    """Interface shared by the in-process, database and Redis brokers
+
+    Workers claim a job, heartbeat while they run it and then complete or
+    fail it. A running job whose heartbeat goes stale is queued again, so
+    work survives a worker that crashes or loses its node.
+    """
+
+    name = "base"
+    persistent = True  # jobs outlive the API process
+
+    def enqueue(self, kind: str, payload: Dict, priority: int = PRIORITY_INTERACTIVE,
+                tenant=None, cost: float = 1.0) -> Job:
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, timeout: float = 1.0) -> Optional[Job]:
+        """Take the next job, waiting up to timeout seconds for one"""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[float] = None) -> bool:
+        """Record that a worker is alive; False means the job is no longer its to run"""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str, result: Optional[Dict] = None):
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+        """Report a failed attempt; the job is queued again until it runs out of attempts"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def requeue_stale(self, stale_seconds: float = JOB_STALE_SECONDS) -> List[Job]:
+        """Re-queue running jobs whose worker stopped heartbeating
+
+        Returns the jobs taken from their workers: queued again, or
+        "failed" once out of attempts.
+        """
+        raise NotImplementedError
+
+    def active(self) -> List[Job]:
+        """Queued and running jobs"""
+        raise NotImplementedError
+
+    def counts(self, tenant=None) -> Dict:
+        """{(priority, status): {"jobs", "cost"}} over queued and running jobs, optionally one tenant's"""
+        counts = {}
+        for job in self.active():
+            if tenant is None or _tenant_key(job.tenant) == _tenant_key(tenant):
+                entry = counts.setdefault((job.priority, job.status), {"jobs": 0, "cost": 0.0})
+                entry["jobs"] += 1
+                entry["cost"] += job.cost
+        return counts
+
+    def pending_cost(self, priorities: Iterable[int]) -> float:
+        """Total cost of queued and running jobs in the given classes"""
+        wanted = set(priorities)
+        return sum(entry["cost"] for (priority, _), entry in self.counts().items() if priority in wanted)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        classes = {}
+        workers = {}
+        for job in self.active():
+            entry = _class_entry(classes, job.priority)
+            entry[job.status] += 1
+            entry["cost"] += job.cost
+            if job.status == "queued":
+                entry["oldest_age_seconds"] = max(entry["oldest_age_seconds"], now - job.enqueued_at)
+            else:
+                workers[job.worker_id] = _worker_entry(job.id, job.progress, job.heartbeat_at, now)
+        return {"broker": self.name, "classes": classes, "workers": workers}
+
+
+class MemoryBroker(JobBroker):
+    """Jobs in this process, for a single server or tests"""
+
+    name = "memory"
+    persistent = False
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._queue = FairQueue()
+        self._lock = threading.Lock()
+
+    def enqueue(self, kind: str, payload: Dict, priority: int = PRIORITY_INTERACTIVE,
+                tenant=None, cost: float = 1.0) -> Job:
+        job = Job(kind, payload, priority, tenant, cost)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._queue.put(job.id, priority, tenant=tenant, cost=cost)
+        return job
+
+    def claim(self, worker_id: str, timeout: float = 1.0) -> Optional[Job]:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                job_id = self._queue.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                return None
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and job.status == "queued":
+                    job._start(worker_id, time.time())
+                    return job
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[float] = None) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "running" or job.worker_id != worker_id:
+                return False
+            job.heartbeat_at = time.time()
+            if progress is not None:
+                job.progress = progress
+            return True
+
+    def complete(self, job_id: str, worker_id: str, result: Optional[Dict] = None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.worker_id == worker_id:
+                job._finish(result)
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.worker_id != worker_id:
+                return None
+            requeue = job._requeue(error)
+        if requeue:
+            self._queue.put(job.id, job.priority, tenant=job.tenant, cost=job.cost)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def requeue_stale(self, stale_seconds: float = JOB_STALE_SECONDS) -> List[Job]:
+        cutoff = time.time() - stale_seconds
+        released = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == "running" and (job.heartbeat_at or 0) < cutoff:
+                    job._requeue(f"worker {job.worker_id} stopped responding")
+                    released.append(job)
+        for job in released:
+            if job.status == "queued":
+                self._queue.put(job.id, job.priority, tenant=job.tenant, cost=job.cost)
+        return released
+
+    def active(self) -> List[Job]:
+        with self._lock:
+            # Forget finished jobs after a while; the video row keeps the outcome
+            cutoff = time.time() - JOB_STALE_SECONDS
+            for job_id in [j.id for j in self._jobs.values()
+                           if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+            return [j for j in self._jobs.values() if j.status in ("queued", "running")]
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["queue"] = self._queue.stats()
+        return stats
+
+
+class DatabaseBroker(JobBroker):
+    """Jobs in the application database, shared by workers on any node that can reach it
+
+    Works on SQLite for a single machine and on PostgreSQL for a cluster.
+    Workers claim with a conditional UPDATE, so two workers never run the
+    same job. Within a priority class, jobs are ordered by a virtual finish
+    time computed at enqueue, which interleaves tenants the way FairQueue does.
+    """
+
+    name = "database"
+
+    def enqueue(self, kind: str, payload: Dict, priority: int = PRIORITY_INTERACTIVE,
+                tenant=None, cost: float = 1.0) -> Job:
+        from sqlalchemy import func
+        from app.models import BackgroundJob
+
+        job = Job(kind, payload, priority, tenant, cost)
+        db = self._session()
+        try:
+            queued = db.query(BackgroundJob).filter(
+                BackgroundJob.status == "queued", BackgroundJob.priority == priority
+            )
+            virtual_time = queued.with_entities(func.min(BackgroundJob.virtual_start)).scalar() or 0.0
+            last_finish = queued.filter(BackgroundJob.tenant == _tenant_key(tenant)).with_entities(
+                func.max(BackgroundJob.virtual_finish)
+            ).scalar() or 0.0
+            start = max(virtual_time, last_finish)
+
+            db.add(BackgroundJob(
+                id=job.id,
+                kind=kind,
+                status=job.status,
+                priority=priority,
+                tenant=_tenant_key(tenant),
+                cost=cost,
+                virtual_start=start,
+                virtual_finish=start + max(cost, 1e-6),
+                enqueued_at=job.enqueued_at,
+                data=job.to_dict()
+            ))
+            db.commit()
+        finally:
+            db.close()
+        return job
+
+    def claim(self, worker_id: str, timeout: float = 1.0) -> Optional[Job]:
+        from app.models import BackgroundJob
+
+        deadline = time.time() + timeout
+        while True:
+            db = self._session()
+            try:
+                candidates = db.query(BackgroundJob.id).filter(
+                    BackgroundJob.status == "queued"
+                ).order_by(
+                    BackgroundJob.priority, BackgroundJob.virtual_finish, BackgroundJob.enqueued_at
+                ).limit(8).all()
+                for (job_id,) in candidates:
+                    now = time.time()
+                    claimed = db.query(BackgroundJob).filter(
+                        BackgroundJob.id == job_id, BackgroundJob.status == "queued"
+                    ).update({
+                        BackgroundJob.status: "running",
+                        BackgroundJob.worker_id: worker_id,
+                        BackgroundJob.heartbeat_at: now,
+                    }, synchronize_session=False)
+                    db.commit()
+                    if claimed:
+                        # The row is ours now; fill in the rest of the record
+                        row = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+                        job = Job.from_dict(row.data)
+                        job._start(worker_id, now)
+                        self._save(db, row, job)
+                        return job
+            finally:
+                db.close()
+            if time.time() >= deadline:
+                return None
+            time.sleep(JOB_POLL_SECONDS)
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[float] = None) -> bool:
+        from app.models import BackgroundJob
+
+        db = self._session()
+        try:
+            values = {BackgroundJob.heartbeat_at: time.time()}
+            if progress is not None:
+                values[BackgroundJob.progress] = progress
+            updated = db.query(BackgroundJob).filter(
+                BackgroundJob.id == job_id,
+                BackgroundJob.status == "running",
+                BackgroundJob.worker_id == worker_id
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def complete(self, job_id: str, worker_id: str, result: Optional[Dict] = None):
+        self._update_owned(job_id, worker_id, lambda job: job._finish(result))
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+        return self._update_owned(job_id, worker_id, lambda job: job._requeue(error))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        from app.models import BackgroundJob
+
+        db = self._session()
+        try:
+            row = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+            return self._job(row) if row else None
+        finally:
+            db.close()
+
+    def requeue_stale(self, stale_seconds: float = JOB_STALE_SECONDS) -> List[Job]:
+        from app.models import BackgroundJob
+
+        cutoff = time.time() - stale_seconds
+        db = self._session()
+        try:
+            stale = db.query(BackgroundJob.id, BackgroundJob.worker_id).filter(
+                BackgroundJob.status == "running", BackgroundJob.heartbeat_at < cutoff
+            ).all()
+        finally:
+            db.close()
+
+        released = []
+        for job_id, worker_id in stale:
+            job = self._update_owned(
+                job_id, worker_id,
+                lambda job: job._requeue(f"worker {job.worker_id} stopped responding"),
+                stale_before=cutoff
+            )
+            if job is not None:
+                released.append(job)
+        return released
+
+    def active(self) -> List[Job]:
+        from app.models import BackgroundJob
+
+        db = self._session()
+        try:
+            rows = db.query(BackgroundJob).filter(
+                BackgroundJob.status.in_(["queued", "running"])
+            ).all()
+            return [self._job(row) for row in rows]
+        finally:
+            db.close()
+
+    def counts(self, tenant=None) -> Dict:
+        """Aggregated in SQL, so polling it does not load every active job"""
+        from sqlalchemy import func
+        from app.models import BackgroundJob
+
+        db = self._session()
+        try:
+            query = db.query(
+                BackgroundJob.priority, BackgroundJob.status, func.count(), func.sum(BackgroundJob.cost)
+            ).filter(BackgroundJob.status.in_(["queued", "running"]))
+            if tenant is not None:
+                query = query.filter(BackgroundJob.tenant == _tenant_key(tenant))
+            rows = query.group_by(BackgroundJob.priority, BackgroundJob.status).all()
+            return {(priority, status): {"jobs": jobs, "cost": cost or 0.0}
+                    for priority, status, jobs, cost in rows}
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        """Aggregated in SQL like counts; only running rows are read, one per busy worker"""
+        from sqlalchemy import func
+        from app.models import BackgroundJob
+
+        now = time.time()
+        classes = {}
+        workers = {}
+        db = self._session()
+        try:
+            rows = db.query(
+                BackgroundJob.priority, BackgroundJob.status, func.count(), func.sum(BackgroundJob.cost),
+                func.min(BackgroundJob.enqueued_at)
+            ).filter(BackgroundJob.status.in_(["queued", "running"])).group_by(
+                BackgroundJob.priority, BackgroundJob.status
+            ).all()
+            for priority, status, jobs, cost, oldest in rows:
+                entry = _class_entry(classes, priority)
+                entry[status] += jobs
+                entry["cost"] += cost or 0.0
+                if status == "queued" and oldest is not None:
+                    entry["oldest_age_seconds"] = now - oldest
+            running = db.query(
+                BackgroundJob.id, BackgroundJob.worker_id, BackgroundJob.progress, BackgroundJob.heartbeat_at
+            ).filter(BackgroundJob.status == "running").all()
+            for job_id, worker_id, progress, heartbeat_at in running:
+                workers[worker_id] = _worker_entry(job_id, progress or 0.0, heartbeat_at, now)
+        finally:
+            db.close()
+        return {"broker": self.name, "classes": classes, "workers": workers}
+
+    def _session(self):
+        from app.database import SessionLocal
+        return SessionLocal()
+
+    def _job(self, row) -> Job:
+        job = Job.from_dict(row.data)
+        job.status = row.status
+        job.worker_id = row.worker_id
+        job.heartbeat_at = row.heartbeat_at
+        if row.progress is not None:
+            job.progress = row.progress
+        return job
+
+    def _save(self, db, row, job: Job):
+        row.status = job.status
+        row.worker_id = job.worker_id
+        row.heartbeat_at = job.heartbeat_at
+        row.progress = job.progress
+        row.data = job.to_dict()
+        db.commit()
+
+    def _update_owned(self, job_id: str, worker_id: str, change: Callable,
+                      stale_before: Optional[float] = None) -> Optional[Job]:
+        from app.models import BackgroundJob
+
+        db = self._session()
+        try:
+            conditions = [BackgroundJob.id == job_id, BackgroundJob.status == "running",
+                          BackgroundJob.worker_id == worker_id]
+            if stale_before is not None:
+                conditions.append(BackgroundJob.heartbeat_at < stale_before)
+            row = db.query(BackgroundJob).filter(*conditions).first()
+            if row is None:
+                return None
+            job = self._job(row)
+            change(job)
+
+            # Compare-and-set: a fresh heartbeat or a second reaper makes this a no-op
+            updated = db.query(BackgroundJob).filter(*conditions).update({
+                BackgroundJob.status: job.status,
+                BackgroundJob.worker_id: job.worker_id,
+                BackgroundJob.progress: job.progress,
+                BackgroundJob.data: job.to_dict(),
+            }, synchronize_session=False)
+            db.commit()
+            return job if updated else None
+        finally:
+            db.close()
+
+
+class RedisBroker(JobBroker):
+    """Jobs in Redis, for workers spread over several nodes
+
+    Each priority class is a sorted set scored by virtual finish time, so
+    tenants are interleaved as in FairQueue. Running jobs sit in a sorted
+    set scored by their last heartbeat. Claiming is a Lua script, so a job
+    is never popped without also being marked as running.
+    """
+
+    name = "redis"
+
+    _ENQUEUE = """
+    local virtual_time = tonumber(redis.call('GET', KEYS[3]) or '0')
+    local last_finish = tonumber(redis.call('HGET', KEYS[4], ARGV[2]) or '0')
+    local start = math.max(virtual_time, last_finish)
+    local finish = start + tonumber(ARGV[3])
+    redis.call('HSET', KEYS[4], ARGV[2], finish)
+    redis.call('SET', KEYS[1], ARGV[4])
+    redis.call('HSET', KEYS[5], ARGV[1], start)
+    redis.call('ZADD', KEYS[2], finish, ARGV[1])
+    return 1
+    """
+
+    _CLAIM = """
+    for i = 2, #KEYS, 3 do
+        local popped = redis.call('ZPOPMIN', KEYS[i])
+        if popped[1] then
+            local id = popped[1]
+            local start = redis.call('HGET', KEYS[i + 2], id)
+            redis.call('HDEL', KEYS[i + 2], id)
+            if start then
+                redis.call('SET', KEYS[i + 1], start)
+            end
+            redis.call('ZADD', KEYS[1], ARGV[2], id)
+            return id
+        end
+    end
+    return false
+    """
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "nest:jobs"):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("JOB_BROKER=redis requires the redis package")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._enqueue_script = self.client.register_script(self._ENQUEUE)
+        self._claim_script = self.client.register_script(self._CLAIM)
+
+    def _key(self, *parts) -> str:
+        return ":".join([self.prefix, *map(str, parts)])
+
+    def enqueue(self, kind: str, payload: Dict, priority: int = PRIORITY_INTERACTIVE,
+                tenant=None, cost: float = 1.0) -> Job:
+        job = Job(kind, payload, priority, tenant, cost)
+        self._enqueue_script(
+            keys=[self._key("job", job.id), self._key("queue", priority),
+                  self._key("vtime", priority), self._key("vfinish", priority),
+                  self._key("vstart", priority)],
+            args=[job.id, _tenant_key(tenant), max(cost, 1e-6), json.dumps(job.to_dict())]
+        )
+        return job
+
+    def claim(self, worker_id: str, timeout: float = 1.0) -> Optional[Job]:
+        keys = [self._key("running")]
+        for priority in PRIORITIES:
+            keys += [self._key("queue", priority), self._key("vtime", priority),
+                     self._key("vstart", priority)]
+
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            job_id = self._claim_script(keys=keys, args=[worker_id, now])
+            if job_id:
+                # The job is in the running set, so a crash from here on is
+                # recovered by requeue_stale
+                job = self._transaction(job_id, lambda job: job._start(worker_id, now))
+                if job is not None:
+                    return job
+                self.client.zrem(self._key("running"), job_id)
+                continue
+            if time.time() >= deadline:
+                return None
+            time.sleep(JOB_POLL_SECONDS)
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[float] = None) -> bool:
+        now = time.time()
+
+        def beat(job: Job):
+            if job.status != "running" or job.worker_id != worker_id:
+                return False
+            job.heartbeat_at = now
+            if progress is not None:
+                job.progress = progress
+
+        if self._transaction(job_id, beat) is None:
+            return False
+        self.client.zadd(self._key("running"), {job_id: now}, xx=True)
+        return True
+
+    def complete(self, job_id: str, worker_id: str, result: Optional[Dict] = None):
+        def finish(job: Job):
+            if job.worker_id != worker_id or job.status != "running":
+                return False
+            job._finish(result)
+
+        if self._transaction(job_id, finish) is not None:
+            self.client.zrem(self._key("running"), job_id)
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+        return self._release(job_id, lambda job: job.worker_id == worker_id, error)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raw = self.client.get(self._key("job", job_id))
+        return Job.from_dict(json.loads(raw)) if raw else None
+
+    def requeue_stale(self, stale_seconds: float = JOB_STALE_SECONDS) -> List[Job]:
+        cutoff = time.time() - stale_seconds
+        released = []
+        for job_id in self.client.zrangebyscore(self._key("running"), "-inf", cutoff):
+            job = self._release(
+                job_id,
+                lambda job: (job.heartbeat_at or 0) < cutoff,
+                None
+            )
+            if job is not None:
+                released.append(job)
+        return released
+
+    def active(self) -> List[Job]:
+        ids = list(self.client.zrange(self._key("running"), 0, -1))
+        for priority in PRIORITIES:
+            ids += self.client.zrange(self._key("queue", priority), 0, -1)
+        return self._jobs(ids)
+
+    def stats(self) -> Dict:
+        """Counted with ZCARD; job records are read only for running jobs and the head of each class
+
+        A queued job's cost is its virtual finish minus its virtual start, so
+        queued records are not loaded. Jobs requeued after a worker died have
+        no start tag and are read instead; there are few of them.
+        """
+        now = time.time()
+        classes = {}
+        workers = {}
+        for job in self._jobs(self.client.zrange(self._key("running"), 0, -1)):
+            if job.status == "running":
+                entry = _class_entry(classes, job.priority)
+                entry["running"] += 1
+                entry["cost"] += job.cost
+                workers[job.worker_id] = _worker_entry(job.id, job.progress, job.heartbeat_at, now)
+        for priority in PRIORITIES:
+            queued = self.client.zrange(self._key("queue", priority), 0, -1, withscores=True)
+            if not queued:
+                continue
+            entry = _class_entry(classes, priority)
+            entry["queued"] = len(queued)
+            starts = self.client.hgetall(self._key("vstart", priority))
+            entry["cost"] += sum(finish - float(starts[job_id]) for job_id, finish in queued if job_id in starts)
+            read = [job_id for job_id, _ in queued if job_id not in starts]
+            if queued[0][0] not in read:
+                read.append(queued[0][0])
+            for job in self._jobs(read):
+                if job.id not in starts:
+                    entry["cost"] += job.cost
+                entry["oldest_age_seconds"] = max(entry["oldest_age_seconds"], now - job.enqueued_at)
+        return {"broker": self.name, "classes": classes, "workers": workers}
+
+    def _jobs(self, ids: List[str]) -> List[Job]:
+        if not ids:
+            return []
+        raws = self.client.mget([self._key("job", job_id) for job_id in ids])
+        return [Job.from_dict(json.loads(raw)) for raw in raws if raw]
+
+    def _release(self, job_id: str, owned: Callable, error: Optional[str]) -> Optional[Job]:
+        """Take a job off its worker and queue it again (or mark it failed)"""
+        outcome = {}
+
+        def release(job: Job):
+            if job.status != "running" or not owned(job):
+                return False
+            outcome["requeue"] = job._requeue(error or f"worker {job.worker_id} stopped responding")
+
+        job = self._transaction(job_id, release)
+        if job is None:
+            return None
+        self.client.zrem(self._key("running"), job_id)
+        if outcome["requeue"]:
+            # Back at the front of its class: it already waited its turn once
+            self.client.zadd(self._key("queue", job.priority), {job_id: 0})
+        else:
+            self.client.expire(self._key("job", job_id), int(JOB_STALE_SECONDS * 100))
+        return job
+
+    def _transaction(self, job_id: str, change: Callable) -> Optional[Job]:
+        """Apply change to a job atomically; change returns False to leave it untouched"""
+        from redis import WatchError
+
+        key = self._key("job", job_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw is None:
+                        return None
+                    job = Job.from_dict(json.loads(raw))
+                    if change(job) is False:
+                        return None
+                    pipe.multi()
+                    pipe.set(key, json.dumps(job.to_dict()))
+                    if job.status == "completed":
+                        pipe.expire(key, int(JOB_STALE_SECONDS * 100))
+                    pipe.execute()
+                    return job
+                except WatchError:
+                    continue
+
+
+class JobWorker:
+    """Claims jobs from a broker and runs them, heartbeating while they run
+
+    handlers maps a job kind to an object with run(job, progress) and
+    failed(job); progress(fraction) records progress on the broker.
+    """
+
+    def __init__(self, broker: JobBroker, handlers: Dict, worker_id: Optional[str] = None,
+                 heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS):
+        self.broker = broker
+        self.handlers = handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.heartbeat_seconds = heartbeat_seconds
+        self._stop = threading.Event()
+        self._last_reap = 0.0
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        errors = 0
+        while not self._stop.is_set():
+            self._reap()
+            try:
+                job = self.broker.claim(self.worker_id, timeout=self.heartbeat_seconds)
+            except Exception as e:
+                # A locked database or a dropped Redis connection must not end the worker
+                errors += 1
+                delay = _backoff(errors)
+                print(f"Error claiming a job, retrying in {delay:.1f}s: {e}")
+                self._stop.wait(delay)
+                continue
+            errors = 0
+            if job is not None:
+                self.run_job(job)
+
+    def run_job(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self._report("fail", job, f"No handler for job kind {job.kind}")
+            return
+
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(self.heartbeat_seconds):
+                try:
+                    self.broker.heartbeat(job.id, self.worker_id)
+                except Exception as e:
+                    # Keep beating: a few missed beats are well inside JOB_STALE_SECONDS
+                    print(f"Error sending heartbeat for job {job.id}: {e}")
+
+        def progress(fraction: float):
+            try:
+                self.broker.heartbeat(job.id, self.worker_id, progress=min(max(fraction, 0.0), 1.0))
+            except Exception as e:
+                print(f"Error recording progress for job {job.id}: {e}")
+
+        beater = threading.Thread(target=beat, name=f"heartbeat-{job.id[:8]}", daemon=True)
+        beater.start()
+        try:
+            result = handler.run(job, progress)
+        except Exception as e:
+            print(f"Error running {job.kind} job {job.id}: {e}")
+            done.set()
+            beater.join()
+            failed = self._report("fail", job, str(e))
+            if failed is not None and failed.status == "failed":
+                self._failed(handler, failed)
+        else:
+            done.set()
+            beater.join()
+            self._report("complete", job, result)
+
+    def _report(self, outcome: str, job: Job, detail):
+        """broker.complete or broker.fail, retried with back-off
+
+        If the broker stays unreachable the job is left running without
+        heartbeats, and requeue_stale hands it out again later.
+        """
+        for attempt in range(1, JOB_REPORT_ATTEMPTS + 1):
+            try:
+                return getattr(self.broker, outcome)(job.id, self.worker_id, detail)
+            except Exception as e:
+                print(f"Error recording {outcome} of job {job.id} (attempt {attempt}): {e}")
+                if attempt < JOB_REPORT_ATTEMPTS:
+                    time.sleep(_backoff(attempt))
+        return None
+
+    def _reap(self):
+        """Any worker may re-queue jobs abandoned by a dead one"""
+        if time.time() - self._last_reap < self.heartbeat_seconds:
+            return
+        self._last_reap = time.time()
+        try:
+            released = self.broker.requeue_stale()
+        except Exception as e:
+            print(f"Error re-queuing stale jobs: {e}")
+            return
+        requeued = sum(1 for job in released if job.status == "queued")
+        if requeued:
+            print(f"Re-queued {requeued} jobs from unresponsive workers")
+        # Out of attempts: the handler records the failure, as after an exception
+        for job in released:
+            handler = self.handlers.get(job.kind)
+            if job.status == "failed" and handler is not None:
+                self._failed(handler, job)
+
+    def _failed(self, handler, job: Job):
+        try:
+            handler.failed(job)
+        except Exception as e:
+            print(f"Error recording failed {job.kind} job {job.id}: {e}")
+
+
+def _class_entry(classes: Dict, priority: int) -> Dict:
+    name = CLASS_NAMES.get(priority, str(priority))
+    return classes.setdefault(name, {"queued": 0, "running": 0, "cost": 0.0, "oldest_age_seconds": 0.0})
+
+
+def _worker_entry(job_id: str, progress: float, heartbeat_at: Optional[float], now: float) -> Dict:
+    return {"job_id": job_id, "progress": progress, "heartbeat_age_seconds": now - (heartbeat_at or now)}
+
+
+def _backoff(errors: int) -> float:
+    return min(JOB_POLL_SECONDS * 2 ** errors, JOB_RETRY_MAX_SECONDS)
+
+
+def _tenant_key(tenant) -> str:
+    return "" if tenant is None else str(tenant)
+
+
+BROKERS = {
+    MemoryBroker.name: MemoryBroker,
+    DatabaseBroker.name: DatabaseBroker,
+    RedisBroker.name: RedisBroker,
+}
+
+
+def create_broker(name: str = JOB_BROKER) -> JobBroker:
+    """Instantiate a job broker by name"""
+    if name not in BROKERS:
+        raise ValueError(f"Unknown job broker: {name}. Available: {', '.join(BROKERS)}")
+    return BROKERS[name]()
@@ -0,0 +1,248 @@
+"""
+Learning context services: a small materialized summary per user
+
+/api/study/context used to return the full transcript of the last ten
+watched videos and the full text of every document, rebuilt on each call.
+Instead each user has one learning_contexts row holding titles, subjects,
+short extracts, counts and last-activity times. Watch progress and document
+uploads update it in place. Rarer changes (a deleted video, a new
+transcript, bulk ingest) drop it, and the next read rebuilds it with a few
+bounded queries. Full text is read a page at a time with SQL substr, so
+large transcripts never pass through the summary.
+"""
+
+import copy
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func
+
+from app.models import Document, LearningContext, Video, WatchHistory
+
+CONTEXT_RECENT_VIDEOS = int(os.getenv("CONTEXT_RECENT_VIDEOS", "10"))
+CONTEXT_RECENT_DOCUMENTS = int(os.getenv("CONTEXT_RECENT_DOCUMENTS", "20"))
+CONTEXT_EXTRACT_CHARS = int(os.getenv("CONTEXT_EXTRACT_CHARS", "300"))
+CONTEXT_PAGE_CHARS = int(os.getenv("CONTEXT_PAGE_CHARS", "20000"))  # most content characters per page
+CONTEXT_REBUILD_SECONDS = float(os.getenv("CONTEXT_REBUILD_SECONDS", "86400"))  # rebuild summaries older than this
+COMPLETED_PERCENT = 90
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    """ISO 8601 in UTC; SQLite returns naive UTC datetimes"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def _extract(text: Optional[str]) -> Optional[str]:
+    return text[:CONTEXT_EXTRACT_CHARS] if text else None
+
+
+def _video_entry(video_id: int, title: str, subject: Optional[str], topic: Optional[str],
+                 extract: Optional[str], completion: Optional[float], watched_at) -> Dict:
+    return {
+        "id": video_id,
+        "title": title,
+        "subject": subject,
+        "topic": topic,
+        "extract": extract,
+        "completion_percentage": completion or 0,
+        "last_watched_at": _iso(watched_at),
+        "content_url": f"/api/study/context/video/{video_id}/content",
+    }
+
+
+def _document_entry(document_id: int, title: str, file_type: str, extract: Optional[str], created_at) -> Dict:
+    return {
+        "id": document_id,
+        "title": title,
+        "type": file_type,
+        "extract": extract,
+        "created_at": _iso(created_at),
+        "content_url": f"/api/study/context/document/{document_id}/content",
+    }
+
+
+class LearningContextStore:
+    """Reads, rebuilds and incrementally updates per-user context summaries"""
+
+    def get(self, db, user_id: int) -> LearningContext:
+        """The user's summary row, rebuilt first if missing or stale"""
+        row = db.get(LearningContext, user_id)
+        if row is None or time.time() - row.built_at > CONTEXT_REBUILD_SECONDS:
+            row = self.rebuild(db, user_id)
+        return row
+
+    def rebuild(self, db, user_id: int) -> LearningContext:
+        """Recompute a summary with bounded queries and store it"""
+        now = time.time()
+        row = LearningContext(user_id=user_id, summary=self._compute(db, user_id), built_at=now, updated_at=now)
+        try:
+            row = db.merge(row)
+            db.commit()
+        except Exception as e:
+            # A concurrent first read stored it already; serve what was computed
+            db.rollback()
+            print(f"Error storing learning context: {e}")
+        return row
+
+    def _compute(self, db, user_id: int) -> Dict:
+        watched = db.query(WatchHistory).join(Video, Video.id == WatchHistory.video_id).filter(
+            WatchHistory.user_id == user_id
+        )
+        recent = watched.order_by(WatchHistory.last_watched_at.desc(), WatchHistory.id.desc()).with_entities(
+            Video.id, Video.title, Video.subject, Video.topic,
+            func.substr(Video.transcript, 1, CONTEXT_EXTRACT_CHARS).label("extract"),
+            WatchHistory.completion_percentage, WatchHistory.last_watched_at
+        ).limit(CONTEXT_RECENT_VIDEOS).all()
+        subjects = dict(watched.filter(Video.subject.isnot(None)).with_entities(
+            Video.subject, func.count()
+        ).group_by(Video.subject).all())
+
+        documents = db.query(Document).filter(Document.owner_id == user_id)
+        recent_documents = documents.order_by(Document.created_at.desc(), Document.id.desc()).with_entities(
+            Document.id, Document.title, Document.file_type,
+            func.substr(Document.content, 1, CONTEXT_EXTRACT_CHARS).label("extract"), Document.created_at
+        ).limit(CONTEXT_RECENT_DOCUMENTS).all()
+
+        return {
+            "watched_videos": [_video_entry(v.id, v.title, v.subject, v.topic, v.extract,
+                                            v.completion_percentage, v.last_watched_at) for v in recent],
+            "documents": [_document_entry(d.id, d.title, d.file_type, d.extract, d.created_at)
+                          for d in recent_documents],
+            "counts": {
+                "watched_videos": watched.count(),
+                "completed_videos": watched.filter(WatchHistory.completion_percentage >= COMPLETED_PERCENT).count(),
+                "documents": documents.count(),
+            },
+            "subjects": subjects,
+            "last_activity": {
+                "watched_at": _iso(recent[0].last_watched_at) if recent else None,
+                "document_at": _iso(recent_documents[0].created_at) if recent_documents else None,
+            },
+        }
+
+    def _update(self, db, user_id: int, change):
+        """Apply change(summary) to a stored summary; users without one get it built on read"""
+        row = db.get(LearningContext, user_id)
+        if row is None:
+            return
+        summary = copy.deepcopy(row.summary)  # JSON columns only persist reassigned values
+        if change(summary) is False:
+            db.delete(row)
+            return
+        row.summary = summary
+        row.updated_at = time.time()
+
+    def record_watch(self, db, user_id: int, video: Video, watch: WatchHistory,
+                     previous_completion: Optional[float] = None):
+        """Move a watched video to the front; previous_completion is None for a first watch. The caller commits."""
+        def change(summary):
+            counts = summary["counts"]
+            completed = (watch.completion_percentage or 0) >= COMPLETED_PERCENT
+            if not completed and (previous_completion or 0) >= COMPLETED_PERCENT:
+                # A rewatch dropped below the threshold; let the next read recount completions
+                return False
+            if previous_completion is None:
+                counts["watched_videos"] += 1
+                if video.subject:
+                    summary["subjects"][video.subject] = summary["subjects"].get(video.subject, 0) + 1
+            if completed and (previous_completion or 0) < COMPLETED_PERCENT:
+                counts["completed_videos"] += 1
+            entry = _video_entry(video.id, video.title, video.subject, video.topic, _extract(video.transcript),
+                                 watch.completion_percentage, watch.last_watched_at)
+            others = [v for v in summary["watched_videos"] if v["id"] != video.id]
+            summary["watched_videos"] = [entry] + others[:CONTEXT_RECENT_VIDEOS - 1]
+            summary["last_activity"]["watched_at"] = entry["last_watched_at"]
+        self._update(db, user_id, change)
+
+    def add_document(self, db, document: Document):
+        """Add a new document to its owner's summary; the caller commits"""
+        def change(summary):
+            entry = _document_entry(document.id, document.title, document.file_type,
+                                    _extract(document.content), document.created_at)
+            summary["counts"]["documents"] += 1
+            summary["documents"] = [entry] + summary["documents"][:CONTEXT_RECENT_DOCUMENTS - 1]
+            summary["last_activity"]["document_at"] = entry["created_at"] or _iso(datetime.now(timezone.utc))
+        self._update(db, document.owner_id, change)
+
+    def remove_document(self, db, user_id: int, document_id: int):
+        """Drop a deleted document; the caller commits"""
+        def change(summary):
+            summary["counts"]["documents"] = max(0, summary["counts"]["documents"] - 1)
+            summary["documents"] = [d for d in summary["documents"] if d["id"] != document_id]
+            # An older document should move up into the list; let the next read rebuild it
+            return len(summary["documents"]) >= min(summary["counts"]["documents"], CONTEXT_RECENT_DOCUMENTS)
+        self._update(db, user_id, change)
+
+    def invalidate(self, db, user_ids: Iterable[int]):
+        """Drop summaries so the next read rebuilds them; the caller commits"""
+        user_ids = list(set(user_ids))
+        if user_ids:
+            db.query(LearningContext).filter(LearningContext.user_id.in_(user_ids)).delete(synchronize_session=False)
+
+    def invalidate_video(self, db, video_id: int):
+        """Drop the summaries of everyone who watched a video whose text or existence changed"""
+        watchers = db.query(WatchHistory.user_id).filter(WatchHistory.video_id == video_id)
+        db.query(LearningContext).filter(LearningContext.user_id.in_(watchers.scalar_subquery())).delete(
+            synchronize_session=False
+        )
+
+    def watched_page(self, db, user_id: int, skip: int = 0, limit: int = 20) -> Dict:
+        """One page of the whole watch history as summary entries, most recent first"""
+        query = db.query(WatchHistory).join(Video, Video.id == WatchHistory.video_id).filter(
+            WatchHistory.user_id == user_id
+        )
+        rows = query.order_by(WatchHistory.last_watched_at.desc(), WatchHistory.id.desc()).with_entities(
+            Video.id, Video.title, Video.subject, Video.topic,
+            func.substr(Video.transcript, 1, CONTEXT_EXTRACT_CHARS).label("extract"),
+            WatchHistory.completion_percentage, WatchHistory.last_watched_at
+        ).offset(skip).limit(limit).all()
+        return {"items": [_video_entry(v.id, v.title, v.subject, v.topic, v.extract,
+                                       v.completion_percentage, v.last_watched_at) for v in rows],
+                "total": query.count(), "skip": skip, "limit": limit}
+
+    def documents_page(self, db, user_id: int, skip: int = 0, limit: int = 20) -> Dict:
+        """One page of the user's documents as summary entries, newest first"""
+        query = db.query(Document).filter(Document.owner_id == user_id)
+        rows = query.order_by(Document.created_at.desc(), Document.id.desc()).with_entities(
+            Document.id, Document.title, Document.file_type,
+            func.substr(Document.content, 1, CONTEXT_EXTRACT_CHARS).label("extract"), Document.created_at
+        ).offset(skip).limit(limit).all()
+        return {"items": [_document_entry(d.id, d.title, d.file_type, d.extract, d.created_at) for d in rows],
+                "total": query.count(), "skip": skip, "limit": limit}
+
+    def content_page(self, db, user_id: int, kind: str, item_id: int, offset: int = 0,
+                     length: int = CONTEXT_PAGE_CHARS) -> Optional[Dict]:
+        """A slice of a transcript or of one of the user's documents, or None if not found"""
+        offset = max(offset, 0)
+        length = min(max(length, 1), CONTEXT_PAGE_CHARS)
+        if kind == "video":
+            column, title, query = Video.transcript, Video.title, db.query(Video).filter(Video.id == item_id)
+        elif kind == "document":
+            column, title = Document.content, Document.title
+            query = db.query(Document).filter(Document.id == item_id, Document.owner_id == user_id)
+        else:
+            return None
+        row = query.with_entities(title.label("title"), func.length(column).label("total"),
+                                  func.substr(column, offset + 1, length).label("content")).first()
+        if row is None:
+            return None
+        total = row.total or 0
+        end = min(offset + length, total)
+        return {
+            "type": kind,
+            "id": item_id,
+            "title": row.title,
+            "offset": offset,
+            "content": row.content or "",
+            "total_length": total,
+            "next_offset": end if end < total else None,
+        }
+
+
+learning_context = LearningContextStore()
@@ -0,0 +1,236 @@
+"""
+Answer generation backends for the Study Area chatbot
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from app.services.telemetry import record_model_load, stage, tracer
+
+# Generation settings
+LLM_BACKEND = os.getenv("LLM_BACKEND", "template")  # "template" or "llama_cpp"
+LLM_MODEL_PATH = os.getenv("LLM_MODEL_PATH", "models/llm.gguf")
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "4096"))
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "512"))
+LLM_THREADS = int(os.getenv("LLM_THREADS", str(os.cpu_count() or 4)))
+LLM_PREFIX_CACHE_BYTES = int(os.getenv("LLM_PREFIX_CACHE_BYTES", str(512 * 1024 * 1024)))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "1"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+
+SYSTEM_PROMPT = (
+    "You are NEST.ai, a study assistant. Answer the student's question using "
+    "the numbered learning material below and cite passages like [1]. If the "
+    "material does not cover it, say so."
+)
+
+
+class GenerationQueueFull(Exception):
+    """Raised when the generation queue is at capacity"""
+
+
+class Prompt:
+    """Retrieved context and the user's question
+
+    The context is always rendered first so backends with prefix caching can
+    reuse the evaluated context across follow-up questions.
+    """
+
+    def __init__(self, question: str, context: str = "", citations: Optional[List[Dict]] = None):
+        self.question = question
+        self.context = context
+        self.citations = citations or []
+
+    def prefix(self) -> str:
+        return f"{SYSTEM_PROMPT}\n\n### Learning material\n{self.context}\n\n"
+
+    def text(self) -> str:
+        return f"{self.prefix()}### Question\n{self.question}\n\n### Answer\n"
+
+
+class GenerationBackend:
+    """Interface for answer generators"""
+
+    name = "base"
+
+    def stream(self, prompt: Prompt, max_tokens: int) -> Iterator[str]:
+        """Yield answer tokens, stopping after max_tokens"""
+        raise NotImplementedError
+
+    def generate(self, prompt: Prompt, max_tokens: int = LLM_MAX_TOKENS) -> str:
+        return "".join(self.stream(prompt, max_tokens))
+
+
+class TemplateBackend(GenerationBackend):
+    """Deterministic template answer, used by default and in tests"""
+
+    name = "template"
+
+    _TOKEN = re.compile(r"\S+\s*|\s+")
+
+    def render(self, prompt: Prompt) -> str:
+        return f"""Based on the content you've been learning:
+
+{prompt.context}
+
+Regarding your question "{prompt.question}":
+
+This is a simplified response. In production, this would use a proper language model like Llama or GPT to generate detailed, contextual answers based on your learning materials.
+
+Key points from your learning context:
+- The content covers topics you've been studying
+- This answer is based on videos and documents you've accessed
+- Continue learning to get more personalized responses
+"""
+
+    def stream(self, prompt: Prompt, max_tokens: int) -> Iterator[str]:
+        for i, match in enumerate(self._TOKEN.finditer(self.render(prompt))):
+            if i >= max_tokens:
+                break
+            yield match.group(0)
+
+
+class LlamaCppBackend(GenerationBackend):
+    """Local GGUF model on CPU via llama.cpp, with a RAM prefix cache"""
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str = LLM_MODEL_PATH, n_ctx: int = LLM_CONTEXT_TOKENS,
+                 n_threads: int = LLM_THREADS):
+        try:
+            from llama_cpp import Llama, LlamaRAMCache
+        except ImportError:
+            raise Exception("LLM_BACKEND=llama_cpp requires the llama-cpp-python package")
+
+        print(f"Loading LLM: {model_path}...")
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+        # Reuses the KV state of a previously evaluated prompt prefix, so a
+        # follow-up over the same retrieved context skips re-reading it
+        self.llm.set_cache(LlamaRAMCache(capacity_bytes=LLM_PREFIX_CACHE_BYTES))
+        self._lock = threading.Lock()  # a Llama context serves one prompt at a time
+        print("LLM loaded!")
+
+    def stream(self, prompt: Prompt, max_tokens: int) -> Iterator[str]:
+        with self._lock:
+            for chunk in self.llm(
+                prompt.text(),
+                max_tokens=max_tokens,
+                temperature=0.2,
+                stop=["### Question"],
+                stream=True
+            ):
+                text = chunk["choices"][0]["text"]
+                if text:
+                    yield text
+
+
+BACKENDS = {
+    TemplateBackend.name: TemplateBackend,
+    LlamaCppBackend.name: LlamaCppBackend,
+}
+
+
+def create_backend(name: str = LLM_BACKEND) -> GenerationBackend:
+    """Instantiate a generation backend by name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+class GenerationPool:
+    """Runs generation on a bounded thread pool and streams tokens to asyncio"""
+
+    def __init__(self, backend_name: str = LLM_BACKEND, workers: int = LLM_WORKERS,
+                 max_queue: int = LLM_MAX_QUEUE, max_tokens: int = LLM_MAX_TOKENS):
+        self.backend_name = backend_name
+        self.max_tokens = max_tokens
+        self.capacity = workers + max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self._backend: Optional[GenerationBackend] = None
+        self._backend_lock = threading.Lock()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    @property
+    def backend(self) -> GenerationBackend:
+        """Load the backend on first use rather than at import"""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    started = time.perf_counter()
+                    self._backend = create_backend(self.backend_name)
+                    record_model_load("llm", self.backend_name, time.perf_counter() - started)
+        return self._backend
+
+    @property
+    def pending(self) -> int:
+        """Requests running or waiting for a worker"""
+        return self._pending
+
+    def budget(self, requested: Optional[int]) -> int:
+        """Clamp a requested token count to the configured maximum"""
+        if not requested or requested <= 0:
+            return self.max_tokens
+        return min(requested, self.max_tokens)
+
+    def _acquire(self):
+        with self._pending_lock:
+            if self._pending >= self.capacity:
+                raise GenerationQueueFull("Too many answers are being generated, try again shortly")
+            self._pending += 1
+
+    def _release(self):
+        with self._pending_lock:
+            self._pending -= 1
+
+    async def stream(self, prompt: Prompt, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield tokens as the worker produces them"""
+        self._acquire()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+        limit = self.budget(max_tokens)
+        trace = tracer.context()  # worker threads do not inherit the request's span
+
+        def produce():
+            try:
+                with stage("llm.generate", parent=trace, backend=self.backend_name, max_tokens=limit):
+                    for token in self.backend.stream(prompt, limit):
+                        if cancelled.is_set():
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, token)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                self._release()
+
+        try:
+            self._executor.submit(produce)
+        except Exception:
+            self._release()
+            raise
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Client went away or we finished: stop the worker early
+            cancelled.set()
+
+    async def generate(self, prompt: Prompt, max_tokens: Optional[int] = None) -> str:
+        """Collect a full answer without streaming"""
+        return "".join([token async for token in self.stream(prompt, max_tokens)])
+
+
+generation_pool = GenerationPool()
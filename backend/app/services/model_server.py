@@ -0,0 +1,265 @@
+"""
+Model server: one process holding the embedding model and vector store for all API workers
+
+Each API worker process that builds its own AIService loads the sentence
+embedder, opens the vector store and keeps BM25 indexes, so memory grows
+with the worker count. An in-process vector index also misses writes made
+by other processes, and the mmap store allows only one writer. serve.py runs one model server instead. Processes with
+MODEL_SERVER_ADDRESS set get a RemoteAIService from get_ai_service(). Its
+embedding and vector-store calls go to the server over a local socket
+(multiprocessing.connection, authenticated with MODEL_SERVER_KEY).
+Messages are pickles, so whoever holds the key can run code in the
+server: a TCP address needs its own MODEL_SERVER_KEY.
+Concurrent encode requests from all workers are run as shared batches.
+Whisper already runs out of process: serve.py starts worker.py workers on
+the job broker.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import AuthenticationError, Client, Listener
+from typing import Dict, List, Union
+
+from app.auth import DEFAULT_SECRET_KEY, SECRET_KEY
+from app.services.embedding_backends import EmbeddingBackend
+
+MODEL_SERVER_ADDRESS = os.getenv("MODEL_SERVER_ADDRESS", "")  # unix socket path or host:port; empty = models in-process
+MODEL_SERVER_KEY = os.getenv("MODEL_SERVER_KEY", SECRET_KEY)  # required for a TCP address
+MODEL_SERVER_CONNECT_SECONDS = float(os.getenv("MODEL_SERVER_CONNECT_SECONDS", "30"))  # wait for a restarting server
+MODEL_SERVER_MAX_BATCH = int(os.getenv("MODEL_SERVER_MAX_BATCH", "64"))  # texts per shared encode call
+MODEL_SERVER_DRAIN_SECONDS = 30.0
+
+
+def parse_address(address: str):
+    """host:port for TCP, anything else is a unix socket path"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and "/" not in address:
+        return host, int(port)
+    return address
+
+
+def insecure_address(address: str = MODEL_SERVER_ADDRESS) -> str:
+    """Why serving on this address is unsafe, or "" if it is not
+
+    A unix socket is protected by file permissions; a TCP port needs a key
+    that is set on purpose and is not the placeholder SECRET_KEY.
+    """
+    if not isinstance(parse_address(address), tuple):
+        return ""
+    if not os.getenv("MODEL_SERVER_KEY"):
+        return f"MODEL_SERVER_ADDRESS={address} is a TCP port; set MODEL_SERVER_KEY to a long random secret"
+    if os.getenv("MODEL_SERVER_KEY") == DEFAULT_SECRET_KEY:
+        return "MODEL_SERVER_KEY is the placeholder secret; set it to a long random secret"
+    return ""
+
+
+class EncodeBatcher:
+    """Runs encode requests from many connections as shared batches on one model thread
+
+    Requests that arrive while the model is busy are encoded together in
+    the next call, so batches form under load without delaying a lone query.
+    """
+
+    def __init__(self, embedder, max_batch: int = MODEL_SERVER_MAX_BATCH):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.max_batch = max_batch
+        self.calls = 0
+        self.texts = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        threading.Thread(target=self._run, name="encode-batcher", daemon=True).start()
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, **kwargs):
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return self.embedder.encode(batch)
+        future = Future()
+        self._queue.put((batch, future))
+        vectors = future.result()
+        return vectors[0] if single else vectors
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            while size < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            try:
+                vectors = self.embedder.encode([text for batch, _ in pending for text in batch])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.calls += 1
+            self.texts += size
+            offset = 0
+            for batch, future in pending:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+
+class ModelServer:
+    """Serves AIService embedding and vector-store calls to other processes"""
+
+    def __init__(self, address: str = MODEL_SERVER_ADDRESS, authkey: str = MODEL_SERVER_KEY):
+        self.address = address
+        self.authkey = authkey.encode()
+        self.active = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stopping = False
+
+    def serve(self):
+        """Load the models, then accept connections until stop()"""
+        from app.services.ai_service import AIService
+
+        insecure = insecure_address(self.address)
+        if insecure:
+            raise Exception(f"Refusing to start the model server: {insecure}")
+        from app.services.chat_cache import chat_cache
+
+        service = AIService()
+        service.embedder = EncodeBatcher(service.embedder)
+        self.methods = {
+            "encode": service.embedder.encode,
+            "store_contexts": service.store_contexts,
+            "remove_context": service.remove_context,
+            "search_relevant_context": service.search_relevant_context,
+            "get_contexts": service.get_contexts,
+            "corpus_version": chat_cache.corpus_version,
+            "vector_stats": service.vector_stats,
+            "compact_vectors": service.compact_vectors,
+            "stats": lambda: self.stats(service.embedder),
+            "ping": os.getpid,
+        }
+
+        address = parse_address(self.address)
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)  # left behind by a server that did not exit cleanly
+        self._listener = Listener(address, authkey=self.authkey)
+        print(f"Model server listening on {self.address}")
+        while not self._stopping:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError as e:
+                print(f"Error accepting model server connection: {e}")
+                continue
+            except OSError:
+                break  # closed by stop()
+            threading.Thread(target=self._handle, args=(conn,), name="model-conn", daemon=True).start()
+
+        # Let calls already running finish before the process exits
+        deadline = time.monotonic() + MODEL_SERVER_DRAIN_SECONDS
+        while self.active and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def stop(self):
+        """Stop accepting connections; safe to call from a signal handler"""
+        self._stopping = True
+        if self._listener is not None:
+            self._listener.close()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                with self._lock:
+                    self.active += 1
+                try:
+                    reply = ("ok", self.methods[method](*args, **kwargs))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                finally:
+                    with self._lock:
+                        self.active -= 1
+                try:
+                    conn.send(reply)
+                except (OSError, ValueError):
+                    return
+
+    def stats(self, batcher: EncodeBatcher) -> Dict:
+        return {"pid": os.getpid(), "active": self.active, "encode_calls": batcher.calls,
+                "encoded_texts": batcher.texts}
+
+
+class ModelClient:
+    """Calls a model server, with one connection per thread and reconnects across restarts"""
+
+    def __init__(self, address: str = MODEL_SERVER_ADDRESS, authkey: str = MODEL_SERVER_KEY,
+                 connect_seconds: float = MODEL_SERVER_CONNECT_SECONDS):
+        self.address = address
+        self.authkey = authkey.encode()
+        self.connect_seconds = connect_seconds
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        deadline = time.monotonic() + self.connect_seconds
+        while True:
+            try:
+                conn = Client(parse_address(self.address), authkey=self.authkey)
+                break
+            except OSError as e:
+                # Not started yet or restarting; it comes back on the same address
+                if time.monotonic() >= deadline:
+                    raise Exception(f"Model server at {self.address} is unavailable: {e}")
+                time.sleep(0.2)
+        self._local.conn = conn
+        return conn
+
+    def call(self, method: str, *args, **kwargs):
+        """Run a server method and return its result; server errors raise Exception"""
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send((method, args, kwargs))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError) as e:
+                # The server restarted under this connection; every method is safe to resend
+                self._local.conn = None
+                conn.close()
+                if attempt:
+                    raise Exception(f"Model server connection lost during {method}: {e}")
+        if status == "error":
+            raise Exception(f"Model server {method} failed: {result}")
+        return result
+
+    def wait(self, timeout: float) -> bool:
+        """True once the server answers, False after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                self.call("ping")
+                return True
+            except Exception:
+                time.sleep(0.2)
+        return False
+
+
+class RemoteEmbedder(EmbeddingBackend):
+    """Sentence embeddings computed by the model server"""
+
+    name = "remote"
+
+    def __init__(self, client: ModelClient):
+        # The server already truncates to EMBEDDING_DIM and normalizes
+        super().__init__(dimension=0)
+        self.client = client
+
+    def _encode(self, texts: List[str], batch_size: int):
+        return self.client.call("encode", texts)
@@ -0,0 +1,240 @@
+"""
+Request profiling services: sampling profiler and slow-request capture
+
+Opt-in. With PROFILE_SAMPLE_RATE=0 and PROFILE_SLOW_MS=0 (the defaults) the
+middleware and SQL hooks are never installed. When enabled, a background
+thread samples the stacks of the threads working on a profiled request.
+The stacks are kept in collapsed form ("frame;frame;frame count"), which
+flamegraph.pl, speedscope and inferno read directly. Each capture also
+records the SQL statements the request issued and their timings.
+"""
+
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests profiled
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))  # keep any request slower than this; 0 = off
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_CAPTURES = int(os.getenv("PROFILE_CAPTURES", "50"))  # recent captures kept in memory
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")  # also write <id>.folded and <id>.json here
+PROFILE_MAX_SQL = 200  # statements recorded per request
+PROFILE_MAX_DEPTH = 128
+
+_current_capture: ContextVar = ContextVar("nest_profile_capture", default=None)
+
+
+class Capture:
+    """Stack samples and SQL of one request"""
+
+    def __init__(self, capture_id: int, method: str, path: str, reason: str):
+        self.id = capture_id
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.reason = reason  # "sampled" or "slow"
+        self.trace_id: Optional[str] = None
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.concurrent = 0  # other profiled requests in flight; their samples may overlap
+        self.threads = {threading.get_ident()}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sql: List[Dict] = []
+        self.sql_count = 0
+        self.sql_ms = 0.0
+
+    def add_sql(self, statement: str, elapsed_ms: float):
+        self.sql_count += 1
+        self.sql_ms += elapsed_ms
+        if len(self.sql) < PROFILE_MAX_SQL:
+            self.sql.append({"statement": " ".join(statement.split())[:500],
+                             "ms": round(elapsed_ms, 3)})
+
+    def folded(self) -> str:
+        """Collapsed stacks, one "root;...;leaf count" line per distinct stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "reason": self.reason,
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "samples": self.samples,
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_ms, 3),
+            "concurrent": self.concurrent,
+        }
+
+    def to_dict(self, top: int = 20) -> Dict:
+        data = self.summary()
+        data["sql"] = self.sql
+        data["top_stacks"] = [{"stack": stack.split(";"), "samples": count}
+                              for stack, count in self.stacks.most_common(top)]
+        return data
+
+
+def _frame_name(code) -> str:
+    filename = code.co_filename
+    # Trim site-packages and project prefixes so stacks stay readable
+    for marker in ("site-packages/", "dist-packages/", "backend/"):
+        index = filename.rfind(marker)
+        if index >= 0:
+            filename = filename[index + len(marker):]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def fold_stack(frame) -> str:
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfiler:
+    """Samples the stacks of threads serving profiled requests"""
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, slow_ms: float = PROFILE_SLOW_MS,
+                 interval_ms: float = PROFILE_INTERVAL_MS, keep: int = PROFILE_CAPTURES,
+                 output_dir: str = PROFILE_DIR):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.captures: deque = deque(maxlen=keep)
+        self._active: Dict[int, Capture] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def start(self, method: str, path: str) -> Optional[Capture]:
+        """Begin a capture for this request, or return None to skip it"""
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return None
+
+        capture = Capture(next(self._ids), method, path, "sampled" if sampled else "slow")
+        with self._lock:
+            capture.concurrent = len(self._active)
+            self._active[capture.id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        capture._token = _current_capture.set(capture)
+        return capture
+
+    def finish(self, capture: Capture, duration_ms: float, status: Optional[int] = None,
+               route: Optional[str] = None, trace_id: Optional[str] = None):
+        """Stop sampling; keep the capture if it was sampled or ran slow"""
+        with self._lock:
+            self._active.pop(capture.id, None)
+        _current_capture.reset(capture._token)
+        capture.duration_ms = duration_ms
+        capture.status = status
+        capture.route = route
+        capture.trace_id = trace_id
+
+        if capture.reason == "slow" and duration_ms < self.slow_ms:
+            return
+        self.captures.append(capture)
+        if self.output_dir:
+            self._write(capture)
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        return [capture.summary() for capture in list(self.captures)[-limit:][::-1]]
+
+    def get(self, capture_id: int) -> Optional[Capture]:
+        for capture in list(self.captures):
+            if capture.id == capture_id:
+                return capture
+        return None
+
+    def _sample(self):
+        own = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+
+            frames = sys._current_frames()
+            folded: Dict[int, str] = {}
+            with self._lock:
+                captures = list(self._active.values())
+            for capture in captures:
+                for thread_id in list(capture.threads):
+                    if thread_id == own or thread_id not in frames:
+                        continue
+                    if thread_id not in folded:
+                        folded[thread_id] = fold_stack(frames[thread_id])
+                    capture.stacks[folded[thread_id]] += 1
+                capture.samples += 1
+            del frames
+
+    def _write(self, capture: Capture):
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            stem = self.output_dir / f"{int(capture.started_at)}-{capture.id}"
+            stem.with_suffix(".folded").write_text(capture.folded(), encoding="utf-8")
+            stem.with_suffix(".json").write_text(json.dumps(capture.to_dict(), default=str),
+                                                 encoding="utf-8")
+        except Exception as e:
+            print(f"Error writing profile capture: {e}")
+
+
+def attach_thread():
+    """Sample the calling thread as part of the current request's capture, if any"""
+    capture = _current_capture.get()
+    if capture is not None:
+        capture.threads.add(threading.get_ident())
+
+
+def instrument_engine(engine):
+    """Record each SQL statement and its time on the current request's capture"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if _current_capture.get() is not None:
+            attach_thread()
+            conn.info.setdefault("nest_profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        capture = _current_capture.get()
+        starts = conn.info.get("nest_profile_start")
+        if capture is not None and starts:
+            capture.add_sql(statement, (time.perf_counter() - starts.pop()) * 1000)
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        starts = context.connection.info.get("nest_profile_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,350 @@
+"""
+Recommendation services: precomputed related videos and per-user picks
+
+Nothing is computed per request. A periodic build reads the whole watch
+history once and finds two kinds of neighbors for every video:
+
+- co-watch: item-item cosine over the user x video matrix, each watch
+  weighted by how much of the video was seen, damped for pairs that only
+  a few viewers share
+- content: cosine over the transcript embeddings saved with each video
+
+The two are blended into a top-N related list per video. Every user's
+history is then scored against those lists (one sparse product) for a
+top-N list of unwatched picks. All lists are rows of the recommendations
+table, so serving one is a primary-key read. When a user starts a new
+video, their picks are re-scored from the stored video lists straight
+away; co-watch statistics catch up at the next build.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+
+from app.models import RecommendationList, Video, WatchHistory
+from app.services.embedding_store import video_embeddings
+from app.services.telemetry import stage
+
+RECOMMEND_TOP_N = int(os.getenv("RECOMMEND_TOP_N", "20"))
+RECOMMEND_REBUILD_SECONDS = float(os.getenv("RECOMMEND_REBUILD_SECONDS", "21600"))  # 0 = recommend.py or admin only
+RECOMMEND_CONTENT_WEIGHT = float(os.getenv("RECOMMEND_CONTENT_WEIGHT", "0.3"))  # share of content vs co-watch
+RECOMMEND_SHRINK = float(os.getenv("RECOMMEND_SHRINK", "5"))  # shared watch weight at which a pair counts half
+RECOMMEND_RECENT = int(os.getenv("RECOMMEND_RECENT", "50"))  # latest watches used to refresh one user
+BLOCK = 1024  # videos per similarity block; bounds build memory at BLOCK x videos
+USER_BLOCK = 4096
+WRITE_BATCH = 5000
+POPULAR_KEY = "popular"
+POPULAR_SIZE = 5  # popular list holds top_n * this, so picks survive removing watched videos
+
+Neighbors = Tuple[np.ndarray, np.ndarray]  # (column indices, scores), best first
+_EMPTY: Neighbors = (np.empty(0, dtype=np.int64), np.empty(0))
+
+
+def watch_weight(completion) -> np.ndarray:
+    """Implicit rating of a watch: starting a video counts a quarter, finishing it counts fully"""
+    return 0.25 + 0.75 * np.clip(np.asarray(completion, dtype=float), 0, 100) / 100
+
+
+def _top(indices: np.ndarray, scores: np.ndarray, n: int) -> Neighbors:
+    """The n highest-scoring entries, best first"""
+    if len(scores) > n:
+        keep = np.argpartition(-scores, n - 1)[:n]
+        indices, scores = indices[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return indices[order], scores[order]
+
+
+def cowatch_neighbors(X: sparse.csr_matrix, n: int, shrink: float = RECOMMEND_SHRINK) -> List[Neighbors]:
+    """Top-n co-watched videos of every video (column) of a user x video matrix
+
+    Co-watch weights come from X.T @ X, computed BLOCK videos at a time so
+    memory never holds the full video x video matrix.
+    """
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+    by_video = X.T.tocsr()
+    neighbors = []
+    for start in range(0, X.shape[1], BLOCK):
+        shared = (by_video[start:start + BLOCK] @ X).tocsr()
+        for row in range(shared.shape[0]):
+            video = start + row
+            lo, hi = shared.indptr[row], shared.indptr[row + 1]
+            cols, weights = shared.indices[lo:hi], shared.data[lo:hi]
+            keep = cols != video
+            cols, weights = cols[keep], weights[keep]
+            if not len(cols):
+                neighbors.append(_EMPTY)
+                continue
+            scores = weights / (norms[video] * norms[cols]) * (weights / (weights + shrink))
+            neighbors.append(_top(cols, scores, n))
+    return neighbors
+
+
+def content_neighbors(embeddings: np.ndarray, n: int) -> List[Neighbors]:
+    """Top-n most similar rows of an embedding matrix, by cosine, for every row"""
+    count = len(embeddings)
+    if count < 2:
+        return [_EMPTY] * count
+    vectors = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    k = min(n, count - 1)
+    neighbors = []
+    for start in range(0, count, BLOCK):
+        sims = vectors[start:start + BLOCK] @ vectors.T
+        rows = np.arange(len(sims))
+        sims[rows, rows + start] = -np.inf
+        candidates = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        for row, cols in enumerate(candidates):
+            scores = sims[row, cols]
+            keep = scores > 0
+            neighbors.append(_top(cols[keep], scores[keep], n))
+    return neighbors
+
+
+def blend(cowatch: Neighbors, content: Neighbors, n: int,
+          content_weight: float = RECOMMEND_CONTENT_WEIGHT) -> List[Tuple[int, float, str]]:
+    """Merge one video's neighbor lists into [(index, score, source)], best first"""
+    merged: Dict[int, List[float]] = {}
+    for col, score in zip(*cowatch):
+        merged.setdefault(int(col), [0.0, 0.0])[0] = float(score)
+    for col, score in zip(*content):
+        merged.setdefault(int(col), [0.0, 0.0])[1] = float(score)
+    ranked = []
+    for col, (cow, con) in merged.items():
+        source = "both" if cow and con else "cowatch" if cow else "content"
+        ranked.append((col, (1 - content_weight) * cow + content_weight * con, source))
+    ranked.sort(key=lambda item: -item[1])
+    return ranked[:n]
+
+
+class RecommendationService:
+    """Builds, refreshes and serves precomputed recommendation lists"""
+
+    def __init__(self, top_n: int = RECOMMEND_TOP_N, interval: float = RECOMMEND_REBUILD_SECONDS):
+        self.top_n = top_n
+        self.interval = interval
+        self.last_build: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def build(self, db, embeddings: Optional[Dict[int, Iterable[float]]] = None) -> Dict:
+        """Recompute every list from the full watch history; returns counts and stage timings
+
+        Embeddings default to the transcript vectors in the vector store;
+        pass {video_id: vector} to use others.
+        """
+        with self._lock, stage("recommend.build"):
+            timings = {}
+            started = time.perf_counter()
+            video_ids = np.array(sorted(video_id for (video_id,) in db.query(Video.id)), dtype=np.int64)
+            history = db.query(WatchHistory.user_id, WatchHistory.video_id,
+                               func.coalesce(WatchHistory.completion_percentage, 0)).all()
+            # Column-wise conversion; np.array over Row objects is an order of magnitude slower
+            rows = np.array(list(zip(*history)), dtype=float).T.reshape(-1, 3)
+            rows = rows[np.isin(rows[:, 1].astype(np.int64), video_ids)]  # history of deleted videos
+            user_ids, user_index = np.unique(rows[:, 0].astype(np.int64), return_inverse=True)
+            X = sparse.csr_matrix(
+                (watch_weight(rows[:, 2]), (user_index, np.searchsorted(video_ids, rows[:, 1].astype(np.int64)))),
+                shape=(len(user_ids), len(video_ids))
+            )
+            if embeddings is None:
+                embeddings = self._stored_embeddings(db, video_ids.tolist())
+            timings["load"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            cowatch = cowatch_neighbors(X, self.top_n) if X.nnz else [_EMPTY] * len(video_ids)
+            timings["cowatch"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            content = [_EMPTY] * len(video_ids)
+            embedded = [i for i, video_id in enumerate(video_ids.tolist()) if video_id in embeddings]
+            if embedded:
+                matrix = np.asarray([embeddings[int(video_ids[i])] for i in embedded], dtype=np.float32)
+                lookup = np.asarray(embedded)
+                for i, (cols, scores) in zip(embedded, content_neighbors(matrix, self.top_n)):
+                    content[i] = (lookup[cols], scores)
+            timings["content"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            related = [blend(cowatch[i], content[i], self.top_n) for i in range(len(video_ids))]
+            picks = self._score_users(X, related)
+            timings["users"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            now = time.time()
+            records = [{"key": f"video:{video_ids[i]}", "built_at": now,
+                        "items": [[int(video_ids[col]), round(score, 4), source] for col, score, source in items]}
+                       for i, items in enumerate(related) if items]
+            records += [{"key": f"user:{user_ids[u]}", "built_at": now,
+                         "items": [[int(video_ids[col]), round(float(score), 4), "history"]
+                                   for col, score in zip(*items)]}
+                        for u, items in enumerate(picks) if len(items[0])]
+            popularity = np.asarray(X.sum(axis=0)).ravel()
+            cols, scores = _top(np.arange(len(video_ids)), popularity, self.top_n * POPULAR_SIZE)
+            records.append({"key": POPULAR_KEY, "built_at": now,
+                            "items": [[int(video_ids[col]), round(float(score), 4), "popular"]
+                                      for col, score in zip(cols, scores) if score > 0]})
+            db.query(RecommendationList).delete(synchronize_session=False)
+            for offset in range(0, len(records), WRITE_BATCH):
+                db.bulk_insert_mappings(RecommendationList, records[offset:offset + WRITE_BATCH])
+            db.commit()
+            timings["write"] = time.perf_counter() - started
+
+            self.last_build = {
+                "built_at": now,
+                "videos": len(video_ids),
+                "users": len(user_ids),
+                "watches": int(X.nnz),
+                "embedded_videos": len(embedded),
+                "lists": len(records),
+                "seconds": {name: round(value, 3) for name, value in timings.items()},
+            }
+            return self.last_build
+
+    def _score_users(self, X: sparse.csr_matrix, related: List[List[Tuple[int, float, str]]]) -> List[Neighbors]:
+        """Top-n unwatched videos per user: their weighted history times the related lists"""
+        rows, cols, data = [], [], []
+        for video, items in enumerate(related):
+            for col, score, _ in items:
+                rows.append(video)
+                cols.append(col)
+                data.append(score)
+        R = sparse.csr_matrix((data, (rows, cols)), shape=(X.shape[1], X.shape[1]))
+        totals = np.asarray(X.sum(axis=1)).ravel()
+
+        picks = []
+        for start in range(0, X.shape[0], USER_BLOCK):
+            scores = (X[start:start + USER_BLOCK] @ R).tocsr()
+            for row in range(scores.shape[0]):
+                user = start + row
+                lo, hi = scores.indptr[row], scores.indptr[row + 1]
+                candidates, values = scores.indices[lo:hi], scores.data[lo:hi]
+                keep = ~np.isin(candidates, X.indices[X.indptr[user]:X.indptr[user + 1]])
+                picks.append(_top(candidates[keep], values[keep] / totals[user], self.top_n))
+        return picks
+
+    def _stored_embeddings(self, db, video_ids: List[int]) -> Dict[int, np.ndarray]:
+        """Transcript vectors saved with the videos, then the vector store for videos indexed before that"""
+        from app.services.vector_stores import open_vector_store
+
+        embeddings = video_embeddings(db, video_ids)
+        wanted = set(video_ids) - set(embeddings)
+        by_uploader: Dict[int, List[int]] = {}
+        for video_id, uploader_id in db.query(Video.id, Video.uploader_id).filter(Video.transcript.isnot(None)):
+            if video_id in wanted:
+                by_uploader.setdefault(uploader_id, []).append(video_id)
+        if not by_uploader:
+            return embeddings
+
+        try:
+            # Read-only: the model server (or this process's AIService) is the writer
+            store = open_vector_store(readonly=True)
+        except Exception as e:
+            print(f"Error opening vector store for recommendations: {e}")
+            return embeddings
+        for uploader_id, ids in by_uploader.items():
+            try:
+                stored = store.embeddings(uploader_id, [f"video_{i}" for i in ids])
+            except Exception as e:
+                print(f"Error reading embeddings for recommendations: {e}")
+                continue
+            for doc_id, vector in stored.items():
+                embeddings[int(doc_id.split("_", 1)[1])] = vector
+        return embeddings
+
+    def refresh_user(self, user_id: int, db=None):
+        """Re-score one user's picks from the stored video lists, e.g. after they start a new video"""
+        from app.database import SessionLocal
+
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            history = db.query(WatchHistory.video_id, WatchHistory.completion_percentage).filter(
+                WatchHistory.user_id == user_id
+            ).order_by(WatchHistory.last_watched_at.desc(), WatchHistory.id.desc()).all()
+            watched = {h.video_id for h in history}
+            weights = {h.video_id: float(watch_weight(h.completion_percentage or 0))
+                       for h in history[:RECOMMEND_RECENT]}
+
+            lists = db.query(RecommendationList).filter(
+                RecommendationList.key.in_([f"video:{video_id}" for video_id in weights])
+            ).all()
+            scores: Dict[int, float] = {}
+            for row in lists:
+                weight = weights[int(row.key.split(":", 1)[1])]
+                for video_id, score, _ in row.items:
+                    if video_id not in watched:
+                        scores[video_id] = scores.get(video_id, 0.0) + weight * score
+
+            total = sum(weights.values()) or 1.0
+            ranked = sorted(scores.items(), key=lambda item: -item[1])[:self.top_n]
+            db.merge(RecommendationList(
+                key=f"user:{user_id}",
+                items=[[video_id, round(score / total, 4), "history"] for video_id, score in ranked],
+                built_at=time.time()
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error refreshing recommendations for user {user_id}: {e}")
+        finally:
+            if own_session:
+                db.close()
+
+    def _items(self, db, key: str) -> List[List]:
+        return db.query(RecommendationList.items).filter(RecommendationList.key == key).scalar() or []
+
+    def related(self, db, video_id: int, limit: int = 10) -> List[List]:
+        """[[video_id, score, source]] related to a video, or popular videos if it has no list yet"""
+        limit = min(max(limit, 1), self.top_n)
+        items = self._items(db, f"video:{video_id}")
+        if not items:
+            items = [item for item in self._items(db, POPULAR_KEY) if item[0] != video_id]
+        return items[:limit]
+
+    def for_user(self, db, user_id: int, limit: int = 20) -> List[List]:
+        """[[video_id, score, source]] picked for a user; popular unwatched videos until they have picks"""
+        limit = min(max(limit, 1), self.top_n)
+        items = self._items(db, f"user:{user_id}")
+        if not items:
+            watched = {video_id for (video_id,) in
+                       db.query(WatchHistory.video_id).filter(WatchHistory.user_id == user_id)}
+            items = [item for item in self._items(db, POPULAR_KEY) if item[0] not in watched]
+        return items[:limit]
+
+    def built_at(self, db) -> Optional[float]:
+        return db.query(RecommendationList.built_at).filter(RecommendationList.key == POPULAR_KEY).scalar()
+
+    def start(self):
+        """Rebuild every RECOMMEND_REBUILD_SECONDS in a background thread"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="recommendations", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        from app.database import SessionLocal
+
+        while True:
+            wait = self.interval
+            db = SessionLocal()
+            try:
+                # Another process sharing the database may have built recently
+                built_at = self.built_at(db)
+                age = time.time() - built_at if built_at else None
+                if age is None or age >= self.interval:
+                    self.build(db)
+                else:
+                    wait = self.interval - age
+            except Exception as e:
+                db.rollback()
+                print(f"Error building recommendations: {e}")
+            finally:
+                db.close()
+            time.sleep(max(wait, 60))
+
+
+recommendation_service = RecommendationService()
@@ -0,0 +1,303 @@
+"""
+Search services: full-text search over videos and documents
+
+One index holds video titles, descriptions and transcripts and document
+titles and content. It is an FTS5 table on SQLite, or a table with a
+weighted tsvector and a GIN index on PostgreSQL. Database triggers on
+videos and documents keep it current, so every writer (routes, the
+transcription workers, bulk ingest) updates it in the same transaction.
+
+Index rows are keyed by id * 2 for videos and id * 2 + 1 for documents,
+so a trigger replaces a row by key instead of scanning for it.
+"""
+
+import html
+import os
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.database import engine
+
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")  # PostgreSQL text search configuration
+SEARCH_MAX_TERMS = 16
+SNIPPET_WORDS = 16
+
+KINDS = {"video": 0, "document": 1}
+
+# Snippets are marked with control characters, escaped, then given <mark> tags
+_START, _STOP = "\x02", "\x03"
+
+
+def _markup(value: Optional[str]) -> str:
+    """HTML-escaped text with matches wrapped in <mark>"""
+    if not value:
+        return ""
+    return html.escape(value).replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+def _result(key: int, score: float, title: Optional[str], snippet: Optional[str]) -> Dict:
+    return {
+        "type": "video" if key % 2 == KINDS["video"] else "document",
+        "id": key // 2,
+        "title": _markup(title),
+        "snippet": _markup(snippet),
+        "score": round(score, 6),
+    }
+
+
+class SearchBackend:
+    """Full-text index maintained by database triggers"""
+
+    name = "none"
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def ensure_index(self):
+        """Create the index and triggers if missing, filling the index from existing rows"""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Re-read every video and document into the index"""
+        raise NotImplementedError
+
+    def search(self, query: str, user_id: int, kind: Optional[str] = None,
+               skip: int = 0, limit: int = 20) -> Dict:
+        """Ranked page of matches; documents are only visible to their owner"""
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 with porter stemming, ranked by BM25 weighted towards titles"""
+
+    name = "sqlite_fts5"
+
+    SCHEMA = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            owner_id UNINDEXED, title, description, content,
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS videos_search_insert AFTER INSERT ON videos BEGIN
+            INSERT INTO search_index (rowid, owner_id, title, description, content)
+            VALUES (new.id * 2, NULL, new.title, new.description, new.transcript);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS videos_search_update
+        AFTER UPDATE OF title, description, transcript ON videos BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2;
+            INSERT INTO search_index (rowid, owner_id, title, description, content)
+            VALUES (new.id * 2, NULL, new.title, new.description, new.transcript);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS videos_search_delete AFTER DELETE ON videos BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS documents_search_insert AFTER INSERT ON documents BEGIN
+            INSERT INTO search_index (rowid, owner_id, title, description, content)
+            VALUES (new.id * 2 + 1, new.owner_id, new.title, NULL, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS documents_search_update
+        AFTER UPDATE OF title, content, owner_id ON documents BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+            INSERT INTO search_index (rowid, owner_id, title, description, content)
+            VALUES (new.id * 2 + 1, new.owner_id, new.title, NULL, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS documents_search_delete AFTER DELETE ON documents BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        END""",
+    ]
+
+    BACKFILL = [
+        """INSERT INTO search_index (rowid, owner_id, title, description, content)
+        SELECT id * 2, NULL, title, description, transcript FROM videos""",
+        """INSERT INTO search_index (rowid, owner_id, title, description, content)
+        SELECT id * 2 + 1, owner_id, title, NULL, content FROM documents""",
+    ]
+
+    def ensure_index(self):
+        with self.engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+            )).first()
+            for statement in self.SCHEMA:
+                conn.execute(text(statement))
+            if not exists:
+                for statement in self.BACKFILL:
+                    conn.execute(text(statement))
+
+    def rebuild(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM search_index"))
+            for statement in self.BACKFILL:
+                conn.execute(text(statement))
+            conn.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+
+    @staticmethod
+    def match_query(query: str) -> Optional[str]:
+        """User input as an FTS5 query: every word required, no operators"""
+        terms = re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+        return " ".join(f'"{term}"' for term in terms) or None
+
+    def search(self, query: str, user_id: int, kind: Optional[str] = None,
+               skip: int = 0, limit: int = 20) -> Dict:
+        match = self.match_query(query)
+        if match is None:
+            return {"query": query, "total": 0, "results": []}
+
+        where = "search_index MATCH :match AND (owner_id IS NULL OR owner_id = :user_id)"
+        params = {"match": match, "user_id": user_id, "skip": skip, "limit": limit}
+        if kind:
+            where += " AND rowid % 2 = :kind"
+            params["kind"] = KINDS[kind]
+
+        with self.engine.connect() as conn:
+            total = conn.execute(text(f"SELECT count(*) FROM search_index WHERE {where}"), params).scalar()
+            rows = conn.execute(text(f"""
+                SELECT rowid, bm25(search_index, 0.0, 10.0, 4.0, 1.0) AS score,
+                       highlight(search_index, 1, char(2), char(3)) AS title,
+                       snippet(search_index, -1, char(2), char(3), '…', {SNIPPET_WORDS}) AS snippet
+                FROM search_index WHERE {where}
+                ORDER BY score, rowid LIMIT :limit OFFSET :skip
+            """), params).all()
+        # bm25() is lower-is-better; flip it so higher scores rank first
+        return {"query": query, "total": total,
+                "results": [_result(row.rowid, -row.score, row.title, row.snippet) for row in rows]}
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Weighted tsvector (title A, description B, content C) ranked with ts_rank_cd"""
+
+    name = "postgres_tsvector"
+
+    def __init__(self, engine, language: str = SEARCH_LANGUAGE):
+        super().__init__(engine)
+        if not re.fullmatch(r"[a-z_]+", language):
+            raise ValueError(f"Invalid SEARCH_LANGUAGE: {language}")
+        self.language = language
+
+    def _schema(self) -> List[str]:
+        config = f"'{self.language}'::regconfig"
+        return [
+            f"""CREATE TABLE IF NOT EXISTS search_index (
+                id BIGINT PRIMARY KEY,
+                owner_id INTEGER,
+                title TEXT,
+                description TEXT,
+                content TEXT,
+                document TSVECTOR GENERATED ALWAYS AS (
+                    setweight(to_tsvector({config}, coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector({config}, coalesce(description, '')), 'B') ||
+                    setweight(to_tsvector({config}, coalesce(content, '')), 'C')
+                ) STORED
+            )""",
+            "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)",
+            """CREATE OR REPLACE FUNCTION search_index_videos() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    DELETE FROM search_index WHERE id = OLD.id * 2;
+                    RETURN OLD;
+                END IF;
+                INSERT INTO search_index (id, owner_id, title, description, content)
+                VALUES (NEW.id * 2, NULL, NEW.title, NEW.description, NEW.transcript)
+                ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title,
+                    description = EXCLUDED.description, content = EXCLUDED.content;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql""",
+            """CREATE OR REPLACE FUNCTION search_index_documents() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    DELETE FROM search_index WHERE id = OLD.id * 2 + 1;
+                    RETURN OLD;
+                END IF;
+                INSERT INTO search_index (id, owner_id, title, description, content)
+                VALUES (NEW.id * 2 + 1, NEW.owner_id, NEW.title, NULL, NEW.content)
+                ON CONFLICT (id) DO UPDATE SET owner_id = EXCLUDED.owner_id,
+                    title = EXCLUDED.title, content = EXCLUDED.content;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql""",
+            "DROP TRIGGER IF EXISTS videos_search ON videos",
+            """CREATE TRIGGER videos_search
+            AFTER INSERT OR DELETE OR UPDATE OF title, description, transcript ON videos
+            FOR EACH ROW EXECUTE FUNCTION search_index_videos()""",
+            "DROP TRIGGER IF EXISTS documents_search ON documents",
+            """CREATE TRIGGER documents_search
+            AFTER INSERT OR DELETE OR UPDATE OF title, content, owner_id ON documents
+            FOR EACH ROW EXECUTE FUNCTION search_index_documents()""",
+        ]
+
+    BACKFILL = [
+        """INSERT INTO search_index (id, owner_id, title, description, content)
+        SELECT id * 2, NULL, title, description, transcript FROM videos
+        ON CONFLICT (id) DO NOTHING""",
+        """INSERT INTO search_index (id, owner_id, title, description, content)
+        SELECT id * 2 + 1, owner_id, title, NULL, content FROM documents
+        ON CONFLICT (id) DO NOTHING""",
+    ]
+
+    def ensure_index(self):
+        with self.engine.begin() as conn:
+            exists = conn.execute(text("SELECT to_regclass('search_index')")).scalar()
+            for statement in self._schema():
+                conn.execute(text(statement))
+            if not exists:
+                for statement in self.BACKFILL:
+                    conn.execute(text(statement))
+
+    def rebuild(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("TRUNCATE search_index"))
+            for statement in self.BACKFILL:
+                conn.execute(text(statement))
+
+    def search(self, query: str, user_id: int, kind: Optional[str] = None,
+               skip: int = 0, limit: int = 20) -> Dict:
+        if not re.search(r"\w", query):
+            return {"query": query, "total": 0, "results": []}
+
+        where = "document @@ q AND (owner_id IS NULL OR owner_id = :user_id)"
+        params = {"language": self.language, "query": query, "user_id": user_id,
+                  "skip": skip, "limit": limit,
+                  "title_options": f"StartSel={_START}, StopSel={_STOP}, HighlightAll=true",
+                  "snippet_options": f"StartSel={_START}, StopSel={_STOP}, MaxFragments=2, "
+                                     f"MaxWords={SNIPPET_WORDS}, MinWords=6, FragmentDelimiter=\" … \""}
+        if kind:
+            where += " AND id % 2 = :kind"
+            params["kind"] = KINDS[kind]
+        tsquery = "websearch_to_tsquery(CAST(:language AS regconfig), :query) q"
+
+        with self.engine.connect() as conn:
+            total = conn.execute(text(f"SELECT count(*) FROM search_index, {tsquery} WHERE {where}"),
+                                 params).scalar()
+            # ts_headline re-parses the text, so it only runs on the requested page
+            rows = conn.execute(text(f"""
+                WITH hits AS (
+                    SELECT id, title, description, content, ts_rank_cd(document, q, 32) AS score
+                    FROM search_index, {tsquery}
+                    WHERE {where}
+                    ORDER BY score DESC, id LIMIT :limit OFFSET :skip
+                )
+                SELECT id, score,
+                       ts_headline(CAST(:language AS regconfig), coalesce(title, ''), q,
+                                   :title_options) AS title,
+                       ts_headline(CAST(:language AS regconfig),
+                                   concat_ws(' ', description, content), q,
+                                   :snippet_options) AS snippet
+                FROM hits, {tsquery}
+                ORDER BY score DESC, id
+            """), params).all()
+        return {"query": query, "total": total,
+                "results": [_result(row.id, row.score, row.title, row.snippet) for row in rows]}
+
+
+def create_search_backend(engine) -> Optional[SearchBackend]:
+    """Search backend for the configured database, or None if it has no full-text support here"""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        return SQLiteSearchBackend(engine)
+    if dialect == "postgresql":
+        return PostgresSearchBackend(engine)
+    print(f"Error: full-text search is not available for {dialect} databases")
+    return None
+
+
+search_service = create_search_backend(engine)
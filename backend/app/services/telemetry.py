@@ -0,0 +1,391 @@
+"""
+Telemetry services: Prometheus metrics and lightweight tracing spans
+
+Everything here works in-process with no collector. Metrics are rendered in
+the Prometheus text format at /metrics. Spans are kept in a ring buffer of
+recent traces, and optionally appended to TRACE_LOG_PATH as JSON lines or
+forwarded to OpenTelemetry when OTEL_EXPORTER_OTLP_ENDPOINT is set and the
+SDK is installed.
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.profiler import attach_thread
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))  # recent traces kept in memory
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")  # append finished spans as JSON lines
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+
+# Latency buckets in seconds, from a DB lookup to a long Whisper pass
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180, 600, 1800)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict) -> Tuple:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; callback gauges are read at scrape time"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], Dict]] = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def _samples(self) -> List[str]:
+        values = dict(self._values)
+        if self.callback is not None:
+            # Callbacks return {label tuple or value: number}
+            try:
+                for key, value in self.callback().items():
+                    values[key if isinstance(key, tuple) else (str(key),)] = value
+            except Exception as e:
+                print(f"Error collecting {self.name}: {e}")
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {entry[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together for a scrape"""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = (),
+              callback: Optional[Callable[[], Dict]] = None) -> Gauge:
+        gauge = self._get_or_create(Gauge, name, help, labelnames)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "nest_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_ERRORS = registry.counter(
+    "nest_stage_errors_total", "Pipeline stage runs that raised", ["stage"])
+MODEL_LOAD_SECONDS = registry.gauge(
+    "nest_model_load_seconds", "Time the last load of each model took", ["kind", "model"])
+HTTP_SECONDS = registry.histogram(
+    "nest_http_request_seconds", "HTTP request latency", ["method", "route", "status"])
+DB_SECONDS = registry.histogram(
+    "nest_db_query_seconds", "SQL statement latency", ["operation"])
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Keeps finished spans of recent traces, grouped by trace id"""
+
+    def __init__(self, max_traces: int = TRACE_BUFFER, log_path: str = TRACE_LOG_PATH):
+        self.max_traces = max_traces
+        self.log_path = log_path
+        self._traces: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._current: contextvars.ContextVar = contextvars.ContextVar("nest_span", default=None)
+        self._otel = _otel_tracer()
+
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+    def context(self) -> Optional[Dict]:
+        """Trace context to hand to another thread, process or queued job"""
+        span = self.current()
+        return {"trace_id": span.trace_id, "span_id": span.span_id} if span else None
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Dict] = None, **attributes):
+        """Time a block as a child of the current span (or of an explicit parent context)"""
+        current = self.current()
+        if parent:
+            trace_id, parent_id = parent["trace_id"], parent.get("span_id")
+        elif current:
+            trace_id, parent_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_id = uuid.uuid4().hex, None
+
+        span = Span(name, trace_id, parent_id, attributes)
+        token = self._current.set(span)
+        otel = self._otel.start_as_current_span(name, attributes=_otel_attributes(attributes)) \
+            if self._otel else nullcontext()
+        started = time.perf_counter()
+        try:
+            with otel:
+                yield span
+        except Exception as e:
+            span.status = "error"
+            span.error = str(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            self._current.reset(token)
+            self._record(span)
+
+    def trace(self, trace_id: str) -> List[Dict]:
+        with self._lock:
+            spans = list(self._traces.get(trace_id, ()))
+        return [span.to_dict() for span in sorted(spans, key=lambda s: s.start)]
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """Summaries of the latest traces, newest first"""
+        with self._lock:
+            traces = list(self._traces.items())[-limit:]
+        summaries = []
+        for trace_id, spans in reversed(traces):
+            spans = list(spans)
+            root = min(spans, key=lambda s: s.start)
+            end = max(s.start + (s.duration or 0) for s in spans)
+            summaries.append({
+                "trace_id": trace_id,
+                "root": root.name,
+                "start": root.start,
+                "duration_ms": round((end - root.start) * 1000, 3),
+                "spans": len(spans),
+                "errors": sum(1 for s in spans if s.status == "error"),
+            })
+        return summaries
+
+    def _record(self, span: Span):
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = deque(maxlen=500)
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            else:
+                self._traces.move_to_end(span.trace_id)
+            spans.append(span)
+
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(span.to_dict(), default=str) + "\n")
+            except Exception as e:
+                print(f"Error writing trace log: {e}")
+
+
+def _otel_tracer():
+    """OpenTelemetry tracer when an OTLP endpoint is configured and the SDK is installed"""
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk is not installed; "
+              "keeping traces in memory only")
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "nest-ai-backend"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer("nest-ai")
+
+
+def _otel_attributes(attributes: Dict) -> Dict:
+    return {k: v if isinstance(v, (str, bool, int, float)) else str(v) for k, v in attributes.items()}
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def stage(name: str, parent: Optional[Dict] = None, **attributes):
+    """Trace a pipeline stage and record its latency in nest_stage_seconds"""
+    attach_thread()  # stages run in worker threads count towards a profiled request
+    if not METRICS_ENABLED:
+        yield None
+        return
+    started = time.perf_counter()
+    try:
+        with tracer.span(name, parent=parent, **attributes) as span:
+            yield span
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def record_model_load(kind: str, model: str, seconds: float):
+    MODEL_LOAD_SECONDS.set(round(seconds, 3), kind=kind, model=model)
+
+
+def instrument_engine(engine):
+    """Time every SQL statement run through a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("nest_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["nest_query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        starts = context.connection.info.get("nest_query_start") if context.connection else None
+        if starts:
+            starts.pop()
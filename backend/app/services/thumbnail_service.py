@@ -0,0 +1,240 @@
+"""
+Thumbnail and preview sprite services
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.database import SessionLocal
+from app.models import Video
+from app.services.telemetry import stage
+
+# Cache root - every video gets a directory named after its content hash
+THUMBNAIL_DIR = Path(os.getenv("THUMBNAIL_DIR", "uploads/thumbnails"))
+
+# Named still sizes (width, height); frames are scaled to fit, never upscaled
+THUMBNAIL_SIZES = {
+    "card": (320, 180),
+    "hero": (1280, 720),
+}
+
+# Seek-preview sprite sheet settings
+SPRITE_TILE_SIZE = (160, 90)
+SPRITE_COLUMNS = 10
+SPRITE_INTERVAL = float(os.getenv("SPRITE_INTERVAL", "10"))  # seconds between tiles
+SPRITE_MAX_TILES = 100
+
+# Scene detection: number of probe frames and minimum histogram distance
+SCENE_SAMPLES = 24
+SCENE_THRESHOLD = 0.35
+SCENE_WINDOW = 120.0  # only look at the first two minutes for the poster frame
+
+JPEG_QUALITY = 82
+HASH_CHUNK_SIZE = 1024 * 1024
+
+CACHE_FILES = tuple(f"{name}.jpg" for name in THUMBNAIL_SIZES) + ("sprite.jpg", "sprite.vtt")
+
+
+class ThumbnailService:
+    """Service for generating resized thumbnails and seek-preview sprites"""
+
+    def __init__(self, cache_dir: Path = THUMBNAIL_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def content_hash(self, video_path: str) -> str:
+        """Hash the video file so identical uploads share one cache entry"""
+        digest = hashlib.sha256()
+        with open(video_path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()[:32]
+
+    def cache_path(self, key: str) -> Path:
+        """Directory holding every rendition for a content hash"""
+        return self.cache_dir / key
+
+    def is_cached(self, key: str) -> bool:
+        """Check whether all renditions already exist for a content hash"""
+        directory = self.cache_path(key)
+        return all((directory / name).exists() for name in CACHE_FILES)
+
+    def generate(self, video_path: str, key: Optional[str] = None) -> str:
+        """Render all thumbnails for a video and return the cache key"""
+        key = key or self.content_hash(video_path)
+        if self.is_cached(key):
+            return key
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception(f"Could not open video: {video_path}")
+
+        # Render into a scratch directory and swap it in, so readers never
+        # see a half-written cache entry
+        staging = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=self.cache_dir))
+        try:
+            duration = self._duration(cap)
+            poster = self._pick_poster_frame(cap, duration)
+            if poster is None:
+                raise Exception(f"Could not decode any frame from: {video_path}")
+
+            for name, size in THUMBNAIL_SIZES.items():
+                self._write_jpeg(staging / f"{name}.jpg", self._fit(poster, size))
+
+            self._write_sprite(cap, duration, staging)
+
+            target = self.cache_path(key)
+            if target.exists():
+                shutil.rmtree(target, ignore_errors=True)
+            os.replace(staging, target)
+        finally:
+            cap.release()
+            if staging.exists():
+                shutil.rmtree(staging, ignore_errors=True)
+
+        return key
+
+    def _duration(self, cap) -> float:
+        """Video duration in seconds from container metadata"""
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+        if fps > 0 and frames > 0:
+            return frames / fps
+        return 0.0
+
+    def _read_at(self, cap, seconds: float):
+        """Seek to a timestamp and decode one frame"""
+        cap.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000)
+        ret, frame = cap.read()
+        return frame if ret else None
+
+    def _histogram(self, frame) -> np.ndarray:
+        """Normalized HSV histogram used for scene comparison"""
+        small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+        return cv2.normalize(hist, hist).flatten()
+
+    def _is_blank(self, frame) -> bool:
+        """Reject fade-ins, black slates and washed-out frames"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return gray.std() < 8 or gray.mean() < 16 or gray.mean() > 240
+
+    def _pick_poster_frame(self, cap, duration: float):
+        """Pick the first frame after a clear scene change"""
+        window = min(duration, SCENE_WINDOW) if duration > 0 else 0
+        if window <= 0:
+            return self._read_at(cap, 0)
+
+        step = window / SCENE_SAMPLES
+        best_frame, best_score = None, -1.0
+        fallback = None
+        previous = None
+
+        for i in range(SCENE_SAMPLES):
+            frame = self._read_at(cap, i * step)
+            if frame is None:
+                continue
+            if fallback is None:
+                fallback = frame
+
+            hist = self._histogram(frame)
+            if previous is not None and not self._is_blank(frame):
+                score = cv2.compareHist(previous, hist, cv2.HISTCMP_BHATTACHARYYA)
+                if score >= SCENE_THRESHOLD:
+                    return frame
+                if score > best_score:
+                    best_frame, best_score = frame, score
+            previous = hist
+
+        return best_frame if best_frame is not None else fallback
+
+    def _fit(self, frame, size: Tuple[int, int]):
+        """Scale a frame down to fit inside size, keeping aspect ratio"""
+        height, width = frame.shape[:2]
+        scale = min(size[0] / width, size[1] / height, 1.0)
+        if scale >= 1.0:
+            return frame
+        new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(frame, new_size, interpolation=cv2.INTER_AREA)
+
+    def _write_jpeg(self, path: Path, frame):
+        cv2.imwrite(str(path), frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+
+    def _sprite_timestamps(self, duration: float) -> List[float]:
+        """Evenly spaced tile timestamps, widened for long videos"""
+        if duration <= 0:
+            return [0.0]
+        interval = max(SPRITE_INTERVAL, duration / SPRITE_MAX_TILES)
+        count = max(1, int(duration // interval))
+        return [i * interval for i in range(count)]
+
+    def _write_sprite(self, cap, duration: float, out_dir: Path):
+        """Write sprite.jpg and a WebVTT index pointing at its tiles"""
+        tile_w, tile_h = SPRITE_TILE_SIZE
+        timestamps = self._sprite_timestamps(duration)
+        columns = min(SPRITE_COLUMNS, len(timestamps))
+        rows = (len(timestamps) + columns - 1) // columns
+
+        sheet = np.zeros((rows * tile_h, columns * tile_w, 3), dtype=np.uint8)
+        cues = ["WEBVTT", ""]
+
+        for index, start in enumerate(timestamps):
+            frame = self._read_at(cap, start)
+            x, y = (index % columns) * tile_w, (index // columns) * tile_h
+            if frame is not None:
+                sheet[y:y + tile_h, x:x + tile_w] = cv2.resize(
+                    frame, (tile_w, tile_h), interpolation=cv2.INTER_AREA
+                )
+
+            end = timestamps[index + 1] if index + 1 < len(timestamps) else max(duration, start + 1)
+            cues.append(f"{_vtt_time(start)} --> {_vtt_time(end)}")
+            cues.append(f"sprite.jpg#xywh={x},{y},{tile_w},{tile_h}")
+            cues.append("")
+
+        self._write_jpeg(out_dir / "sprite.jpg", sheet)
+        (out_dir / "sprite.vtt").write_text("\n".join(cues), encoding="utf-8")
+
+
+def _vtt_time(seconds: float) -> str:
+    """Format seconds as a WebVTT timestamp"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def thumbnail_url(key: str, name: str = "card.jpg") -> str:
+    """Relative URL of a cached rendition (served with immutable cache headers)"""
+    return f"api/thumbnails/{key}/{name}"
+
+
+thumbnail_service = ThumbnailService()
+
+
+def generate_video_thumbnails(video_id: int, video_path: str, trace: Optional[Dict] = None):
+    """Background task: render thumbnails and attach them to the video row"""
+    try:
+        with stage("thumbnail", parent=trace, video_id=video_id):
+            key = thumbnail_service.generate(video_path)
+    except Exception as e:
+        print(f"Error generating thumbnails for video {video_id}: {e}")
+        return
+
+    db = SessionLocal()
+    try:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video:
+            video.thumbnail_key = key
+            video.thumbnail_path = thumbnail_url(key)
+            db.commit()
+    finally:
+        db.close()
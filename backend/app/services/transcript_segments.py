@@ -0,0 +1,244 @@
+"""
+Transcript segment services: timestamps for transcript text
+
+Whisper returns the transcript as segments with start and end times. Each
+video keeps them in transcript_segments as three packed little-endian
+uint32 arrays instead of a row per segment. The arrays hold each
+segment's character offset in Video.transcript and its start and end in
+milliseconds. That is 12 bytes a segment (about 10 KB per hour of speech),
+and the text itself is not stored twice. Any character position in the
+transcript maps to a timestamp with a binary search over the offsets.
+"""
+
+import html
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.models import TranscriptSegments, Video
+from app.services.bm25_index import STOPWORDS
+
+DTYPE = np.dtype("<u4")
+MOMENTS_PER_VIDEO = int(os.getenv("MOMENTS_PER_VIDEO", "3"))
+MOMENT_CANDIDATES = int(os.getenv("MOMENT_CANDIDATES", "20"))  # videos from the search index scanned for moments
+
+_WORD = re.compile(r"[^\W_]+")  # words as FTS5's unicode61 tokenizer splits them
+STEM_CACHE_SIZE = 100000
+
+_stem_cache: Dict[str, str] = {}
+_stem_lock = threading.Lock()
+_stemmer: Optional[sqlite3.Connection] = None
+
+
+def _stems(words: Iterable[str]) -> Dict[str, str]:
+    """{word: stem} from the search index's own tokenizer, so snippets mark what the index matched
+
+    Words go through an in-memory FTS5 table with the same porter tokenizer
+    and come back from fts5vocab. Stems are cached per word.
+    """
+    global _stemmer
+
+    words = set(words)
+    with _stem_lock:
+        missing = [word for word in words if word not in _stem_cache]
+        if missing:
+            if _stemmer is None:
+                _stemmer = sqlite3.connect(":memory:", check_same_thread=False)
+                _stemmer.execute("CREATE VIRTUAL TABLE words USING fts5("
+                                 "word, tokenize = 'porter unicode61 remove_diacritics 2')")
+                _stemmer.execute("CREATE VIRTUAL TABLE word_terms USING fts5vocab(words, instance)")
+            if len(_stem_cache) + len(missing) > STEM_CACHE_SIZE:
+                _stem_cache.clear()
+            _stemmer.executemany("INSERT INTO words (rowid, word) VALUES (?, ?)", enumerate(missing))
+            for row, term in _stemmer.execute("SELECT doc, term FROM word_terms WHERE offset = 0"):
+                _stem_cache[missing[row]] = term
+            _stemmer.execute("DELETE FROM words")
+            for word in missing:
+                _stem_cache.setdefault(word, word)
+        return {word: _stem_cache[word] for word in words}
+
+
+def _query_stems(query: str) -> set:
+    return set(_stems(word for word in _WORD.findall(query.lower()) if word not in STOPWORDS).values())
+
+
+class SegmentTimeline:
+    """Decoded segment arrays of one transcript"""
+
+    def __init__(self, offsets: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def from_row(cls, row) -> "SegmentTimeline":
+        return cls(np.frombuffer(row.offsets, dtype=DTYPE), np.frombuffer(row.starts, dtype=DTYPE),
+                   np.frombuffer(row.ends, dtype=DTYPE))
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def locate(self, char: int) -> int:
+        """Index of the segment containing a character position"""
+        return max(0, int(np.searchsorted(self.offsets, char, side="right")) - 1)
+
+    def span(self, index: int) -> tuple:
+        """(start, end) of a segment in seconds"""
+        return float(self.starts[index]) / 1000, float(self.ends[index]) / 1000
+
+    def text(self, transcript: str, index: int) -> str:
+        end = int(self.offsets[index + 1]) if index + 1 < len(self) else len(transcript)
+        return transcript[int(self.offsets[index]):end].strip()
+
+    def to_dicts(self) -> List[Dict]:
+        """[{"offset", "start", "end"}] as used by the context packer"""
+        return [{"offset": int(o), "start": float(s) / 1000, "end": float(e) / 1000}
+                for o, s, e in zip(self.offsets, self.starts, self.ends)]
+
+
+def pack_segments(transcript: str, segments: Iterable[Dict]) -> Optional[Dict]:
+    """Column values for a transcript's segments, or None if there are none"""
+    offsets, starts, ends = [], [], []
+    position = 0
+    for segment in segments:
+        text = (segment.get("text") or "").strip()
+        if not text:
+            continue
+        found = transcript.find(text, position)
+        if found < 0:
+            found = position  # text differs from the joined transcript; keep the order
+        offsets.append(found)
+        starts.append(max(0, round(segment["start"] * 1000)))
+        ends.append(max(0, round(segment["end"] * 1000)))
+        position = max(position, found + len(text))
+    if not offsets:
+        return None
+    return {
+        "count": len(offsets),
+        "offsets": np.asarray(offsets, dtype=DTYPE).tobytes(),
+        "starts": np.asarray(starts, dtype=DTYPE).tobytes(),
+        "ends": np.asarray(ends, dtype=DTYPE).tobytes(),
+    }
+
+
+def save_segments(db, video_id: int, transcript: str, segments: Iterable[Dict]):
+    """Replace a video's segment timings; the caller commits"""
+    packed = pack_segments(transcript or "", segments or [])
+    if packed is None:
+        db.query(TranscriptSegments).filter(TranscriptSegments.video_id == video_id).delete()
+        return
+    db.merge(TranscriptSegments(video_id=video_id, **packed))
+
+
+def load_timelines(db, video_ids: Iterable[int]) -> Dict[int, SegmentTimeline]:
+    video_ids = list(video_ids)
+    if not video_ids:
+        return {}
+    rows = db.query(TranscriptSegments).filter(TranscriptSegments.video_id.in_(video_ids)).all()
+    return {row.video_id: SegmentTimeline.from_row(row) for row in rows}
+
+
+def attach_segments(contexts: List[Dict]):
+    """Add segment timings to retrieved video contexts so citations carry timestamps"""
+    from app.database import SessionLocal
+
+    missing = [c for c in contexts
+               if c.get("metadata", {}).get("type") == "video" and "segments" not in c]
+    if not missing:
+        return
+    db = SessionLocal()
+    try:
+        timelines = load_timelines(db, {c["metadata"].get("id") for c in missing})
+    except Exception as e:
+        print(f"Error loading transcript segments: {e}")
+        return
+    finally:
+        db.close()
+    for context in missing:
+        timeline = timelines.get(context["metadata"].get("id"))
+        context["segments"] = timeline.to_dicts() if timeline is not None else None
+
+
+def _highlight(text: str, stems: set) -> str:
+    """HTML-escaped segment text with query words wrapped in <mark>"""
+    parts, position = [], 0
+    matches = list(_WORD.finditer(text))
+    words = _stems(match.group().lower() for match in matches)
+    for match in matches:
+        if words[match.group().lower()] in stems:
+            parts.append(html.escape(text[position:match.start()]))
+            parts.append(f"<mark>{html.escape(match.group())}</mark>")
+            position = match.end()
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
+
+def moments_in(transcript: str, timeline: SegmentTimeline, stems: set,
+               limit: int = MOMENTS_PER_VIDEO) -> List[Dict]:
+    """Segments mentioning the most distinct query words, best first"""
+    hits: Dict[int, Dict[str, int]] = {}
+    matches = list(_WORD.finditer(transcript))
+    words = _stems(match.group().lower() for match in matches)
+    for match in matches:
+        stem = words[match.group().lower()]
+        if stem in stems:
+            found = hits.setdefault(timeline.locate(match.start()), {})
+            found[stem] = found.get(stem, 0) + 1
+
+    ranked = sorted(hits.items(), key=lambda item: (-len(item[1]), -sum(item[1].values()), item[0]))
+    moments = []
+    for index, found in ranked[:limit]:
+        start, end = timeline.span(index)
+        moments.append({
+            "start": start,
+            "end": end,
+            "snippet": _highlight(timeline.text(transcript, index), stems),
+            "matched": len(found),
+        })
+    return moments
+
+
+def find_moments(db, query: str, user_id: int, video_id: Optional[int] = None,
+                 limit: int = 20) -> List[Dict]:
+    """(video, start, end, snippet) for the places a query is said
+
+    Candidate videos come from the full-text index (or the given video);
+    each candidate's transcript is then scanned and mapped to segments.
+    """
+    from app.services.search_service import search_service
+
+    stems = _query_stems(query)
+    if not stems:
+        return []
+
+    if video_id is not None:
+        candidates = [video_id]
+    elif search_service is not None:
+        results = search_service.search(query, user_id, kind="video", limit=MOMENT_CANDIDATES)["results"]
+        candidates = [hit["id"] for hit in results]
+    else:
+        return []
+
+    timelines = load_timelines(db, candidates)
+    if not timelines:
+        return []
+    videos = {row.id: row for row in db.query(Video.id, Video.title, Video.transcript)
+              .filter(Video.id.in_(list(timelines))).all()}
+
+    moments = []
+    for rank, candidate in enumerate(candidates):
+        video = videos.get(candidate)
+        if video is None or not video.transcript:
+            continue
+        for moment in moments_in(video.transcript, timelines[candidate], stems):
+            moment.update(video_id=video.id, title=video.title, rank=rank,
+                          url=f"/video/{video.id}?t={int(moment['start'])}")
+            moments.append(moment)
+
+    # Moments matching more of the query first, then by their video's search rank
+    moments.sort(key=lambda m: (-m["matched"], m["rank"]))
+    return [{k: v for k, v in m.items() if k != "rank"} for m in moments[:limit]]
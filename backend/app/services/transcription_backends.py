@@ -0,0 +1,138 @@
+"""
+Speech-to-text inference backends for CPU and GPU nodes
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+# Backend selection and CPU tuning
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "whisper")  # whisper, whisper_int8, faster_whisper
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))  # 0 = let the runtime decide
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")  # faster_whisper only
+
+_threads_configured = False
+_threads_lock = threading.Lock()
+
+
+def configure_threads(threads: int = WHISPER_THREADS):
+    """Pin torch intra-op threads once per process
+
+    Inter-op parallelism is kept at one thread: each worker runs a single
+    decode at a time, and extra inter-op threads only add contention.
+    """
+    global _threads_configured
+    if threads <= 0:
+        return
+    with _threads_lock:
+        if _threads_configured:
+            return
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already fixed once torch has started parallel work
+        _threads_configured = True
+
+
+def _result(text: str, language: Optional[str], segments) -> Dict:
+    """Result shape shared by all backends"""
+    return {
+        "text": (text or "").strip(),
+        "language": language or "unknown",
+        "segments": [
+            {"start": float(seg["start"]), "end": float(seg["end"]), "text": seg["text"].strip()}
+            for seg in segments
+        ],
+    }
+
+
+class TranscriptionBackend:
+    """Interface for speech-to-text engines"""
+
+    name = "base"
+
+    def __init__(self, model_size: str):
+        self.model_size = model_size
+
+    def transcribe(self, audio_path: str, language: Optional[str] = None) -> Dict:
+        """Return {"text", "language", "segments": [{"start", "end", "text"}]}"""
+        raise NotImplementedError
+
+
+class WhisperBackend(TranscriptionBackend):
+    """Reference openai-whisper model in fp32 (fp16 on GPU)"""
+
+    name = "whisper"
+
+    def __init__(self, model_size: str):
+        super().__init__(model_size)
+        import torch
+        import whisper
+        configure_threads()
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = self._load(whisper)
+
+    def _load(self, whisper):
+        return whisper.load_model(self.model_size, device=self.device)
+
+    def transcribe(self, audio_path: str, language: Optional[str] = None) -> Dict:
+        result = self.model.transcribe(
+            audio_path,
+            language=language,
+            fp16=self.device == "cuda",
+            verbose=None
+        )
+        return _result(result.get("text"), result.get("language"), result.get("segments", []))
+
+
+class QuantizedWhisperBackend(WhisperBackend):
+    """openai-whisper with int8 dynamic quantization of Linear layers (CPU only)"""
+
+    name = "whisper_int8"
+
+    def _load(self, whisper):
+        import torch
+        self.device = "cpu"
+        model = whisper.load_model(self.model_size, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 engine via faster-whisper, int8 on CPU by default"""
+
+    name = "faster_whisper"
+
+    def __init__(self, model_size: str, compute_type: str = WHISPER_COMPUTE_TYPE):
+        super().__init__(model_size)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise Exception("WHISPER_BACKEND=faster_whisper requires the faster-whisper package")
+        self.model = WhisperModel(
+            model_size,
+            device="cpu",
+            compute_type=compute_type,
+            cpu_threads=WHISPER_THREADS,
+            num_workers=1
+        )
+
+    def transcribe(self, audio_path: str, language: Optional[str] = None) -> Dict:
+        segments, info = self.model.transcribe(audio_path, language=language, beam_size=5)
+        segments = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+        return _result("".join(s["text"] for s in segments), info.language, segments)
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    QuantizedWhisperBackend.name: QuantizedWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def create_backend(model_size: str, name: str = WHISPER_BACKEND) -> TranscriptionBackend:
+    """Instantiate a transcription backend by name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown Whisper backend: {name}. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_size)
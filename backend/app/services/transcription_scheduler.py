@@ -0,0 +1,283 @@
+"""
+Transcription scheduling with Whisper model tiers chosen by queue load
+"""
+
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from app.database import SessionLocal
+from app.models import Video
+from app.services.embedding_store import pack_embedding
+from app.services.fair_queue import PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_RETRANSCRIBE
+from app.services.job_broker import Job, JobBroker, JobWorker, create_broker
+from app.services.learning_context import learning_context
+from app.services.telemetry import stage, tracer
+from app.services.transcript_segments import save_segments
+
+# Model tiers from fastest to most accurate
+TRANSCRIBE_TIERS = os.getenv("TRANSCRIBE_TIERS", "tiny,base,small").split(",")
+TRANSCRIBE_TARGET_TIER = os.getenv("TRANSCRIBE_TARGET_TIER", "small")
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "1"))  # in the API process; 0 with remote workers
+TRANSCRIBE_UPGRADE = os.getenv("TRANSCRIBE_UPGRADE", "true").lower() == "true"
+
+# Backlog (seconds of queued audio) above which a faster tier is used
+TIER_BACKLOG_SECONDS = [
+    float(x) for x in os.getenv("TRANSCRIBE_TIER_BACKLOG", "3600,600").split(",")
+]
+LONG_MEDIA_SECONDS = float(os.getenv("TRANSCRIBE_LONG_MEDIA", "5400"))
+
+# Interactive uploads beyond this many queued per user are treated as bulk
+INTERACTIVE_JOBS_PER_USER = int(os.getenv("TRANSCRIBE_INTERACTIVE_PER_USER", "3"))
+
+
+JOB_KIND = "transcribe"
+
+
+class TranscriptionJob:
+    """A queued transcription of one video at one model tier"""
+
+    def __init__(self, video_id: int, user_id: int, file_path: str, duration: float,
+                 tier: str, priority: int, trace: Optional[Dict] = None):
+        self.video_id = video_id
+        self.user_id = user_id
+        self.file_path = file_path
+        self.duration = duration or 0.0
+        self.tier = tier
+        self.priority = priority
+        self.trace = trace  # span context of the upload, so the job joins its trace
+
+    @property
+    def is_upgrade(self) -> bool:
+        return self.priority == PRIORITY_RETRANSCRIBE
+
+    @property
+    def cost(self) -> float:
+        # Seconds of audio, so a user queuing many long lectures gets the same
+        # share of workers as a user queuing one short clip
+        return max(self.duration, 60.0)
+
+    def payload(self) -> Dict:
+        return {"video_id": self.video_id, "user_id": self.user_id, "file_path": self.file_path,
+                "duration": self.duration, "tier": self.tier, "trace": self.trace}
+
+    @classmethod
+    def from_job(cls, job: Job) -> "TranscriptionJob":
+        payload = job.payload
+        return cls(payload["video_id"], payload["user_id"], payload["file_path"],
+                   payload["duration"], payload["tier"], job.priority, payload.get("trace"))
+
+
+class TranscriptionScheduler:
+    """Transcription jobs on a job broker, run by local worker threads or remote workers
+
+    With the memory broker the queue lives in this process. With the
+    database or redis broker, API servers only enqueue (TRANSCRIBE_WORKERS=0)
+    and `python worker.py` processes on media nodes do the work.
+    """
+
+    def __init__(self, workers: int = TRANSCRIBE_WORKERS, tiers: List[str] = TRANSCRIBE_TIERS,
+                 target_tier: str = TRANSCRIBE_TARGET_TIER, upgrade: bool = TRANSCRIBE_UPGRADE,
+                 broker: Optional[JobBroker] = None):
+        self.tiers = tiers
+        self.target_tier = target_tier if target_tier in tiers else tiers[-1]
+        self.upgrade = upgrade
+        self.workers = workers
+        self.broker = broker or create_broker()
+
+        self._lock = threading.Lock()
+        self._workers: List[JobWorker] = []
+        self._video_service = None
+
+    def start(self):
+        """Start local worker threads on first use"""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.workers):
+                worker = JobWorker(self.broker, {JOB_KIND: self})
+                thread = threading.Thread(target=worker.run, name=f"transcribe-{i}", daemon=True)
+                thread.start()
+                self._workers.append(worker)
+
+    @property
+    def depth(self) -> int:
+        return sum(entry["jobs"] for (_, status), entry in self.broker.counts().items() if status == "queued")
+
+    @property
+    def backlog_seconds(self) -> float:
+        """Seconds of audio queued or running for a first pass"""
+        return self.broker.pending_cost([PRIORITY_INTERACTIVE, PRIORITY_BULK])
+
+    def choose_tier(self, duration: float) -> str:
+        """Pick the most accurate tier the current backlog allows"""
+        backlog = self.backlog_seconds + (duration or 0.0)
+        tiers = self.tiers[:self.tiers.index(self.target_tier) + 1]
+
+        # Each threshold passed drops one tier, starting from the target
+        steps = sum(1 for threshold in TIER_BACKLOG_SECONDS if backlog > threshold)
+        if duration and duration > LONG_MEDIA_SECONDS:
+            steps += 1
+        return tiers[max(0, len(tiers) - 1 - steps)]
+
+    def submit(self, video_id: int, user_id: int, file_path: str, duration: float,
+               priority: int = PRIORITY_INTERACTIVE) -> str:
+        """Queue a video for transcription and return the tier chosen for the first pass
+        
+        Use PRIORITY_BULK for backfills so they never delay interactive uploads.
+        A user who already has several interactive jobs waiting is bulk
+        uploading, so their further uploads are demoted too.
+        """
+        self.start()
+        if priority == PRIORITY_INTERACTIVE and \
+                self._queued(user_id, PRIORITY_INTERACTIVE) >= INTERACTIVE_JOBS_PER_USER:
+            priority = PRIORITY_BULK
+        tier = self.choose_tier(duration)
+        self._put(TranscriptionJob(video_id, user_id, file_path, duration, tier, priority,
+                                   trace=tracer.context()))
+        return tier
+
+    def recover(self):
+        """Re-queue work lost when the process stopped
+
+        Only the memory broker loses jobs; the others keep them, and their
+        workers re-queue jobs abandoned mid-run.
+        """
+        if self.broker.persistent:
+            self.start()
+            return
+
+        db = SessionLocal()
+        try:
+            videos = db.query(Video).filter(
+                Video.transcript_status.in_(["queued", "processing", "draft"])
+            ).all()
+            jobs = [(v.id, v.uploader_id, v.file_path, v.duration, v.transcript_status)
+                    for v in videos]
+        finally:
+            db.close()
+
+        for video_id, user_id, file_path, duration, status in jobs:
+            if not os.path.exists(file_path):
+                continue
+            if status == "draft":
+                if self.upgrade:
+                    self.start()
+                    self._put(TranscriptionJob(video_id, user_id, file_path, duration,
+                                               self.target_tier, PRIORITY_RETRANSCRIBE))
+            else:
+                self.submit(video_id, user_id, file_path, duration)
+
+    def stats(self) -> Dict:
+        broker = self.broker.stats()
+        return {
+            "queue_depth": sum(c["queued"] for c in broker["classes"].values()),
+            "backlog_seconds": self.backlog_seconds,
+            "workers": self.workers,
+            "target_tier": self.target_tier,
+            "broker": broker,
+        }
+
+    def job_status(self, job_id: str) -> Optional[Dict]:
+        job = self.broker.get(job_id)
+        return job.status_dict() if job else None
+
+    def run(self, job: Job, progress: Callable[[float], None]) -> Dict:
+        """Job handler called by a JobWorker"""
+        transcription = TranscriptionJob.from_job(job)
+        with stage("transcribe.job", parent=transcription.trace, video_id=transcription.video_id,
+                   tier=transcription.tier, attempt=job.attempts, worker=job.worker_id):
+            return self._run(transcription, progress)
+
+    def failed(self, job: Job):
+        """Job handler hook once a job has used up its attempts"""
+        transcription = TranscriptionJob.from_job(job)
+        print(f"Error transcribing video {transcription.video_id} with {transcription.tier}: {job.error}")
+        if not transcription.is_upgrade:
+            self._update_video(transcription.video_id, transcript_status="failed")
+
+    def _queued(self, user_id: int, priority: int) -> int:
+        return self.broker.counts(tenant=user_id).get((priority, "queued"), {"jobs": 0})["jobs"]
+
+    def _put(self, job: TranscriptionJob):
+        queued = self.broker.enqueue(JOB_KIND, job.payload(), job.priority,
+                                     tenant=job.user_id, cost=job.cost)
+        self._update_video(job.video_id, transcript_job_id=queued.id)
+
+    def _run(self, job: TranscriptionJob, progress: Callable[[float], None]) -> Dict:
+        if job.is_upgrade and not self._needs_upgrade(job.video_id):
+            return {"skipped": True}
+
+        if self._video_service is None:
+            from app.services.video_service import VideoService
+            self._video_service = VideoService()
+
+        if not job.is_upgrade:
+            self._update_video(job.video_id, transcript_status="processing")
+        progress(0.1)
+        transcription = self._video_service.transcribe_video(job.file_path, model_size=job.tier)
+        transcript = (transcription.get("text") or "").strip()
+        progress(0.8)
+
+        final = self.tiers.index(job.tier) >= self.tiers.index(self.target_tier)
+        video = self._update_video(
+            job.video_id,
+            segments=transcription.get("segments"),
+            transcript=transcript,
+            transcript_model=job.tier,
+            transcript_embeddings=None,  # replaced below once the new transcript is indexed
+            transcript_status="completed" if final or not self.upgrade else "draft"
+        )
+        if video is None:
+            return {"skipped": True}
+
+        if transcript:
+            from app.services.ai_service import get_ai_service
+            vector = get_ai_service().store_context(
+                job.user_id,
+                "video",
+                job.video_id,
+                transcript,
+                {"title": video["title"], "subject": video["subject"], "topic": video["topic"]}
+            )
+            if vector is not None:
+                self._update_video(job.video_id, transcript_embeddings=pack_embedding(vector))
+
+        if not final and self.upgrade:
+            self._put(TranscriptionJob(job.video_id, job.user_id, job.file_path, job.duration,
+                                       self.target_tier, PRIORITY_RETRANSCRIBE,
+                                       trace=tracer.context()))
+        return {"tier": job.tier, "characters": len(transcript)}
+
+    def _needs_upgrade(self, video_id: int) -> bool:
+        """Skip a queued upgrade if the video is gone or already has a better transcript"""
+        db = SessionLocal()
+        try:
+            video = db.query(Video).filter(Video.id == video_id).first()
+            if video is None:
+                return False
+            current = video.transcript_model
+            return current not in self.tiers or \
+                self.tiers.index(current) < self.tiers.index(self.target_tier)
+        finally:
+            db.close()
+
+    def _update_video(self, video_id: int, segments: Optional[List[Dict]] = None,
+                      **fields) -> Optional[Dict]:
+        db = SessionLocal()
+        try:
+            video = db.query(Video).filter(Video.id == video_id).first()
+            if video is None:
+                return None
+            for name, value in fields.items():
+                setattr(video, name, value)
+            if "transcript" in fields:
+                save_segments(db, video_id, fields["transcript"], segments)
+                learning_context.invalidate_video(db, video_id)
+            db.commit()
+            return {"title": video.title, "subject": video.subject, "topic": video.topic}
+        finally:
+            db.close()
+
+
+transcription_scheduler = TranscriptionScheduler()
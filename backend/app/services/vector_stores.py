@@ -0,0 +1,624 @@
+"""
+Vector store backends: ChromaDB and a memory-mapped NumPy store
+
+AIService keeps one collection of passages per user. VECTOR_STORE picks
+where they live:
+- chroma: ChromaDB PersistentClient in CHROMA_DIR (the default)
+- mmap: MmapVectorStore in VECTOR_DIR, for single-node deployments. Opening
+  it maps a few files and replays a short log, so it starts in
+  milliseconds, and only the pages a query touches are resident.
+
+The mmap store's files, for generation g:
+- base-g.vec: float16 rows, or int8 rows plus per-row scales in base-g.scale.
+  Rows are grouped by user, so one user's search is a contiguous slice.
+- base-g.txt and base-g.off: passage text and its offsets, read only for results
+- base-g.json: ids, metadata, each user's row range and IVF lists
+- log-g.bin: upserts and deletes since the base was written, replayed on open
+Compaction writes generation g+1 from the live rows and starts an empty
+log. Users with at least VECTOR_IVF_MIN_ROWS rows get an inverted file
+index: rows are ordered by nearest k-means centroid, and a query scans only
+the VECTOR_IVF_PROBES closest lists. Smaller users are searched exactly.
+One process writes (it holds VECTOR_DIR/LOCK); others open read-only snapshots.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Backend selection
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")  # chroma, mmap
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16")  # mmap row format: float16 or int8
+VECTOR_IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "20000"))  # smaller users are searched exactly; 0 = always exact
+VECTOR_IVF_PROBES = int(os.getenv("VECTOR_IVF_PROBES", "8"))  # IVF lists scanned per query
+VECTOR_COMPACT_ROWS = int(os.getenv("VECTOR_COMPACT_ROWS", "5000"))  # compact once logged plus deleted rows reach this
+
+SCAN_ROWS = 8192  # rows converted to float32 at a time during a scan
+_RECORD = struct.Struct("<II")  # log record: header length, body length
+
+
+def _chroma_dir() -> str:
+    return os.getenv("CHROMA_DIR", os.path.join(os.getcwd(), "chroma_db"))
+
+
+def _vector_dir() -> str:
+    return os.getenv("VECTOR_DIR", os.path.join(os.getcwd(), "vector_store"))
+
+
+class VectorStore:
+    """Per-user passage vectors with their text and metadata
+
+    Ids are unique within a user ("video_12"). Vectors are L2-normalized, so
+    ranking by dot product is ranking by cosine similarity.
+    """
+
+    name = "base"
+
+    def upsert(self, user_id: int, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        raise NotImplementedError
+
+    def delete(self, user_id: int, ids: List[str]):
+        raise NotImplementedError
+
+    def count(self, user_id: int) -> int:
+        raise NotImplementedError
+
+    def query(self, user_id: int, embedding, n: int) -> List[Tuple[str, Dict]]:
+        """Up to n (id, {"content", "metadata"}) pairs, most similar first"""
+        raise NotImplementedError
+
+    def get(self, user_id: int, ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """{"content", "metadata"} by id for the given ids, or for all of the user's passages"""
+        raise NotImplementedError
+
+    def embeddings(self, user_id: int, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors by id; ids that are not stored are left out"""
+        raise NotImplementedError
+
+    def compact(self) -> Dict:
+        return {}
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+class ChromaStore(VectorStore):
+    """One ChromaDB collection per user in CHROMA_DIR"""
+
+    name = "chroma"
+
+    def __init__(self, path: Optional[str] = None, readonly: bool = False):
+        import chromadb
+        from chromadb.config import Settings
+
+        path = path or _chroma_dir()
+        os.makedirs(path, exist_ok=True)
+        self.client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+
+    def _collection(self, user_id: int):
+        return self.client.get_or_create_collection(name=f"user_{user_id}_context", metadata={"user_id": user_id})
+
+    def upsert(self, user_id: int, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        self._collection(user_id).upsert(
+            embeddings=[[float(x) for x in vector] for vector in embeddings],
+            documents=documents,
+            ids=ids,
+            metadatas=metadatas
+        )
+
+    def delete(self, user_id: int, ids: List[str]):
+        self._collection(user_id).delete(ids=ids)
+
+    def count(self, user_id: int) -> int:
+        return self._collection(user_id).count()
+
+    def query(self, user_id: int, embedding, n: int) -> List[Tuple[str, Dict]]:
+        results = self._collection(user_id).query(query_embeddings=[list(map(float, embedding))], n_results=n)
+        if not results["documents"] or not results["documents"][0]:
+            return []
+        return [(doc_id, {"content": results["documents"][0][i],
+                          "metadata": results["metadatas"][0][i] if results["metadatas"] else {}})
+                for i, doc_id in enumerate(results["ids"][0])]
+
+    def get(self, user_id: int, ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        stored = self._collection(user_id).get(ids=ids, include=["documents", "metadatas"])
+        return {doc_id: {"content": stored["documents"][i],
+                         "metadata": stored["metadatas"][i] if stored["metadatas"] else {}}
+                for i, doc_id in enumerate(stored["ids"])}
+
+    def embeddings(self, user_id: int, ids: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            collection = self.client.get_collection(name=f"user_{user_id}_context")
+        except Exception:
+            return {}  # nothing stored for this user yet
+        found = {}
+        for offset in range(0, len(ids), 500):
+            stored = collection.get(ids=ids[offset:offset + 500], include=["embeddings"])
+            for doc_id, vector in zip(stored["ids"], stored["embeddings"]):
+                found[doc_id] = np.asarray(vector, dtype=np.float32)
+        return found
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 codes and the float32 scales that restore them"""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def train_ivf(vectors: np.ndarray, lists: int, iterations: int = 8, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means centroids and each row's list, trained on a sample"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), lists * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assigned = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, sample)
+        empty = ~np.bincount(assigned, minlength=lists).astype(bool)
+        sums[empty] = centroids[empty]  # keep a centroid that attracted nothing
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    assigned = np.concatenate([np.argmax(vectors[i:i + SCAN_ROWS] @ centroids.T, axis=1)
+                               for i in range(0, len(vectors), SCAN_ROWS)])
+    return centroids, assigned
+
+
+class _Base:
+    """One compacted generation: memory-mapped rows grouped by user"""
+
+    def __init__(self, directory: Path, generation: int):
+        self.generation = generation
+        self.rows = 0
+        self.dim = 0
+        self.dtype = None
+        self.ids: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.users: Dict[int, Dict] = {}
+        self.index: Dict[Tuple[int, str], int] = {}
+        self.vectors = self.scales = self.centroids = self.text = self.offsets = None
+        path = directory / f"base-{generation}.json"
+        if not path.exists():
+            self.alive = np.zeros(0, dtype=bool)
+            return
+
+        header = json.loads(path.read_text())
+        self.rows, self.dim, self.dtype = header["rows"], header["dim"], np.dtype(header["dtype"])
+        self.ids, self.metadatas = header["ids"], header["metadatas"]
+        self.users = {int(user_id): entry for user_id, entry in header["users"].items()}
+        for user_id, entry in self.users.items():
+            for row in range(entry["start"], entry["end"]):
+                self.index[(user_id, self.ids[row])] = row
+        self.alive = np.ones(self.rows, dtype=bool)  # cleared in memory as rows are replaced or deleted
+        if self.rows:
+            stem = directory / f"base-{generation}"
+            self.vectors = np.memmap(f"{stem}.vec", dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+            if self.dtype == np.int8:
+                self.scales = np.memmap(f"{stem}.scale", dtype=np.float32, mode="r", shape=(self.rows,))
+            self.offsets = np.memmap(f"{stem}.off", dtype=np.int64, mode="r", shape=(self.rows + 1,))
+            if self.offsets[-1]:
+                self.text = np.memmap(f"{stem}.txt", dtype=np.uint8, mode="r")
+            if header.get("centroids"):
+                self.centroids = np.memmap(f"{stem}.ivf", dtype=np.float32, mode="r",
+                                           shape=(header["centroids"], self.dim))
+
+    def content(self, row: int) -> str:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.text[start:end]).decode("utf-8") if end > start else ""
+
+    def vectors_at(self, start: int, end: int) -> np.ndarray:
+        """Rows start..end as float32"""
+        block = np.asarray(self.vectors[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:end, None]
+        return block
+
+    def scan(self, user_id: int, query: np.ndarray, probes: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and scores for a user's live rows, in the closest IVF lists when it has them"""
+        entry = self.users.get(user_id)
+        if entry is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ranges = [(entry["start"], entry["end"])]
+        if entry.get("lists"):
+            first, last = entry["centroids"]
+            closest = np.argsort(-(self.centroids[first:last] @ query))[:probes]
+            bounds = entry["lists"]
+            ranges = [(bounds[i], bounds[i + 1]) for i in sorted(closest)]
+        rows, scores = [], []
+        for start, end in ranges:
+            for block in range(start, end, SCAN_ROWS):
+                stop = min(block + SCAN_ROWS, end)
+                live = np.flatnonzero(self.alive[block:stop]) + block
+                if len(live) == stop - block:
+                    block_scores = self.vectors_at(block, stop) @ query
+                elif len(live):
+                    block_scores = self.vectors_at(block, stop)[live - block] @ query
+                else:
+                    continue
+                rows.append(live)
+                scores.append(block_scores)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(scores)
+
+
+class MmapVectorStore(VectorStore):
+    """NumPy vector store in memory-mapped files with an append log"""
+
+    name = "mmap"
+
+    def __init__(self, path: Optional[str] = None, dtype: str = VECTOR_DTYPE, readonly: bool = False,
+                 ivf_min_rows: int = VECTOR_IVF_MIN_ROWS, probes: int = VECTOR_IVF_PROBES,
+                 compact_rows: int = VECTOR_COMPACT_ROWS):
+        self.directory = Path(path or _vector_dir())
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float16, np.int8):
+            raise ValueError(f"Unknown vector dtype: {dtype}. Available: float16, int8")
+        self.readonly = readonly
+        self.ivf_min_rows = ivf_min_rows
+        self.probes = probes
+        self.compact_rows = compact_rows
+        self.dim = 0
+        self._write_lock = threading.Lock()  # one writer or compaction at a time
+        self._state_lock = threading.Lock()  # held briefly to read or swap the in-memory state
+        self._compacting = False
+        self._log = None
+        self._lock_file = None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not readonly:
+            import fcntl
+            self._lock_file = open(self.directory / "LOCK", "a+")
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise Exception(f"Vector store {self.directory} is open for writing in another process; "
+                                f"run a model server (serve.py) so one process writes")
+        current = self.directory / "CURRENT"
+        generation = json.loads(current.read_text())["generation"] if current.exists() else 0
+        self._load(generation)
+
+    def _load(self, generation: int):
+        self._base = _Base(self.directory, generation)
+        self.dim = self._base.dim
+        self._tail: Dict[int, Dict[str, Tuple[np.ndarray, str, Dict]]] = {}
+        self._log_rows = 0
+        log_path = self.directory / f"log-{generation}.bin"
+        if log_path.exists():
+            self._replay(log_path)
+        if not self.readonly:
+            self._log = open(log_path, "ab")
+
+    def _replay(self, log_path: Path):
+        data = log_path.read_bytes()
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            header_len, body_len = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + header_len + body_len
+            if end > len(data):
+                break
+            header = json.loads(data[offset + _RECORD.size:offset + _RECORD.size + header_len])
+            body = memoryview(data)[offset + _RECORD.size + header_len:end]
+            if header["op"] == "put":
+                self._apply_put(header, body)
+            else:
+                self._apply_delete(header["user"], header["ids"])
+            offset = end
+        if offset < len(data):
+            # A write interrupted by a crash; everything before it is intact
+            print(f"Error replaying vector log {log_path}: dropped {len(data) - offset} bytes of a partial record")
+            if not self.readonly:
+                with open(log_path, "r+b") as f:
+                    f.truncate(offset)
+
+    def _apply_put(self, header: Dict, body):
+        user_id, ids, dim = header["user"], header["ids"], header["dim"]
+        text_len = sum(header["lengths"])
+        vectors = np.frombuffer(body[text_len:], dtype=np.float32).reshape(len(ids), dim)
+        self.dim = self.dim or dim
+        with self._state_lock:
+            tail = self._tail.setdefault(user_id, {})
+            position = 0
+            for doc_id, length, metadata, vector in zip(ids, header["lengths"], header["metadatas"], vectors):
+                row = self._base.index.get((user_id, doc_id))
+                if row is not None:
+                    self._base.alive[row] = False
+                tail[doc_id] = (vector, bytes(body[position:position + length]).decode("utf-8"), metadata)
+                position += length
+            self._log_rows += len(ids)
+
+    def _apply_delete(self, user_id: int, ids: List[str]):
+        with self._state_lock:
+            tail = self._tail.get(user_id, {})
+            for doc_id in ids:
+                row = self._base.index.get((user_id, doc_id))
+                if row is not None:
+                    self._base.alive[row] = False
+                tail.pop(doc_id, None)
+            self._log_rows += len(ids)
+
+    def _append(self, header: Dict, body: bytes = b""):
+        if self.readonly:
+            raise Exception(f"Vector store {self.directory} is open read-only")
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        self._log.write(_RECORD.pack(len(encoded), len(body)) + encoded + body)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def upsert(self, user_id: int, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        if self.dim and vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector store holds {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+        encoded = [document.encode("utf-8") for document in documents]
+        header = {"op": "put", "user": user_id, "ids": list(ids), "dim": int(vectors.shape[1]),
+                  "lengths": [len(document) for document in encoded], "metadatas": list(metadatas)}
+        body = b"".join(encoded) + vectors.tobytes()
+        with self._write_lock:
+            self._append(header, body)
+            self._apply_put(header, memoryview(body))
+        self._maybe_compact()
+
+    def delete(self, user_id: int, ids: List[str]):
+        with self._write_lock:
+            self._append({"op": "delete", "user": user_id, "ids": list(ids)})
+            self._apply_delete(user_id, ids)
+        self._maybe_compact()
+
+    def count(self, user_id: int) -> int:
+        with self._state_lock:
+            base = self._base
+            logged = len(self._tail.get(user_id, {}))
+        entry = base.users.get(user_id)
+        live = int(base.alive[entry["start"]:entry["end"]].sum()) if entry else 0
+        return live + logged
+
+    def query(self, user_id: int, embedding, n: int) -> List[Tuple[str, Dict]]:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        with self._state_lock:
+            base = self._base
+            logged = list(self._tail.get(user_id, {}).items())
+        rows, scores = base.scan(user_id, vector, self.probes)
+        candidates = [(float(score), ("base", int(row))) for row, score in zip(*_top(rows, scores, n))]
+        if logged:
+            logged_scores = np.stack([entry[0] for _, entry in logged]) @ vector
+            positions = np.arange(len(logged))
+            candidates += [(float(score), ("log", int(i))) for i, score in zip(*_top(positions, logged_scores, n))]
+        candidates.sort(key=lambda candidate: -candidate[0])
+
+        results = []
+        for _, (where, position) in candidates[:n]:
+            if where == "base":
+                results.append((base.ids[position], {"content": base.content(position),
+                                                     "metadata": base.metadatas[position]}))
+            else:
+                doc_id, (_, content, metadata) = logged[position]
+                results.append((doc_id, {"content": content, "metadata": metadata}))
+        return results
+
+    def _lookup(self, user_id: int, ids: Optional[List[str]]):
+        """(id, base row or None, logged entry or None) for each stored id"""
+        with self._state_lock:
+            base = self._base
+            tail = dict(self._tail.get(user_id, {}))
+        if ids is None:
+            entry = base.users.get(user_id)
+            rows = range(entry["start"], entry["end"]) if entry else range(0)
+            found = [(base.ids[row], row, None) for row in rows if base.alive[row]]
+            return base, found + [(doc_id, None, logged) for doc_id, logged in tail.items()]
+        found = []
+        for doc_id in ids:
+            if doc_id in tail:
+                found.append((doc_id, None, tail[doc_id]))
+                continue
+            row = base.index.get((user_id, doc_id))
+            if row is not None and base.alive[row]:
+                found.append((doc_id, row, None))
+        return base, found
+
+    def get(self, user_id: int, ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        base, found = self._lookup(user_id, ids)
+        return {doc_id: ({"content": logged[1], "metadata": logged[2]} if logged is not None else
+                         {"content": base.content(row), "metadata": base.metadatas[row]})
+                for doc_id, row, logged in found}
+
+    def embeddings(self, user_id: int, ids: List[str]) -> Dict[str, np.ndarray]:
+        base, found = self._lookup(user_id, ids)
+        return {doc_id: logged[0] if logged is not None else base.vectors_at(row, row + 1)[0]
+                for doc_id, row, logged in found}
+
+    def _maybe_compact(self):
+        if self.compact_rows <= 0 or self._compacting:
+            return
+        if self._log_rows + int(self._base.rows - self._base.alive.sum()) < self.compact_rows:
+            return
+        self._compacting = True
+        threading.Thread(target=self._compact_in_background, name="vector-compact", daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Error compacting vector store: {e}")
+        finally:
+            self._compacting = False
+
+    def compact(self) -> Dict:
+        """Write the live rows as a new generation, grouped by user, and start an empty log"""
+        if self.readonly:
+            raise Exception(f"Vector store {self.directory} is open read-only")
+        started = time.perf_counter()
+        with self._write_lock:
+            base, tail = self._base, self._tail
+            generation = base.generation + 1
+            stem = self.directory / f"base-{generation}"
+            header = {"rows": 0, "dim": self.dim, "dtype": self.dtype.name, "ids": [], "metadatas": [],
+                      "users": {}, "centroids": 0}
+            offsets = [0]
+            all_centroids = []
+            with open(f"{stem}.vec", "wb") as vec_file, open(f"{stem}.txt", "wb") as text_file, \
+                    open(f"{stem}.scale", "wb") as scale_file:
+                for user_id in sorted(set(base.users) | set(tail)):
+                    ids, texts, metadatas, vectors = self._live_rows(base, tail.get(user_id, {}), user_id)
+                    if not ids:
+                        continue
+                    entry = {"start": header["rows"], "end": header["rows"] + len(ids)}
+                    if self.ivf_min_rows and len(ids) >= self.ivf_min_rows:
+                        centroids, assigned = train_ivf(vectors, int(np.sqrt(len(ids))))
+                        order = np.argsort(assigned, kind="stable")
+                        ids = [ids[i] for i in order]
+                        texts = [texts[i] for i in order]
+                        metadatas = [metadatas[i] for i in order]
+                        vectors = vectors[order]
+                        sizes = np.bincount(assigned, minlength=len(centroids))
+                        entry["lists"] = (entry["start"] + np.concatenate([[0], np.cumsum(sizes)])).tolist()
+                        entry["centroids"] = [header["centroids"], header["centroids"] + len(centroids)]
+                        header["centroids"] += len(centroids)
+                        all_centroids.append(centroids)
+                    if self.dtype == np.int8:
+                        codes, scales = quantize_int8(vectors)
+                        vec_file.write(codes.tobytes())
+                        scale_file.write(scales.tobytes())
+                    else:
+                        vec_file.write(vectors.astype(np.float16).tobytes())
+                    for text in texts:
+                        encoded = text.encode("utf-8")
+                        text_file.write(encoded)
+                        offsets.append(offsets[-1] + len(encoded))
+                    header["ids"] += ids
+                    header["metadatas"] += metadatas
+                    header["users"][str(user_id)] = entry
+                    header["rows"] += len(ids)
+                for f in (vec_file, text_file, scale_file):
+                    f.flush()
+                    os.fsync(f.fileno())
+            np.asarray(offsets, dtype=np.int64).tofile(f"{stem}.off")
+            if all_centroids:
+                np.concatenate(all_centroids).astype(np.float32).tofile(f"{stem}.ivf")
+            Path(f"{stem}.json").write_text(json.dumps(header, separators=(",", ":")))
+            open(self.directory / f"log-{generation}.bin", "wb").close()
+
+            # The switch is one rename; a crash before it leaves the old generation in place
+            current = self.directory / "CURRENT.tmp"
+            current.write_text(json.dumps({"generation": generation}))
+            os.replace(current, self.directory / "CURRENT")
+
+            self._log.close()
+            new_base = _Base(self.directory, generation)
+            with self._state_lock:
+                self._base, self._tail, self._log_rows = new_base, {}, 0
+                self.dim = new_base.dim or self.dim
+            self._log = open(self.directory / f"log-{generation}.bin", "ab")
+
+        # Mapped old files stay readable by queries already running until they finish
+        for suffix in (".json", ".vec", ".scale", ".txt", ".off", ".ivf"):
+            try:
+                os.unlink(self.directory / f"base-{base.generation}{suffix}")
+            except FileNotFoundError:
+                pass
+        try:
+            os.unlink(self.directory / f"log-{base.generation}.bin")
+        except FileNotFoundError:
+            pass
+        return {"generation": generation, "rows": new_base.rows, "users": len(new_base.users),
+                "ivf_users": sum(1 for entry in new_base.users.values() if entry.get("lists")),
+                "seconds": round(time.perf_counter() - started, 3)}
+
+    def _live_rows(self, base: _Base, logged: Dict, user_id: int):
+        """A user's current ids, texts, metadata and float32 vectors, base rows first"""
+        ids, texts, metadatas, blocks = [], [], [], []
+        entry = base.users.get(user_id)
+        if entry:
+            for start in range(entry["start"], entry["end"], SCAN_ROWS):
+                stop = min(start + SCAN_ROWS, entry["end"])
+                live = np.flatnonzero(base.alive[start:stop])
+                if not len(live):
+                    continue
+                blocks.append(base.vectors_at(start, stop)[live])
+                for row in live + start:
+                    ids.append(base.ids[row])
+                    texts.append(base.content(row))
+                    metadatas.append(base.metadatas[row])
+        for doc_id, (vector, content, metadata) in logged.items():
+            ids.append(doc_id)
+            texts.append(content)
+            metadatas.append(metadata)
+            blocks.append(vector[None, :])
+        vectors = np.concatenate(blocks).astype(np.float32) if blocks else np.zeros((0, self.dim), np.float32)
+        return ids, texts, metadatas, vectors
+
+    def stats(self) -> Dict:
+        with self._state_lock:
+            base = self._base
+            logged = sum(len(entries) for entries in self._tail.values())
+            users = len(set(base.users) | set(self._tail))
+            log_rows = self._log_rows
+        files = [p for p in self.directory.iterdir() if p.name.startswith((f"base-{base.generation}.",
+                                                                          f"log-{base.generation}."))]
+        return {
+            "backend": self.name,
+            "directory": str(self.directory),
+            "generation": base.generation,
+            "dtype": self.dtype.name,
+            "dim": self.dim,
+            "rows": int(base.alive.sum()) + logged,
+            "base_rows": base.rows,
+            "deleted_rows": int(base.rows - base.alive.sum()),
+            "log_records": log_rows,
+            "users": users,
+            "ivf_users": sum(1 for entry in base.users.values() if entry.get("lists")),
+            "file_bytes": sum(p.stat().st_size for p in files),
+        }
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+
+def _top(positions: np.ndarray, scores: np.ndarray, n: int):
+    """The n best-scoring positions and their scores"""
+    if len(scores) > n:
+        keep = np.argpartition(-scores, n)[:n]
+        return positions[keep], scores[keep]
+    return positions, scores
+
+
+STORES = {
+    ChromaStore.name: ChromaStore,
+    MmapVectorStore.name: MmapVectorStore,
+}
+
+
+def open_vector_store(name: str = VECTOR_STORE, readonly: bool = False) -> VectorStore:
+    """Open a vector store backend by name; read-only opens do not take the writer lock"""
+    if name not in STORES:
+        raise ValueError(f"Unknown vector store: {name}. Available: {', '.join(STORES)}")
+    return STORES[name](readonly=readonly)
+
+
+def copy_store(source: VectorStore, target: VectorStore, user_ids: Iterable[int], batch: int = 500) -> int:
+    """Copy every passage of the given users between backends; returns how many were copied"""
+    copied = 0
+    for user_id in user_ids:
+        stored = source.get(user_id)
+        ids = list(stored)
+        for offset in range(0, len(ids), batch):
+            chunk = ids[offset:offset + batch]
+            vectors = source.embeddings(user_id, chunk)
+            chunk = [doc_id for doc_id in chunk if doc_id in vectors]
+            if not chunk:
+                continue
+            target.upsert(user_id, chunk, np.stack([vectors[doc_id] for doc_id in chunk]),
+                          [stored[doc_id]["content"] for doc_id in chunk],
+                          [stored[doc_id]["metadata"] for doc_id in chunk])
+            copied += len(chunk)
+    return copied
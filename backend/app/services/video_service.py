@@ -3,57 +3,92 @@ Video processing services
 """
 
 import os
-import whisper
+import tempfile
+import threading
 from pathlib import Path
 from typing import Optional
 import subprocess
+import time
 from PIL import Image
 import cv2
 
+from app.services.telemetry import record_model_load, stage
+from app.services.transcription_backends import WHISPER_BACKEND, create_backend
+
 
 class VideoService:
     """Service for video processing and transcription"""
     
-    def __init__(self, model_size: str = "base"):
-        """Initialize with Whisper model"""
+    def __init__(self, model_size: str = "base", backend: str = WHISPER_BACKEND):
+        """Initialize with the default Whisper model size; models load on first use"""
         self.model_size = model_size
-        self.model = None
-        self._load_model()
+        self.backend = backend
+        self.models = {}
+        self._models_lock = threading.Lock()
+    
+    @property
+    def model(self):
+        """Default Whisper model"""
+        return self.get_model(self.model_size)
+    
+    def get_model(self, model_size: Optional[str] = None):
+        """Load a Whisper model once and reuse it"""
+        model_size = model_size or self.model_size
+        with self._models_lock:
+            if model_size not in self.models:
+                self.models[model_size] = self._load_model(model_size)
+        return self.models[model_size]
     
-    def _load_model(self):
+    def _load_model(self, model_size: str):
         """Load Whisper model"""
-        print(f"Loading Whisper model: {self.model_size}...")
-        self.model = whisper.load_model(self.model_size)
+        print(f"Loading Whisper model: {model_size} ({self.backend})...")
+        started = time.perf_counter()
+        model = create_backend(model_size, self.backend)
+        record_model_load("whisper", f"{model_size}:{self.backend}", time.perf_counter() - started)
         print("Model loaded!")
+        return model
     
     def extract_audio(self, video_path: str, audio_path: str) -> str:
         """Extract audio from video using ffmpeg"""
         try:
-            subprocess.run(
-                [
-                    "ffmpeg", "-i", video_path,
-                    "-vn", "-acodec", "libmp3lame",
-                    "-y", audio_path
-                ],
-                check=True,
-                capture_output=True
-            )
+            with stage("audio.decode"):
+                subprocess.run(
+                    [
+                        "ffmpeg", "-i", video_path,
+                        "-vn", "-ac", "1", "-ar", "16000",
+                        "-acodec", "pcm_s16le" if audio_path.endswith(".wav") else "libmp3lame",
+                        "-y", audio_path
+                    ],
+                    check=True,
+                    capture_output=True
+                )
             return audio_path
         except subprocess.CalledProcessError as e:
             raise Exception(f"Failed to extract audio: {e}")
     
-    def transcribe_video(self, video_path: str, language: Optional[str] = None) -> dict:
-        """Transcribe video to text"""
-        # Extract audio first
-        audio_path = video_path.replace(".mp4", ".mp3").replace(".mov", ".mp3")
-        self.extract_audio(video_path, audio_path)
+    def transcribe_video(self, video_path: str, language: Optional[str] = None,
+                         model_size: Optional[str] = None) -> dict:
+        """Transcribe video to text
         
-        # Transcribe
-        result = self.model.transcribe(audio_path, language=language)
+        Returns {"text", "language", "segments": [{"start", "end", "text"}]}.
+        """
+        # Extract 16 kHz mono PCM, the format Whisper resamples to anyway, so
+        # decoding skips an MP3 round trip (unique name, a video can be
+        # transcribed by two tiers at once)
+        fd, audio_path = tempfile.mkstemp(suffix=".wav", dir=os.path.dirname(video_path) or None)
+        os.close(fd)
         
-        # Clean up audio file
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
+        try:
+            self.extract_audio(video_path, audio_path)
+            
+            # Transcribe
+            model = self.get_model(model_size)
+            with stage("whisper", model=model.model_size, backend=model.name):
+                result = model.transcribe(audio_path, language=language)
+        finally:
+            # Clean up audio file
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
         
         return result
     
@@ -82,15 +117,16 @@ class VideoService:
     def get_video_duration(self, video_path: str) -> float:
         """Get video duration in seconds"""
         try:
-            result = subprocess.run(
-                [
-                    "ffprobe", "-v", "error", "-show_entries",
-                    "format=duration", "-of", "default=noprint_wrappers=1:nokey=1",
-                    video_path
-                ],
-                capture_output=True,
-                text=True
-            )
+            with stage("ffprobe"):
+                result = subprocess.run(
+                    [
+                        "ffprobe", "-v", "error", "-show_entries",
+                        "format=duration", "-of", "default=noprint_wrappers=1:nokey=1",
+                        video_path
+                    ],
+                    capture_output=True,
+                    text=True
+                )
             return float(result.stdout.strip())
         except Exception:
             return 0.0
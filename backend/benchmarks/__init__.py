@@ -0,0 +1,3 @@
+"""
+Benchmarks for the NEST.ai backend
+"""
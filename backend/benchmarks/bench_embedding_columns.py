@@ -0,0 +1,92 @@
+"""
+Embedding column benchmark: JSON lists against packed float16/float32 bytes
+
+Fills a scratch SQLite database with the same synthetic vectors three
+ways (a JSON list per row, and pack_embedding with float16 and float32),
+then times reading every row back into a matrix, the work a vector store
+rebuild or a recommendation build does. Also reports bytes per value and
+database size. No model is loaded. Run from the backend directory:
+    python -m benchmarks.bench_embedding_columns
+    python -m benchmarks.bench_embedding_columns --rows 100000
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.results import write_results
+
+DIMENSION = 384
+
+
+def _fill(path: Path, rows: np.ndarray, encode):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE videos (id INTEGER PRIMARY KEY, transcript_embeddings)")
+    conn.executemany("INSERT INTO videos VALUES (?, ?)", ((i, encode(v)) for i, v in enumerate(rows)))
+    conn.commit()
+    conn.close()
+
+
+def _read(path: Path, decode) -> float:
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    values = [decode(value) for _, value in conn.execute("SELECT id, transcript_embeddings FROM videos")]
+    matrix = np.asarray(values, dtype=np.float32)
+    conn.close()
+    assert matrix.shape[1] == DIMENSION
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3, help="Full reads per format; the fastest counts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Result file (default benchmarks/results/embedding_columns-<time>.json)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from app.services.embedding_store import pack_embedding, unpack_embedding
+
+    rng = np.random.default_rng(args.seed)
+    rows = rng.normal(size=(args.rows, DIMENSION)).astype(np.float32)
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    formats = {
+        "json": (lambda v: json.dumps(v.tolist()), json.loads),
+        "packed_float32": (lambda v: pack_embedding(v, np.float32), unpack_embedding),
+        "packed_float16": (lambda v: pack_embedding(v, np.float16), unpack_embedding),
+    }
+
+    workdir = Path(tempfile.mkdtemp(prefix="nest-bench-embeddings-"))
+    print(f"{args.rows} rows x {DIMENSION} dimensions, in {workdir}")
+    results = {}
+    for name, (encode, decode) in formats.items():
+        path = workdir / f"{name}.db"
+        started = time.perf_counter()
+        _fill(path, rows, encode)
+        written = time.perf_counter() - started
+        read = min(_read(path, decode) for _ in range(args.repeat))
+        results[name] = {
+            "value_bytes": len(encode(rows[0]).encode() if name == "json" else encode(rows[0])),
+            "db_mb": round(path.stat().st_size / 2 ** 20, 1),
+            "write_seconds": round(written, 3),
+            "read_seconds": round(read, 4),
+            "rows_per_second": round(args.rows / read),
+        }
+
+    print(f"\n{'format':<16}{'bytes/value':>12}{'db MB':>9}{'write s':>9}{'read s':>9}{'rows/s':>11}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['value_bytes']:>12}{r['db_mb']:>9.1f}{r['write_seconds']:>9.2f}"
+              f"{r['read_seconds']:>9.3f}{r['rows_per_second']:>11}")
+    write_results("embedding_columns", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Embedding backend parity, throughput and memory
+
+Each backend runs in its own process so RSS is comparable. Parity is the
+cosine similarity of every backend's vectors with the fp32 "torch"
+reference on the same sentences; --check exits non-zero if the mean falls
+below --min-cosine. Run from the backend directory:
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --backends torch,onnx_int8 --check
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.corpus import generate_corpus
+
+REFERENCE = "torch"
+
+
+def sentences(n: int):
+    """Sentence-sized chunks from the synthetic course corpus"""
+    out = []
+    for doc in generate_corpus(max(1, n // 20) + 1, sentences=20):
+        out.extend(s.strip() + "." for s in doc["content"].split(".") if s.strip())
+    return out[:n]
+
+
+def peak_rss_mb() -> float:
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(name: str, n: int, batch_sizes, out_dir: Path):
+    from app.services.embedding_backends import create_embedder
+
+    texts = sentences(n)
+    t0 = time.perf_counter()
+    embedder = create_embedder(name)
+    load_seconds = time.perf_counter() - t0
+    embedder.encode(texts[:8])  # warm-up
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        t0 = time.perf_counter()
+        vectors = embedder.encode(texts, batch_size=batch_size)
+        throughput[batch_size] = len(texts) / (time.perf_counter() - t0)
+
+    np.save(out_dir / f"{name}.npy", vectors)
+    print(json.dumps({
+        "backend": name,
+        "load_seconds": load_seconds,
+        "dimension": int(vectors.shape[1]),
+        "throughput": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,torch_int8,onnx,onnx_int8")
+    parser.add_argument("--sentences", type=int, default=1024)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--check", action="store_true", help="Fail if parity is below --min-cosine")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    if args.worker:
+        worker(args.worker, args.sentences, batch_sizes, Path(args.out_dir))
+        return
+
+    out_dir = Path(tempfile.mkdtemp(prefix="nest-bench-embed-"))
+    backends = args.backends.split(",")
+    if REFERENCE not in backends:
+        backends.insert(0, REFERENCE)
+
+    results = {}
+    for name in backends:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_embeddings", "--worker", name,
+             "--sentences", str(args.sentences), "--batch-sizes", args.batch_sizes,
+             "--out-dir", str(out_dir)],
+            capture_output=True, text=True, env=os.environ.copy()
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            print(f"{name}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+            continue
+        results[name] = json.loads(lines[-1])
+
+    reference = np.load(out_dir / f"{REFERENCE}.npy") if REFERENCE in results else None
+    header = "".join(f"{'bs=' + str(b):>10}" for b in batch_sizes)
+    print(f"\n{'backend':<12}{'dim':>5}{'load s':>8}{'RSS MB':>8}{'cos mean':>10}{'cos min':>9}"
+          f"{header}   (sentences/s)")
+
+    failed = False
+    for name, result in results.items():
+        vectors = np.load(out_dir / f"{name}.npy")
+        cos_mean = cos_min = float("nan")
+        if reference is not None and vectors.shape == reference.shape:
+            cosines = (vectors * reference).sum(axis=1)
+            cos_mean, cos_min = float(cosines.mean()), float(cosines.min())
+            failed |= cos_mean < args.min_cosine
+        rates = "".join(f"{result['throughput'][str(b)]:>10.0f}" for b in batch_sizes)
+        print(f"{name:<12}{result['dimension']:>5}{result['load_seconds']:>8.1f}"
+              f"{result['peak_rss_mb']:>8.0f}{cos_mean:>10.4f}{cos_min:>9.4f}{rates}")
+
+    if args.check and failed:
+        print(f"\nParity check failed: mean cosine below {args.min_cosine}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+HTTP load scenarios against an in-process app
+
+The app runs in this process behind httpx's ASGI transport, on a fresh
+SQLite database and Chroma directory seeded with synthetic users, videos
+and watch history. Each scenario sends a fixed number of requests from
+concurrent clients. Run from the backend directory:
+    python -m benchmarks.bench_http
+    python -m benchmarks.bench_http --scenarios list_videos,watch_progress --requests 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.results import summarize, write_results
+
+SCENARIOS = ("login", "list_videos", "watch_progress", "chat")
+
+
+def prepare(workdir: Path, users: int, videos: int, watches: int):
+    """Point the app at a scratch database, then import and seed it"""
+    # Start from an empty database every run so results stay comparable
+    (workdir / "bench.db").unlink(missing_ok=True)
+    shutil.rmtree(workdir / "chroma", ignore_errors=True)
+    shutil.rmtree(workdir / "vectors", ignore_errors=True)
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["CHROMA_DIR"] = str(workdir / "chroma")
+    os.environ["VECTOR_DIR"] = str(workdir / "vectors")
+    os.environ.setdefault("TRANSCRIBE_WORKERS", "0")
+
+    from app.database import SessionLocal
+    from app.main import app
+    from benchmarks.fixtures import seed_database
+
+    db = SessionLocal()
+    try:
+        dataset = seed_database(db, users=users, videos=videos, watches=watches)
+    finally:
+        db.close()
+    return app, dataset
+
+
+def seed_chat_context(dataset, per_user: int = 50):
+    """Index transcripts for each user so chat has something to retrieve"""
+    from app.services.ai_service import get_ai_service
+
+    service = get_ai_service()
+    corpus = dataset["corpus"]
+    for user in dataset["users"]:
+        service.store_contexts(user["id"], [
+            {"type": "video", "id": video_id, "content": doc["content"],
+             "metadata": {"title": doc["title"], "subject": doc["subject"]}}
+            for video_id, doc in list(zip(dataset["video_ids"], corpus))[:per_user]
+        ])
+
+
+async def login(client, user):
+    response = await client.post("/api/auth/login",
+                                 data={"username": user["email"], "password": user["password"]})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def make_requests(scenario: str, dataset, tokens, rng: random.Random):
+    """Request factory for a scenario: returns a coroutine function taking the client"""
+    users = dataset["users"]
+    video_ids = dataset["video_ids"]
+    subjects = ["Mathematics", "Physics", "Computer Science", "Chemistry", None]
+
+    if scenario == "login":
+        async def request(client):
+            user = rng.choice(users)
+            return await client.post("/api/auth/login",
+                                     data={"username": user["email"], "password": user["password"]})
+    elif scenario == "list_videos":
+        async def request(client):
+            params = {"skip": rng.randint(0, 5) * 20, "limit": 20}
+            subject = rng.choice(subjects)
+            if subject:
+                params["subject"] = subject
+            return await client.get("/api/videos/", params=params)
+    elif scenario == "watch_progress":
+        async def request(client):
+            user = rng.choice(users)
+            video_id = rng.choice(video_ids)
+            return await client.post(
+                f"/api/videos/{video_id}/watch",
+                json={"video_id": video_id, "watch_duration": rng.uniform(10, 3000),
+                      "completion_percentage": rng.uniform(1, 100)},
+                headers=tokens[user["id"]]
+            )
+    elif scenario == "chat":
+        from benchmarks.corpus import generate_queries
+        queries = [q["query"] for q in generate_queries(dataset["corpus"], 200)]
+
+        async def request(client):
+            user = rng.choice(users)
+            return await client.post("/api/study/chat",
+                                     json={"message": rng.choice(queries), "max_tokens": 64},
+                                     headers=tokens[user["id"]])
+    else:
+        raise ValueError(f"Unknown scenario: {scenario}. Available: {', '.join(SCENARIOS)}")
+    return request
+
+
+async def run_scenario(client, request, total: int, concurrency: int):
+    latencies, statuses = [], Counter()
+    remaining = total
+
+    async def client_loop():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            try:
+                response = await request(client)
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies)
+    result["rps"] = round(len(latencies) / elapsed, 1)
+    result["errors"] = sum(n for status, n in statuses.items() if not str(status).startswith("2"))
+    result["statuses"] = {str(status): n for status, n in statuses.items()}
+    return result
+
+
+async def run(args):
+    import httpx
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="nest-bench-http-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    app, dataset = prepare(workdir, args.users, args.videos, args.watches)
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    if "chat" in scenarios:
+        seed_chat_context(dataset)
+
+    rng = random.Random(args.seed)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        tokens = {user["id"]: await login(client, user) for user in dataset["users"]}
+        print(f"{'scenario':<16}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for scenario in scenarios:
+            request = make_requests(scenario, dataset, tokens, rng)
+            # Warm-up requests load models and fill connection pools
+            await run_scenario(client, request, min(20, args.requests), 1)
+            result = await run_scenario(client, request, args.requests, args.concurrency)
+            results[scenario] = result
+            print(f"{scenario:<16}{result['rps']:>8.1f}{result['p50_ms']:>10.1f}"
+                  f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--watches", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="Scratch directory for the database and uploads")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/http-<time>.json)")
+    args = parser.parse_args()
+
+    # The app is imported after chdir into the scratch directory
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    output = str(Path(args.output).resolve()) if args.output else None
+    results = asyncio.run(run(args))
+    write_results("http", vars(args), results, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Micro-benchmarks for the backend hot paths
+
+Sections: document extraction per format and size, embedding throughput
+and query latency, vector query and hybrid search latency, and Whisper
+real-time factor on synthetic audio. Results go to benchmarks/results/
+as JSON. Run from the backend directory:
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --sections extraction,embedding --repeat 10
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.fixtures import generate_audio, generate_documents
+from benchmarks.results import summarize, write_results
+
+SECTIONS = ("extraction", "embedding", "vector_query", "transcription")
+BENCH_USER_ID = 1
+
+
+def timed(fn, repeat: int):
+    """Run fn repeat times after one warm-up call; returns (last result, seconds per call)"""
+    result = fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return result, samples
+
+
+def bench_extraction(workdir: Path, repeat: int):
+    from app.services.document_service import DocumentService
+
+    service = DocumentService()
+    results = {}
+    for doc in generate_documents(workdir / "documents"):
+        text, samples = timed(lambda: service.extract_text(str(doc["path"]), doc["format"]), repeat)
+        summary = summarize(samples)
+        summary["pages"] = doc["pages"]
+        summary["chars"] = len(text)
+        summary["pages_per_second"] = round(doc["pages"] / (summary["mean_ms"] / 1000), 1) \
+            if summary["mean_ms"] else None
+        results[f"{doc['format']}.{doc['size']}"] = summary
+        print(f"  {doc['format']:<5}{doc['size']:<8}{summary['p50_ms']:>10.1f} ms  {len(text):>9} chars")
+    return results
+
+
+def bench_embedding(repeat: int, batch_sizes=(1, 32, 128)):
+    from app.services.embedding_backends import EMBEDDING_BACKEND, create_embedder
+
+    t0 = time.perf_counter()
+    embedder = create_embedder()
+    results = {"backend": EMBEDDING_BACKEND, "load_seconds": round(time.perf_counter() - t0, 3)}
+
+    texts = [doc["content"][:400] for doc in generate_corpus(256, sentences=8)]
+    for batch_size in batch_sizes:
+        _, samples = timed(lambda: embedder.encode(texts, batch_size=batch_size), max(1, repeat // 5))
+        per_second = len(texts) / (sum(samples) / len(samples))
+        results[f"batch_{batch_size}"] = {"texts_per_second": round(per_second, 1)}
+        print(f"  batch {batch_size:<6}{per_second:>10.1f} texts/s")
+
+    queries = [q["query"] for q in generate_queries(generate_corpus(100), 50)]
+    samples = []
+    for query in queries[:repeat * 5]:
+        t0 = time.perf_counter()
+        embedder.encode(query)
+        samples.append(time.perf_counter() - t0)
+    results["single_query"] = summarize(samples)
+    print(f"  single query p50 {results['single_query']['p50_ms']:.2f} ms")
+    return results
+
+
+def bench_vector_query(workdir: Path, n_docs: int, n_queries: int):
+    os.environ["CHROMA_DIR"] = str(workdir / "chroma")
+    os.environ["VECTOR_DIR"] = str(workdir / "vectors")
+    from app.services.ai_service import AIService
+
+    service = AIService()
+    docs = generate_corpus(n_docs)
+    queries = [q["query"] for q in generate_queries(docs, n_queries)]
+
+    t0 = time.perf_counter()
+    service.store_contexts(BENCH_USER_ID, [
+        {"type": "video", "id": doc["id"], "content": doc["content"],
+         "metadata": {"title": doc["title"], "subject": doc["subject"]}}
+        for doc in docs
+    ])
+    results = {"docs": n_docs, "index_seconds": round(time.perf_counter() - t0, 3)}
+
+    embeddings = [service.embed_query(q) for q in queries]
+
+    dense, hybrid = [], []
+    for query, embedding in zip(queries, embeddings):
+        t0 = time.perf_counter()
+        service.store.query(BENCH_USER_ID, embedding, 5)
+        dense.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        service.search_relevant_context(BENCH_USER_ID, query, top_k=5, query_embedding=embedding)
+        hybrid.append(time.perf_counter() - t0)
+
+    results["vector_store"] = service.store.name
+    results["vector_query"] = summarize(dense)
+    results["hybrid_search"] = summarize(hybrid)
+    print(f"  {service.store.name} query p50 {results['vector_query']['p50_ms']:.2f} ms, "
+          f"hybrid search p50 {results['hybrid_search']['p50_ms']:.2f} ms over {n_docs} docs")
+    return results
+
+
+def bench_transcription(workdir: Path, model_size: str, durations):
+    from app.services.transcription_backends import WHISPER_BACKEND, create_backend
+
+    clips = generate_audio(workdir / "audio", durations=durations)
+    t0 = time.perf_counter()
+    backend = create_backend(model_size)
+    results = {"backend": WHISPER_BACKEND, "model": model_size,
+               "load_seconds": round(time.perf_counter() - t0, 3),
+               "audio": clips[0]["kind"]}
+
+    backend.transcribe(str(clips[0]["path"]))  # warm-up
+    busy = total = 0.0
+    for clip in clips:
+        t0 = time.perf_counter()
+        backend.transcribe(str(clip["path"]))
+        elapsed = time.perf_counter() - t0
+        busy += elapsed
+        total += clip["seconds"]
+        results[f"rtf_{int(clip['seconds'])}s"] = round(elapsed / clip["seconds"], 4)
+    results["rtf"] = round(busy / total, 4)
+    print(f"  {model_size} ({WHISPER_BACKEND}) RTF {results['rtf']:.3f} on {results['audio']} audio")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default=",".join(SECTIONS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--docs", type=int, default=500, help="Documents indexed for vector_query")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--audio-seconds", default="10,30")
+    parser.add_argument("--workdir", help="Keep generated fixtures here between runs")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/micro-<time>.json)")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="nest-bench-"))
+    sections = [s for s in args.sections.split(",") if s]
+    results = {}
+    for section in sections:
+        print(f"\n[{section}]")
+        try:
+            if section == "extraction":
+                results[section] = bench_extraction(workdir, args.repeat)
+            elif section == "embedding":
+                results[section] = bench_embedding(args.repeat)
+            elif section == "vector_query":
+                results[section] = bench_vector_query(workdir, args.docs, args.queries)
+            elif section == "transcription":
+                durations = [int(s) for s in args.audio_seconds.split(",")]
+                results[section] = bench_transcription(workdir, args.whisper_model, durations)
+            else:
+                print(f"  unknown section, choose from {', '.join(SECTIONS)}")
+        except Exception as e:
+            # A missing model or ffmpeg should not lose the other sections
+            print(f"  skipped: {e}")
+            results[section] = {"error": str(e)}
+
+    write_results("micro", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
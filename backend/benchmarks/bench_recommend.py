@@ -0,0 +1,217 @@
+"""
+Recommendation benchmark: build time and serving latency at 1M watch rows
+
+Builds a scratch database of synthetic users, videos and watch history
+(1M rows by default). Viewers favour one subject and popular videos within
+it, so co-watch neighbors have real structure. Each video gets a
+synthetic embedding near its subject's centroid instead of a vector store
+entry. The benchmark measures the full build and its stages, then the
+latency of serving related videos and user picks from the stored lists,
+the latency of refreshing one user after a new watch, and the
+on-the-fly co-watch query that precomputing replaces. Run from the
+backend directory:
+    python -m benchmarks.bench_recommend
+    python -m benchmarks.bench_recommend --watches 200000 --users 5000 --videos 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.results import summarize, write_results
+
+BATCH = 50000
+SUBJECTS = 12
+DIMENSION = 384
+
+
+def prepare(workdir: Path):
+    (workdir / "recommend.db").unlink(missing_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'recommend.db'}"
+
+    from app.database import Base, engine
+    import app.models  # registers the tables on Base
+
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def generate_watches(users: int, videos: int, watches: int, seed: int):
+    """(user_index, video_index, completion) arrays of unique pairs with subject affinity"""
+    rng = np.random.default_rng(seed)
+    subjects = rng.integers(SUBJECTS, size=videos)
+    by_subject = np.argsort(subjects, kind="stable")  # video indexes grouped by subject
+    sizes = np.bincount(subjects, minlength=SUBJECTS)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    favourite = rng.choice(np.flatnonzero(sizes), size=users)
+    activity = rng.pareto(1.5, size=users) + 1  # a few heavy viewers, many light ones
+    activity /= activity.sum()
+
+    keys = np.empty(0, dtype=np.int64)
+    while len(keys) < watches:
+        n = (watches - len(keys)) * 2
+        user = rng.choice(users, size=n, p=activity)
+        rank = rng.zipf(1.3, size=n) - 1  # popularity rank within the pool, folded into range
+        subject = favourite[user]
+        own = by_subject[offsets[subject] + rank % sizes[subject]]
+        video = np.where(rng.random(n) < 0.8, own, rank % videos)
+        keys = np.unique(np.concatenate([keys, user.astype(np.int64) * videos + video]))
+    keys = rng.permutation(keys)[:watches]
+    completion = rng.integers(5, 101, size=len(keys)).astype(float)
+    return keys // videos, keys % videos, completion, subjects
+
+
+def synthetic_embeddings(subjects: np.ndarray, seed: int):
+    rng = np.random.default_rng(seed + 1)
+    centroids = rng.normal(size=(SUBJECTS, DIMENSION))
+    vectors = centroids[subjects] + rng.normal(scale=1.5, size=(len(subjects), DIMENSION))
+    return vectors.astype(np.float32)
+
+
+def seed(engine, users: int, videos: int, watches: int, seed_value: int):
+    from app.models import User, Video, WatchHistory
+
+    user_index, video_index, completion, subjects = generate_watches(users, videos, watches, seed_value)
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"email": f"rec{i}@example.com", "hashed_password": "-"}
+                                               for i in range(users)])
+        conn.execute(Video.__table__.insert(), [
+            {"title": f"Lecture {i}", "file_path": f"uploads/videos/rec_{i}.mp4",
+             "subject": f"Subject {subjects[i]}", "uploader_id": 1, "views_count": 0}
+            for i in range(videos)
+        ])
+    for offset in range(0, len(user_index), BATCH):
+        stop = offset + BATCH
+        with engine.begin() as conn:
+            conn.execute(WatchHistory.__table__.insert(), [
+                {"user_id": int(u) + 1, "video_id": int(v) + 1, "watch_duration": 60.0,
+                 "completion_percentage": float(c)}
+                for u, v, c in zip(user_index[offset:stop], video_index[offset:stop], completion[offset:stop])
+            ])
+        print(f"  inserted {min(stop, len(user_index))} watch rows", end="\r")
+    print()
+    vectors = synthetic_embeddings(subjects, seed_value)
+    embeddings = {i + 1: vectors[i] for i in range(videos)}
+    return time.perf_counter() - t0, embeddings
+
+
+def bench_serving(service, n: int, users: int, videos: int, seed_value: int):
+    from app.database import SessionLocal
+    from app.models import Video
+
+    rng = np.random.default_rng(seed_value + 2)
+    db = SessionLocal()
+    related, picks = [], []
+    try:
+        for video_id in rng.integers(1, videos + 1, size=n):
+            t0 = time.perf_counter()
+            items = service.related(db, int(video_id), 10)
+            db.query(Video).filter(Video.id.in_([item[0] for item in items])).all()
+            related.append(time.perf_counter() - t0)
+        for user_id in rng.integers(1, users + 1, size=n):
+            t0 = time.perf_counter()
+            items = service.for_user(db, int(user_id), 20)
+            db.query(Video).filter(Video.id.in_([item[0] for item in items])).all()
+            picks.append(time.perf_counter() - t0)
+    finally:
+        db.close()
+    return summarize(related), summarize(picks)
+
+
+def bench_refresh(service, n: int, users: int, videos: int, seed_value: int):
+    """A user starts a video they have not watched; their picks are re-scored"""
+    from app.database import SessionLocal
+    from app.models import WatchHistory
+
+    rng = np.random.default_rng(seed_value + 3)
+    db = SessionLocal()
+    samples = []
+    try:
+        for user_id in rng.integers(1, users + 1, size=n):
+            watched = {v for (v,) in db.query(WatchHistory.video_id).filter(WatchHistory.user_id == int(user_id))}
+            video_id = next(int(v) for v in rng.integers(1, videos + 1, size=100) if int(v) not in watched)
+            db.add(WatchHistory(user_id=int(user_id), video_id=video_id, completion_percentage=10.0))
+            db.commit()
+            t0 = time.perf_counter()
+            service.refresh_user(int(user_id), db)
+            samples.append(time.perf_counter() - t0)
+    finally:
+        db.close()
+    return summarize(samples)
+
+
+def bench_live_query(engine, n: int, videos: int, seed_value: int):
+    """Co-watch neighbors computed per request with a self-join, for comparison"""
+    from sqlalchemy import text
+
+    rng = np.random.default_rng(seed_value + 4)
+    samples = []
+    with engine.connect() as conn:
+        for video_id in rng.integers(1, videos + 1, size=n):
+            t0 = time.perf_counter()
+            conn.execute(text(
+                "SELECT b.video_id, count(*) AS shared FROM watch_history a "
+                "JOIN watch_history b ON a.user_id = b.user_id AND b.video_id != a.video_id "
+                "WHERE a.video_id = :id GROUP BY b.video_id ORDER BY shared DESC LIMIT 10"
+            ), {"id": int(video_id)}).all()
+            samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--watches", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=25000)
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=2000, help="Serving requests timed per kind")
+    parser.add_argument("--refreshes", type=int, default=500)
+    parser.add_argument("--live-queries", type=int, default=20, help="Self-join queries to time (they are slow)")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--workdir", help="Scratch directory for the database")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/recommend-<time>.json)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="nest-bench-recommend-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    engine = prepare(workdir)
+
+    from app.database import SessionLocal
+    from app.services.recommendation_service import recommendation_service
+
+    print(f"[seed] {args.watches} watch rows, {args.users} users, {args.videos} videos")
+    seed_seconds, embeddings = seed(engine, args.users, args.videos, args.watches, args.seed)
+    results = {"watches": args.watches, "users": args.users, "videos": args.videos,
+               "seed_seconds": round(seed_seconds, 1)}
+
+    print("[build]")
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        build = recommendation_service.build(db, embeddings=embeddings)
+        results["build_seconds"] = round(time.perf_counter() - t0, 3)
+    finally:
+        db.close()
+    results["build"] = build
+    print(f"  {results['build_seconds']} s total, stages {build['seconds']}, {build['lists']} lists")
+
+    results["related"], results["user_picks"] = bench_serving(
+        recommendation_service, args.requests, args.users, args.videos, args.seed)
+    results["incremental_refresh"] = bench_refresh(
+        recommendation_service, args.refreshes, args.users, args.videos, args.seed)
+    results["live_cowatch_query"] = bench_live_query(engine, args.live_queries, args.videos, args.seed)
+
+    for name in ("related", "user_picks", "incremental_refresh", "live_cowatch_query"):
+        print(f"  {name:<22}p50 {results[name]['p50_ms']:>9.2f} ms   p95 {results[name]['p95_ms']:>9.2f} ms")
+    write_results("recommend", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Recall@k and latency of dense, BM25 and hybrid retrieval
+
+Run from the backend directory:
+    python -m benchmarks.bench_retrieval --docs 500 --queries 200
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus, generate_queries
+
+BENCH_USER_ID = 1
+
+
+def run(n_docs: int, n_queries: int, ks=(1, 3, 5)):
+    os.environ["CHROMA_DIR"] = tempfile.mkdtemp(prefix="nest-bench-chroma-")
+    os.environ["VECTOR_DIR"] = tempfile.mkdtemp(prefix="nest-bench-vectors-")
+
+    from app.services import ai_service as ai_module
+    from app.services.bm25_index import bm25_index
+
+    service = ai_module.AIService()
+    docs = generate_corpus(n_docs)
+    queries = generate_queries(docs, n_queries)
+
+    start = time.perf_counter()
+    for doc in docs:
+        service.store_context(BENCH_USER_ID, "video", doc["id"], doc["content"],
+                              {"title": doc["title"], "subject": doc["subject"]})
+    print(f"Ingested {len(docs)} docs in {time.perf_counter() - start:.1f}s")
+
+    def dense(query, k):
+        embedding = service.embedder.encode(query)
+        return [doc_id for doc_id, _ in service.store.query(BENCH_USER_ID, embedding, k)]
+
+    def keyword(query, k):
+        return [doc_id for doc_id, _ in bm25_index.search(BENCH_USER_ID, query, k)]
+
+    def hybrid(query, k):
+        return [
+            f"{ctx['metadata']['type']}_{ctx['metadata']['id']}"
+            for ctx in service.search_relevant_context(BENCH_USER_ID, query, top_k=k)
+        ]
+
+    max_k = max(ks)
+    print(f"\n{'retriever':<10}" + "".join(f"{'R@' + str(k):>8}" for k in ks)
+          + f"{'p50 ms':>10}{'p95 ms':>10}")
+    for name, retrieve in (("dense", dense), ("bm25", keyword), ("hybrid", hybrid)):
+        hits = {k: 0 for k in ks}
+        latencies = []
+        for q in queries:
+            t0 = time.perf_counter()
+            ranked = retrieve(q["query"], max_k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            for k in ks:
+                hits[k] += q["relevant"] in ranked[:k]
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{name:<10}" + "".join(f"{hits[k] / len(queries):>8.3f}" for k in ks)
+              + f"{statistics.median(latencies):>10.2f}{p95:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run(args.docs, args.queries)
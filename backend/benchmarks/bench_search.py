@@ -0,0 +1,223 @@
+"""
+Full-text search benchmark over a large transcript corpus
+
+Builds a scratch database with N synthetic lecture transcripts (100k by
+default). Rows are inserted through the normal videos table, so the
+triggers index them as they arrive. Each transcript also gets
+Whisper-like segment timings, one segment per sentence. The benchmark
+measures indexing throughput, ranked search latency for first and deeper
+pages, timestamped moment search, segment storage per hour of audio, and
+the cost of re-indexing single updated transcripts. For comparison it
+also times the LIKE '%term%' scan that search replaces. Run from the
+backend directory:
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --videos 20000 --queries 200
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.results import summarize, write_results
+
+BATCH = 5000
+WORDS_PER_SECOND = 2.5  # speaking rate used for synthetic segment timings
+
+
+def corpus_batches(total: int, sentences: int, seed: int):
+    """Transcripts in batches, with course codes unique across the whole corpus"""
+    for offset in range(0, total, BATCH):
+        docs = generate_corpus(min(BATCH, total - offset), sentences=sentences, seed=seed + offset)
+        for doc in docs:
+            doc["id"] += offset
+            code = doc["code"].rsplit("-", 1)[0] + f"-{100 + doc['id']}"
+            doc["content"] = doc["content"].replace(f"Welcome to {doc['code']}.", f"Welcome to {code}.")
+            doc["title"] = doc["title"].replace(doc["code"], code).rsplit(" ", 1)[0] + f" {doc['id']}"
+            doc["code"] = code
+        yield docs
+
+
+def synthetic_segments(transcript: str):
+    """One segment per sentence, timed at WORDS_PER_SECOND"""
+    segments, clock = [], 0.0
+    for sentence in transcript.split(". "):
+        seconds = max(1.0, len(sentence.split()) / WORDS_PER_SECOND)
+        segments.append({"start": clock, "end": clock + seconds, "text": sentence})
+        clock += seconds
+    return segments
+
+
+def prepare(workdir: Path):
+    (workdir / "search.db").unlink(missing_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'search.db'}"
+
+    from app.database import Base, engine
+    from app.models import User
+    from app.services.search_service import search_service
+
+    Base.metadata.create_all(bind=engine)
+    search_service.ensure_index()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"email": "search@example.com", "hashed_password": "-"}])
+    return engine, search_service
+
+
+def index_corpus(engine, total: int, sentences: int, seed: int):
+    """Insert videos and segment timings batch by batch
+
+    Returns (seconds, sample docs for queries, segment storage stats).
+    """
+    from app.models import TranscriptSegments, Video
+    from app.services.transcript_segments import pack_segments
+
+    elapsed, sample = 0.0, []
+    storage = {"segments": 0, "packed_bytes": 0, "json_bytes": 0, "audio_seconds": 0.0}
+    rng = random.Random(seed)
+    for docs in corpus_batches(total, sentences, seed):
+        rows = [{"title": doc["title"], "description": f"Lecture by Professor {doc['lecturer']}",
+                 "file_path": f"uploads/videos/search_{doc['id']}.mp4", "subject": doc["subject"],
+                 "transcript": doc["content"], "transcript_status": "completed", "uploader_id": 1,
+                 "views_count": 0} for doc in docs]
+        timings = []
+        for doc in docs:
+            segments = synthetic_segments(doc["content"])
+            packed = pack_segments(doc["content"], segments)
+            timings.append({"video_id": doc["id"] + 1, **packed})
+            storage["segments"] += packed["count"]
+            storage["packed_bytes"] += len(packed["offsets"]) + len(packed["starts"]) + len(packed["ends"])
+            storage["json_bytes"] += len(json.dumps(segments))
+            storage["audio_seconds"] += segments[-1]["end"]
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(Video.__table__.insert(), rows)
+            conn.execute(TranscriptSegments.__table__.insert(), timings)
+        elapsed += time.perf_counter() - t0
+        sample.extend(rng.sample(docs, min(len(docs), 50)))
+        print(f"  indexed {docs[-1]['id'] + 1} transcripts", end="\r")
+    print()
+    hours = storage["audio_seconds"] / 3600
+    stats = {
+        "audio_hours": round(hours, 1),
+        "segments_per_hour": round(storage["segments"] / hours, 1),
+        "packed_kb_per_hour": round(storage["packed_bytes"] / 1024 / hours, 2),
+        "json_with_text_kb_per_hour": round(storage["json_bytes"] / 1024 / hours, 2),
+    }
+    return elapsed, sample, stats
+
+
+def bench_queries(service, queries, skip: int):
+    samples, hits = [], 0
+    for query in queries:
+        t0 = time.perf_counter()
+        result = service.search(query, user_id=1, skip=skip, limit=20)
+        samples.append(time.perf_counter() - t0)
+        hits += bool(result["results"])
+    summary = summarize(samples)
+    summary["hit_rate"] = round(hits / len(queries), 4) if queries else 0.0
+    return summary
+
+
+def bench_moments(queries):
+    from app.database import SessionLocal
+    from app.services.transcript_segments import find_moments
+
+    samples, hits = [], 0
+    db = SessionLocal()
+    try:
+        for query in queries:
+            t0 = time.perf_counter()
+            moments = find_moments(db, query, user_id=1, limit=10)
+            samples.append(time.perf_counter() - t0)
+            hits += bool(moments)
+    finally:
+        db.close()
+    summary = summarize(samples)
+    summary["hit_rate"] = round(hits / len(queries), 4) if queries else 0.0
+    return summary
+
+
+def bench_like(engine, terms):
+    from sqlalchemy import text
+
+    samples = []
+    with engine.connect() as conn:
+        for term in terms:
+            t0 = time.perf_counter()
+            conn.execute(text("SELECT count(*) FROM videos WHERE transcript LIKE :pattern"),
+                         {"pattern": f"%{term}%"}).scalar()
+            conn.execute(text("SELECT id FROM videos WHERE transcript LIKE :pattern LIMIT 20"),
+                         {"pattern": f"%{term}%"}).all()
+            samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def bench_updates(engine, total: int, n: int, seed: int):
+    """Re-index single transcripts the way a transcription upgrade does"""
+    from sqlalchemy import text
+
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        video_id = rng.randint(1, total)
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE videos SET transcript = transcript || ' Revised with the large model.' "
+                              "WHERE id = :id"), {"id": video_id})
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=100000)
+    parser.add_argument("--sentences", type=int, default=30, help="Sentences per transcript")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--like-queries", type=int, default=20, help="LIKE scans to time (they are slow)")
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workdir", help="Scratch directory for the database")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/search-<time>.json)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="nest-bench-search-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    engine, service = prepare(workdir)
+
+    print(f"[index] {args.videos} transcripts via {service.name}")
+    seconds, sample, segment_storage = index_corpus(engine, args.videos, args.sentences, args.seed)
+    results = {"backend": service.name, "videos": args.videos,
+               "index_seconds": round(seconds, 3),
+               "index_docs_per_second": round(args.videos / seconds, 1) if seconds else None,
+               "database_mb": round((workdir / "search.db").stat().st_size / 2 ** 20, 1)}
+    results["segment_storage"] = segment_storage
+    print(f"  {results['index_docs_per_second']} docs/s, database {results['database_mb']} MB")
+    print(f"  segment timings {segment_storage['packed_kb_per_hour']} KB per hour of audio "
+          f"(JSON with text: {segment_storage['json_with_text_kb_per_hour']} KB)")
+
+    rng = random.Random(args.seed)
+    rare = [q["query"] for q in generate_queries(sample, args.queries, seed=args.seed)]
+    common = [rng.choice(["eigenvalues", "momentum", "recursion", "catalyst", "entropy matrix"])
+              for _ in range(args.queries)]
+    results["rare_terms"] = bench_queries(service, rare, 0)
+    results["common_terms"] = bench_queries(service, common, 0)
+    results["common_terms_page_5"] = bench_queries(service, common, 80)
+    formulas = [doc["formula"] for doc in sample[:args.queries]]
+    results["moments"] = bench_moments(formulas)
+    results["like_scan"] = bench_like(engine, [q.split()[0] for q in common[:args.like_queries]])
+    results["update"] = bench_updates(engine, args.videos, args.updates, args.seed)
+
+    for name in ("rare_terms", "common_terms", "common_terms_page_5", "moments", "like_scan", "update"):
+        print(f"  {name:<22}p50 {results[name]['p50_ms']:>9.2f} ms   p95 {results[name]['p95_ms']:>9.2f} ms")
+    write_results("search", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Multi-process serving benchmark: throughput and memory at 1, 4 and 8 API workers
+
+Seeds a scratch database and Chroma directory once, as bench_http does.
+Then, for each worker count, starts serve.py as a subprocess on a free
+port and drives it over real HTTP from concurrent clients. After each
+load phase it reads every process in the server's tree from /proc and
+records RSS and PSS by role. PSS splits shared pages between the
+processes that map them, so summed PSS is the real footprint. With
+--compare-standalone each count also runs with --no-model-server, where
+every worker loads its own models. Transcription workers are not started.
+Linux only. Run from the backend directory:
+    python -m benchmarks.bench_serving
+    python -m benchmarks.bench_serving --workers 1,4,8 --scenarios login,list_videos,chat --compare-standalone
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+from benchmarks.bench_http import login, make_requests, run_scenario
+from benchmarks.results import write_results
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SCENARIOS = ("login", "list_videos", "chat")
+ROLES = {"nest-api": "api", "nest-models": "models", "nest-whisper": "transcribe"}
+
+
+def _seed(workdir: str, users: int, videos: int, watches: int):
+    """Runs in a child process so the benchmark itself holds no models or database handles"""
+    from benchmarks.bench_http import prepare, seed_chat_context
+
+    _, dataset = prepare(Path(workdir), users, videos, watches)
+    seed_chat_context(dataset)
+    (Path(workdir) / "dataset.json").write_text(json.dumps(dataset))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(root: int):
+    """root and all of its descendants"""
+    children = defaultdict(list)
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name is in parentheses and may contain spaces
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children[ppid].append(int(entry.name))
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def _kb(path: Path, field: str) -> float:
+    for line in path.read_text().splitlines():
+        if line.startswith(field + ":"):
+            return float(line.split()[1])
+    return 0.0
+
+
+def measure_memory(root: int):
+    """RSS and PSS in MB, per role and in total, for a server's process tree"""
+    roles = defaultdict(lambda: {"processes": 0, "rss_mb": 0.0, "pss_mb": 0.0})
+    for pid in process_tree(root):
+        proc = Path(f"/proc/{pid}")
+        try:
+            name = (proc / "comm").read_text().strip()
+            rss = _kb(proc / "status", "VmRSS") / 1024
+            pss = _kb(proc / "smaps_rollup", "Pss") / 1024
+        except OSError:
+            continue  # exited meanwhile
+        role = "supervisor" if pid == root else next(
+            (r for prefix, r in ROLES.items() if name.startswith(prefix)), "other")
+        entry = roles[role]
+        entry["processes"] += 1
+        entry["rss_mb"] += rss
+        entry["pss_mb"] += pss
+    result = {role: {k: round(v, 1) for k, v in entry.items()} for role, entry in roles.items()}
+    api = result.get("api", {"processes": 0, "rss_mb": 0.0})
+    return {
+        "roles": result,
+        "rss_per_api_worker_mb": round(api["rss_mb"] / max(api["processes"], 1), 1),
+        "total_rss_mb": round(sum(e["rss_mb"] for e in result.values()), 1),
+        "total_pss_mb": round(sum(e["pss_mb"] for e in result.values()), 1),
+    }
+
+
+class ServerProcess:
+    """serve.py in a subprocess, with its output drained so it never blocks"""
+
+    def __init__(self, workdir: Path, workers: int, standalone: bool, start_timeout: float):
+        self.port = free_port()
+        env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR), JOB_BROKER="database",
+                   DATABASE_URL=f"sqlite:///{workdir / 'bench.db'}", CHROMA_DIR=str(workdir / "chroma"),
+                   VECTOR_DIR=str(workdir / "vectors"), MODEL_SERVER_ADDRESS="")
+        command = [sys.executable, str(BACKEND_DIR / "serve.py"), "--workers", str(workers),
+                   "--transcribe-workers", "0", "--host", "127.0.0.1", "--port", str(self.port),
+                   "--no-access-log", "--log-level", "warning"]
+        if standalone:
+            command.append("--no-model-server")
+        self.process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, text=True)
+        self.output = deque(maxlen=50)
+        self._ready = threading.Event()
+        threading.Thread(target=self._drain, daemon=True).start()
+        if not self._ready.wait(start_timeout):
+            self.stop()
+            raise RuntimeError("serve.py did not start:\n" + "\n".join(self.output))
+
+    def _drain(self):
+        for line in self.process.stdout:
+            self.output.append(line.rstrip())
+            if line.startswith("Serving on"):
+                self._ready.set()
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(60)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+async def drive(port: int, dataset, scenarios, args):
+    import httpx
+
+    rng = random.Random(args.seed)
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        tokens = {user["id"]: await login(client, user) for user in dataset["users"]}
+        for scenario in scenarios:
+            request = make_requests(scenario, dataset, tokens, rng)
+            await run_scenario(client, request, min(50, args.requests), args.concurrency)  # warm-up
+            results[scenario] = await run_scenario(client, request, args.requests, args.concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,4,8", help="Comma-separated API worker counts")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--compare-standalone", action="store_true",
+                        help="Also run each count with models loaded in every worker")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--watches", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start-timeout", type=float, default=600)
+    parser.add_argument("--workdir", help="Scratch directory for the database and uploads")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/serving-<time>.json)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    output = str(Path(args.output).resolve()) if args.output else None
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="nest-bench-serving-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    print(f"[seed] {workdir}")
+    seeder = multiprocessing.get_context("spawn").Process(
+        target=_seed, args=(str(workdir), args.users, args.videos, args.watches))
+    seeder.start()
+    seeder.join()
+    if seeder.exitcode != 0:
+        raise SystemExit("Seeding failed")
+    dataset = json.loads((workdir / "dataset.json").read_text())
+    scenarios = [s for s in args.scenarios.split(",") if s]
+
+    runs = []
+    modes = ["model_server", "standalone"] if args.compare_standalone else ["model_server"]
+    for mode in modes:
+        for workers in [int(n) for n in args.workers.split(",") if n]:
+            print(f"\n[{mode}] {workers} API workers")
+            started = time.perf_counter()
+            server = ServerProcess(workdir, workers, mode == "standalone", args.start_timeout)
+            startup = time.perf_counter() - started
+            try:
+                results = asyncio.run(drive(server.port, dataset, scenarios, args))
+                memory = measure_memory(server.process.pid)
+            finally:
+                server.stop()
+            runs.append({"mode": mode, "workers": workers, "startup_seconds": round(startup, 1),
+                         "scenarios": results, "memory": memory})
+            for scenario, result in results.items():
+                print(f"  {scenario:<14}{result['rps']:>9.1f} rps  p50 {result['p50_ms']:>8.1f} ms  "
+                      f"p95 {result['p95_ms']:>8.1f} ms  errors {result['errors']}")
+            print(f"  memory: {memory['rss_per_api_worker_mb']} MB RSS per API worker, "
+                  f"{memory['total_rss_mb']} MB RSS / {memory['total_pss_mb']} MB PSS in total")
+            for role, entry in sorted(memory["roles"].items()):
+                print(f"    {role:<12}{entry['processes']:>3} processes  {entry['rss_mb']:>9.1f} MB RSS  "
+                      f"{entry['pss_mb']:>9.1f} MB PSS")
+
+    print(f"\n{'mode':<14}{'workers':>8}" + "".join(f"{s + ' rps':>16}" for s in scenarios)
+          + f"{'RSS/worker':>12}{'total PSS':>12}")
+    for run in runs:
+        print(f"{run['mode']:<14}{run['workers']:>8}"
+              + "".join(f"{run['scenarios'][s]['rps']:>16.1f}" for s in scenarios)
+              + f"{run['memory']['rss_per_api_worker_mb']:>12.1f}{run['memory']['total_pss_mb']:>12.1f}")
+    write_results("serving", vars(args), {"runs": runs}, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Real-time factor of each Whisper backend on a fixed audio set
+
+RTF = processing seconds / audio seconds (lower is faster). Each backend
+runs in a fresh process, so "model MB" (RSS added by loading the model) and
+"RSS MB" (added by loading and transcribing) belong to that backend alone.
+Run from the backend directory:
+    python -m benchmarks.bench_transcription --audio-dir /data/bench-audio
+    python -m benchmarks.bench_transcription --backends whisper,whisper_int8 --model base
+
+Without --audio-dir a few synthetic clips are generated with ffmpeg; they
+measure speed only, not accuracy.
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.transcription_backends import BACKENDS, create_backend, configure_threads
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".m4a", ".ogg"}
+
+
+def synthetic_audio(directory: Path, durations=(10, 30, 60)):
+    """Tone-and-noise clips at 16 kHz mono"""
+    paths = []
+    for seconds in durations:
+        path = directory / f"synthetic_{seconds}s.wav"
+        subprocess.run(
+            ["ffmpeg", "-f", "lavfi", "-i",
+             f"sine=frequency=220:duration={seconds},volume=0.3",
+             "-f", "lavfi", "-i", f"anoisesrc=duration={seconds}:amplitude=0.05",
+             "-filter_complex", "amix=inputs=2", "-ac", "1", "-ar", "16000", "-y", str(path)],
+            check=True, capture_output=True
+        )
+        paths.append(path)
+    return paths
+
+
+def audio_duration(path: Path) -> float:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", str(path)],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip())
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _measure(name: str, model_size: str, threads: int, audio_files, durations):
+    """Runs in a fresh process per backend, so its memory is not mixed with another's"""
+    baseline = rss_mb()
+    configure_threads(threads)
+    t0 = time.perf_counter()
+    backend = create_backend(model_size, name)
+    load_seconds = time.perf_counter() - t0
+    loaded = rss_mb()
+
+    # Warm-up so one-off kernel initialisation is not counted
+    backend.transcribe(str(audio_files[0]))
+
+    per_file, busy = [], 0.0
+    for path, duration in zip(audio_files, durations):
+        t0 = time.perf_counter()
+        result = backend.transcribe(str(path))
+        elapsed = time.perf_counter() - t0
+        busy += elapsed
+        per_file.append(elapsed / duration)
+        assert set(result) == {"text", "language", "segments"}
+    return {
+        "load_seconds": load_seconds,
+        "rtf": busy / sum(durations),
+        "per_file": per_file,
+        "model_mb": loaded - baseline,
+        "rss_mb": rss_mb() - baseline,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run(audio_files, backends, model_size, threads):
+    durations = [audio_duration(path) for path in audio_files]
+    total_audio = sum(durations)
+    print(f"{len(audio_files)} files, {total_audio:.0f}s of audio, model={model_size}, "
+          f"threads={threads or 'default'}\n")
+    print(f"{'backend':<16}{'load s':>8}{'RTF':>8}{'model MB':>10}{'RSS MB':>9}{'peak MB':>9}  per-file RTF")
+
+    ctx = multiprocessing.get_context("spawn")
+    for name in backends:
+        try:
+            with ctx.Pool(1) as pool:
+                r = pool.apply(_measure, (name, model_size, threads, audio_files, durations))
+        except Exception as e:
+            print(f"{name:<16} skipped: {e}")
+            continue
+        print(f"{name:<16}{r['load_seconds']:>8.1f}{r['rtf']:>8.3f}{r['model_mb']:>10.0f}"
+              f"{r['rss_mb']:>9.0f}{r['peak_rss_mb']:>9.0f}  "
+              + " ".join(f"{rtf:.3f}" for rtf in r["per_file"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio-dir", help="Directory with the fixed audio set")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if args.audio_dir:
+        files = sorted(p for p in Path(args.audio_dir).iterdir()
+                       if p.suffix.lower() in AUDIO_EXTENSIONS)
+    else:
+        files = synthetic_audio(Path(tempfile.mkdtemp(prefix="nest-bench-audio-")))
+    run(files, args.backends.split(","), args.model, args.threads)
@@ -0,0 +1,177 @@
+"""
+Vector store benchmark: Chroma against the memory-mapped NumPy store
+
+Writes the same synthetic passages into each backend: Chroma, and the mmap
+store with float16 rows, int8 rows and int8 rows with IVF lists. Vectors
+are drawn around subject centroids so they cluster like real embeddings,
+and no model is loaded, so only the stores are measured. Each backend is
+then opened in a fresh process. That process reports import and open
+time, query latency for random users, recall@10 against exact float32
+search, and resident memory after the queries, in total and the private
+(anonymous) part that mapped files do not account for. Disk usage is read
+from each store's directory. Run from the backend directory:
+    python -m benchmarks.bench_vectors
+    python -m benchmarks.bench_vectors --users 50 --docs-per-user 2000 --backends mmap_float16,mmap_int8
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.results import summarize, write_results
+
+DIMENSION = 384
+SUBJECTS = 40
+BACKENDS = {
+    # name: (store, options)
+    "chroma": ("chroma", {}),
+    "mmap_float16": ("mmap", {"dtype": "float16", "ivf_min_rows": 0}),
+    "mmap_int8": ("mmap", {"dtype": "int8", "ivf_min_rows": 0}),
+    "mmap_int8_ivf": ("mmap", {"dtype": "int8", "ivf_min_rows": 1000}),
+}
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def generate(users: int, docs_per_user: int, queries: int, seed: int):
+    """Per-user passage vectors and (user, query vector) pairs"""
+    rng = np.random.default_rng(seed)
+    centroids = unit(rng.normal(size=(SUBJECTS, DIMENSION)))
+    vectors = {}
+    for user_id in range(1, users + 1):
+        subjects = rng.choice(SUBJECTS, size=4, replace=False)  # a user studies a few subjects
+        picked = centroids[rng.choice(subjects, size=docs_per_user)]
+        vectors[user_id] = unit(picked + rng.normal(size=picked.shape) * 0.06)
+    asked = []
+    for _ in range(queries):
+        user_id = int(rng.integers(1, users + 1))
+        anchor = vectors[user_id][rng.integers(docs_per_user)]
+        asked.append((user_id, unit(anchor + rng.normal(size=DIMENSION) * 0.05)))
+    return vectors, asked
+
+
+def open_store(backend: str, directory: str, readonly: bool = False):
+    store, options = BACKENDS[backend]
+    if store == "chroma":
+        from app.services.vector_stores import ChromaStore
+        return ChromaStore(directory, readonly=readonly)
+    from app.services.vector_stores import MmapVectorStore
+    return MmapVectorStore(directory, readonly=readonly, compact_rows=0, **options)
+
+
+def _write(backend: str, directory: str, vectors, text_chars: int):
+    """Runs in a child process; returns seconds spent writing and compacting"""
+    store = open_store(backend, directory)
+    text = ("lecture transcript passage " * (text_chars // 27 + 1))[:text_chars]
+    started = time.perf_counter()
+    for user_id, matrix in vectors.items():
+        for offset in range(0, len(matrix), 500):
+            ids = [f"video_{i}" for i in range(offset, min(offset + 500, len(matrix)))]
+            store.upsert(user_id, ids, matrix[offset:offset + 500], [text] * len(ids),
+                         [{"type": "video", "id": offset + i} for i in range(len(ids))])
+    written = time.perf_counter() - started
+    store.compact()
+    return {"write_seconds": round(written, 3), "compact_seconds": round(time.perf_counter() - started - written, 3)}
+
+
+def _rss_mb(field: str = "VmRSS") -> float:
+    """Resident memory; RssAnon is private heap, RssFile is mapped file pages the kernel can drop"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return float(line.split()[1]) / 1024
+    return 0.0
+
+
+def _serve(backend: str, directory: str, asked, truth, repeat: int):
+    """Runs in a fresh process: open the store, query it, report time and memory"""
+    baseline = _rss_mb()
+    baseline_anon = _rss_mb("RssAnon")
+    started = time.perf_counter()
+    if BACKENDS[backend][0] == "chroma":
+        import chromadb  # noqa: F401  (import time is part of what a process pays to open Chroma)
+    else:
+        import app.services.vector_stores  # noqa: F401
+    imported = time.perf_counter()
+    store = open_store(backend, directory, readonly=True)
+    opened = time.perf_counter()
+
+    latencies, recalls = [], []
+    for _ in range(repeat):
+        for (user_id, query), expected in zip(asked, truth):
+            t0 = time.perf_counter()
+            found = store.query(user_id, query, 10)
+            latencies.append(time.perf_counter() - t0)
+            recalls.append(len(set(expected) & {doc_id for doc_id, _ in found}) / len(expected))
+    return {
+        "import_seconds": round(imported - started, 3),
+        "open_seconds": round(opened - imported, 4),
+        "query": summarize(latencies),
+        "recall_at_10": round(float(np.mean(recalls)), 4),
+        "rss_mb": round(_rss_mb() - baseline, 1),
+        "anon_rss_mb": round(_rss_mb("RssAnon") - baseline_anon, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def disk_mb(directory: Path) -> float:
+    return round(sum(p.stat().st_size for p in directory.rglob("*") if p.is_file()) / 2 ** 20, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--docs-per-user", type=int, default=1000)
+    parser.add_argument("--text-chars", type=int, default=1500, help="Passage length")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the queries")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="Scratch directory for the stores")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/vectors-<time>.json)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="nest-bench-vectors-")).resolve()
+    vectors, asked = generate(args.users, args.docs_per_user, args.queries, args.seed)
+    truth = [[f"video_{i}" for i in np.argsort(-(vectors[user_id] @ query))[:10]] for user_id, query in asked]
+    print(f"{args.users} users x {args.docs_per_user} passages, {DIMENSION} dimensions, in {workdir}")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for backend in [b for b in args.backends.split(",") if b]:
+        directory = workdir / backend
+        try:
+            with ctx.Pool(1) as pool:
+                written = pool.apply(_write, (backend, str(directory), vectors, args.text_chars))
+            with ctx.Pool(1) as pool:
+                served = pool.apply(_serve, (backend, str(directory), asked, truth, args.repeat))
+        except ImportError as e:
+            print(f"  {backend}: skipped ({e})")
+            continue
+        results[backend] = {**written, **served, "disk_mb": disk_mb(directory)}
+        r = results[backend]
+        print(f"  {backend:<14} open {r['import_seconds'] + r['open_seconds']:>7.3f} s  "
+              f"p50 {r['query']['p50_ms']:>7.2f} ms  p95 {r['query']['p95_ms']:>7.2f} ms  "
+              f"recall@10 {r['recall_at_10']:.3f}  RSS +{r['rss_mb']:.0f} MB  disk {r['disk_mb']} MB")
+
+    print(f"\n{'backend':<16}{'import s':>10}{'open s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'recall':>9}{'RSS MB':>9}{'anon MB':>9}{'disk MB':>9}{'write s':>9}")
+    for backend, r in results.items():
+        print(f"{backend:<16}{r['import_seconds']:>10.3f}{r['open_seconds']:>10.4f}{r['query']['p50_ms']:>10.2f}"
+              f"{r['query']['p95_ms']:>10.2f}{r['recall_at_10']:>9.3f}{r['rss_mb']:>9.1f}{r['anon_rss_mb']:>9.1f}"
+              f"{r['disk_mb']:>9.1f}{r['write_seconds']:>9.2f}")
+    write_results("vectors", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+    main()
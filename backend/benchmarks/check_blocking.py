@@ -0,0 +1,129 @@
+"""
+Blocking check: drive every hot route and fail if the event loop stalls
+
+Runs the app in-process as bench_http does, starts the loop monitor with a
+low threshold, then sends concurrent requests to the routes that touch the
+database, bcrypt, document extraction, embeddings and the LLM. Any stall
+longer than --block-ms is printed with the loop thread's stack, and the
+script exits non-zero, so a handler that blocks the loop again shows up
+with the call that did it. Run from the backend directory:
+    python -m benchmarks.check_blocking
+    python -m benchmarks.check_blocking --block-ms 25 --requests 50 --skip chat
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_http import login, make_requests, prepare, run_scenario, seed_chat_context
+
+ROUTES = ("login", "list_videos", "get_video", "related", "recommendations", "watch_progress",
+          "history", "context", "search", "upload_document", "chat")
+
+
+def make_route_requests(route: str, dataset, tokens, rng: random.Random):
+    """Request factory per route; reuses bench_http's scenarios where they exist"""
+    if route in ("login", "list_videos", "watch_progress", "chat"):
+        return make_requests(route, dataset, tokens, rng)
+    users = dataset["users"]
+    video_ids = dataset["video_ids"]
+
+    def auth():
+        return tokens[rng.choice(users)["id"]]
+
+    if route == "get_video":
+        async def request(client):
+            return await client.get(f"/api/videos/{rng.choice(video_ids)}", headers=auth())
+    elif route == "related":
+        async def request(client):
+            return await client.get(f"/api/videos/{rng.choice(video_ids)}/related")
+    elif route == "recommendations":
+        async def request(client):
+            return await client.get("/api/videos/my/recommendations", headers=auth())
+    elif route == "history":
+        async def request(client):
+            return await client.get("/api/study/history", headers=auth())
+    elif route == "context":
+        async def request(client):
+            return await client.get("/api/study/context", headers=auth())
+    elif route == "search":
+        words = [word for doc in dataset["corpus"][:20] for word in doc["title"].split() if len(word) > 4]
+
+        async def request(client):
+            return await client.get("/api/search/", params={"q": rng.choice(words)}, headers=auth())
+    elif route == "upload_document":
+        text = " ".join(doc["content"] for doc in dataset["corpus"][:3]).encode()
+
+        async def request(client):
+            return await client.post("/api/documents/upload", data={"title": "Notes"},
+                                     files={"file": ("notes.txt", text, "text/plain")}, headers=auth())
+    else:
+        raise ValueError(f"Unknown route: {route}. Available: {', '.join(ROUTES)}")
+    return request
+
+
+async def run(args):
+    import httpx
+    from app.services.executors import LoopMonitor
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="nest-check-blocking-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    app, dataset = prepare(workdir, args.users, args.videos, args.watches)
+    skipped = {r for r in args.skip.split(",") if r}
+    routes = [r for r in ROUTES if r not in skipped]
+    if "chat" in routes:
+        seed_chat_context(dataset)
+
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=120) as client:
+        tokens = {user["id"]: await login(client, user) for user in dataset["users"]}
+        requests = {route: make_route_requests(route, dataset, tokens, rng) for route in routes}
+        # Warm-up loads models and fills caches before the loop is watched
+        for request in requests.values():
+            await run_scenario(client, request, 2, 1)
+
+        failed = False
+        print(f"{'route':<18}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}{'blocks':>8}")
+        for route, request in requests.items():
+            monitor = LoopMonitor(interval_ms=args.block_ms / 4, block_ms=args.block_ms)
+            monitor.start()
+            result = await run_scenario(client, request, args.requests, args.concurrency)
+            await asyncio.sleep(monitor.interval * 2)  # let the last tick close any open stall
+            monitor.stop()
+            blocks = monitor.recent(limit=5)
+            print(f"{route:<18}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                  f"{result['errors']:>8}{len(monitor.blocks):>8}")
+            for block in blocks:
+                print(f"    blocked {block['blocked_ms']} ms:")
+                for frame in block["stack"][-8:]:
+                    print(f"      {frame}")
+            failed = failed or bool(monitor.blocks) or result["errors"] > 0
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--block-ms", type=float, default=50, help="Report loop stalls longer than this")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--skip", default="", help="Comma-separated routes to leave out, e.g. chat")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--watches", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="Scratch directory for the database and uploads")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    failed = asyncio.run(run(args))
+    print("FAIL: the event loop was blocked" if failed else "OK: no event loop stalls")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
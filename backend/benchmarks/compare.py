@@ -0,0 +1,69 @@
+"""
+Compare two benchmark result files
+
+Prints every numeric metric present in both runs with its relative change.
+Run from the backend directory:
+    python -m benchmarks.compare benchmarks/results/http-A.json benchmarks/results/http-B.json
+    python -m benchmarks.compare old.json new.json --only p95_ms --threshold 10
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict
+
+# Metrics where a larger value is an improvement; everything else is a cost
+HIGHER_IS_BETTER = ("per_second", "rps", "recall", "throughput", "cosine")
+
+
+def flatten(data, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = float(data)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--only", help="Only metrics whose name contains this text")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="Exit non-zero if any metric regresses by more than this percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.candidate) as file:
+        candidate = json.load(file)
+
+    print(f"baseline:  {baseline['environment'].get('git_commit')} {baseline['timestamp']}")
+    print(f"candidate: {candidate['environment'].get('git_commit')} {candidate['timestamp']}\n")
+
+    before = flatten(baseline["results"])
+    after = flatten(candidate["results"])
+    regressions = 0
+    width = max((len(name) for name in before), default=10)
+    for name in sorted(set(before) & set(after)):
+        if args.only and args.only not in name:
+            continue
+        old, new = before[name], after[name]
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if any(h in name for h in HIGHER_IS_BETTER) else change < 0
+        marker = ""
+        if args.threshold and abs(change) > args.threshold and not better and name.split(".")[-1] != "count":
+            marker = "  REGRESSION"
+            regressions += 1
+        print(f"{name:<{width}}  {old:>12.3f}  {new:>12.3f}  {change:>+8.1f}%{marker}")
+
+    if regressions:
+        print(f"\n{regressions} metrics regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
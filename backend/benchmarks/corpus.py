@@ -0,0 +1,95 @@
+"""
+Synthetic course corpus for retrieval benchmarks
+"""
+
+import random
+from typing import Dict, List
+
+SUBJECTS = {
+    "Mathematics": {
+        "prefix": "MATH",
+        "terms": ["eigenvalues", "matrix", "determinant", "integral", "derivative",
+                  "vector space", "linear map", "limit", "series", "convergence"],
+        "formulas": ["Cauchy-Schwarz inequality", "Taylor expansion", "Green's theorem",
+                     "Cayley-Hamilton theorem", "Stokes theorem", "Bayes rule"],
+    },
+    "Physics": {
+        "prefix": "PHYS",
+        "terms": ["momentum", "energy", "force", "field", "wave", "entropy",
+                  "acceleration", "torque", "quantum state", "oscillation"],
+        "formulas": ["Bernoulli equation", "Maxwell equations", "Schrodinger equation",
+                     "Lorentz transformation", "Hooke's law", "Snell's law"],
+    },
+    "Computer Science": {
+        "prefix": "CS",
+        "terms": ["algorithm", "complexity", "recursion", "graph", "hash table",
+                  "binary tree", "sorting", "dynamic programming", "compiler", "cache"],
+        "formulas": ["Master theorem", "Dijkstra algorithm", "Amdahl's law",
+                     "Bellman-Ford algorithm", "Huffman coding", "Kruskal algorithm"],
+    },
+    "Chemistry": {
+        "prefix": "CHEM",
+        "terms": ["molecule", "reaction", "bond", "catalyst", "equilibrium",
+                  "oxidation", "acid", "enthalpy", "orbital", "solution"],
+        "formulas": ["Arrhenius equation", "Henderson-Hasselbalch equation",
+                     "Nernst equation", "Hess's law", "ideal gas law", "Beer-Lambert law"],
+    },
+}
+
+LECTURERS = ["Okafor", "Lindqvist", "Nakamura", "Alvarez", "Petrov", "Mensah",
+             "Dubois", "Kowalski", "Haddad", "Fitzgerald", "Ramanujan", "Oyelaran"]
+
+FILLER = [
+    "In this lecture we look at {term} and how it relates to {other}.",
+    "Remember that {term} shows up again when we study {other}.",
+    "A common mistake is to confuse {term} with {other}.",
+    "Let us work through an example involving {term}.",
+    "The key intuition behind {term} is worth repeating before the exam.",
+    "We will come back to {other} next week after the problem set.",
+]
+
+
+def generate_corpus(n_docs: int = 500, sentences: int = 40, seed: int = 7) -> List[Dict]:
+    """Generate lecture transcripts, each with a unique code, lecturer and formula"""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n_docs):
+        subject = rng.choice(list(SUBJECTS))
+        spec = SUBJECTS[subject]
+        code = f"{spec['prefix']}-{100 + i}"
+        lecturer = rng.choice(LECTURERS)
+        formula = rng.choice(spec["formulas"])
+
+        lines = [f"Welcome to {code}. I am Professor {lecturer}."]
+        for _ in range(sentences):
+            term, other = rng.sample(spec["terms"], 2)
+            lines.append(rng.choice(FILLER).format(term=term, other=other))
+        lines.insert(rng.randint(1, len(lines)), f"Today we derive the {formula} step by step.")
+
+        docs.append({
+            "id": i,
+            "title": f"{code}: {subject} lecture {i}",
+            "subject": subject,
+            "code": code,
+            "lecturer": lecturer,
+            "formula": formula,
+            "content": " ".join(lines),
+        })
+    return docs
+
+
+def generate_queries(docs: List[Dict], n_queries: int = 200, seed: int = 11) -> List[Dict]:
+    """Generate queries that can only be answered by one document's exact terms"""
+    rng = random.Random(seed)
+    queries = []
+    for doc in rng.sample(docs, min(n_queries, len(docs))):
+        template = rng.choice([
+            "What did the {code} lecture say about the {formula}?",
+            "Where is the {formula} derived in {code}?",
+            "Summarize {code} please",
+        ])
+        queries.append({
+            "query": template.format(code=doc["code"], formula=doc["formula"]),
+            "relevant": f"video_{doc['id']}",
+        })
+    return queries
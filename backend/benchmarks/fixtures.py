@@ -0,0 +1,212 @@
+"""
+Synthetic fixtures for benchmarks: documents, audio and a seeded database
+
+Everything is generated from fixed seeds so two runs measure the same inputs.
+"""
+
+import math
+import random
+import shutil
+import struct
+import subprocess
+import wave
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.corpus import generate_corpus
+
+# Pages (or slides) per document size
+DOCUMENT_SIZES = {"small": 2, "medium": 20, "large": 100}
+DOCUMENT_FORMATS = ("pdf", "docx", "pptx", "txt")
+LINES_PER_PAGE = 40
+
+BENCH_PASSWORD = "bench-password"
+SAMPLE_RATE = 16000
+
+
+def page_texts(pages: int, seed: int = 5) -> List[List[str]]:
+    """Lecture-note lines for each page, from the synthetic course corpus"""
+    lines = []
+    for doc in generate_corpus(max(1, pages // 2) + 1, sentences=LINES_PER_PAGE * 2, seed=seed):
+        lines.extend(s.strip() + "." for s in doc["content"].split(".") if s.strip())
+    while len(lines) < pages * LINES_PER_PAGE:
+        lines.extend(lines)
+    return [lines[i * LINES_PER_PAGE:(i + 1) * LINES_PER_PAGE] for i in range(pages)]
+
+
+def write_pdf(path: Path, pages: List[List[str]]):
+    """Minimal text PDF (one Helvetica text block per page), no PDF library needed"""
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    font_id = 3
+    objects = {1: "<< /Type /Catalog /Pages 2 0 R >>",
+               font_id: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    next_id = 4
+    for lines in pages:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL\n" + "\n".join(
+            f"({escape(line[:110])}) Tj T*" for line in lines
+        ) + "\nET"
+        objects[content_id] = f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream"
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>")
+        kids.append(f"{page_id} 0 R")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n{objects[obj_id]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for obj_id in sorted(objects):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+
+
+def write_docx(path: Path, pages: List[List[str]]):
+    from docx import Document as DocxDocument
+    from docx.enum.text import WD_BREAK
+
+    doc = DocxDocument()
+    for lines in pages:
+        for line in lines:
+            doc.add_paragraph(line)
+        doc.paragraphs[-1].add_run().add_break(WD_BREAK.PAGE)
+    doc.save(str(path))
+
+
+def write_pptx(path: Path, pages: List[List[str]]):
+    from pptx import Presentation
+
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]  # title and content
+    for i, lines in enumerate(pages):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {i + 1}"
+        slide.placeholders[1].text = "\n".join(lines[:12])
+    presentation.save(str(path))
+
+
+def write_txt(path: Path, pages: List[List[str]]):
+    path.write_text("\n\n".join("\n".join(lines) for lines in pages), encoding="utf-8")
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "pptx": write_pptx, "txt": write_txt}
+
+
+def generate_documents(directory: Path, formats=DOCUMENT_FORMATS,
+                       sizes: Dict[str, int] = DOCUMENT_SIZES) -> List[Dict]:
+    """Write one document per format and size; returns [{"path", "format", "size", "pages"}]"""
+    directory.mkdir(parents=True, exist_ok=True)
+    documents = []
+    for size, pages in sizes.items():
+        texts = page_texts(pages)
+        for fmt in formats:
+            path = directory / f"{size}.{fmt}"
+            if not path.exists():
+                WRITERS[fmt](path, texts)
+            documents.append({"path": path, "format": fmt, "size": size, "pages": pages})
+    return documents
+
+
+def write_tone(path: Path, seconds: float, seed: int = 13):
+    """Tone with a slow pitch sweep and light noise, 16 kHz mono PCM"""
+    rng = random.Random(seed)
+    frames = bytearray()
+    for i in range(int(seconds * SAMPLE_RATE)):
+        t = i / SAMPLE_RATE
+        frequency = 180 + 60 * math.sin(2 * math.pi * 0.2 * t)
+        sample = 0.3 * math.sin(2 * math.pi * frequency * t) + rng.uniform(-0.05, 0.05)
+        frames += struct.pack("<h", int(max(-1.0, min(1.0, sample)) * 32767))
+    with wave.open(str(path), "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        out.writeframes(bytes(frames))
+
+
+def write_speech(path: Path, seconds: float) -> bool:
+    """Synthetic speech with espeak-ng when installed; False if unavailable"""
+    engine = shutil.which("espeak-ng") or shutil.which("espeak")
+    if not engine:
+        return False
+    # About 2.5 words a second at espeak's default rate
+    words = " ".join(" ".join(page) for page in page_texts(1)).split()
+    text = " ".join((words * 10)[:int(seconds * 2.5)])
+    subprocess.run([engine, "-w", str(path), text], check=True, capture_output=True)
+    return True
+
+
+def generate_audio(directory: Path, durations=(10, 30, 60), speech: bool = True) -> List[Dict]:
+    """Clips of fixed lengths; speech when espeak is available, tones otherwise"""
+    directory.mkdir(parents=True, exist_ok=True)
+    clips = []
+    for seconds in durations:
+        path = directory / f"clip_{seconds}s.wav"
+        if path.exists():
+            kind = "cached"
+        elif speech and write_speech(path, seconds):
+            kind = "speech"
+        else:
+            write_tone(path, seconds)
+            kind = "tone"
+        with wave.open(str(path), "rb") as clip:
+            duration = clip.getnframes() / clip.getframerate()
+        clips.append({"path": path, "kind": kind, "seconds": duration})
+    return clips
+
+
+def seed_database(db, users: int = 20, videos: int = 200, watches: int = 2000,
+                  seed: int = 3) -> Dict:
+    """Users, videos with transcripts and watch history; returns the login of each user"""
+    from app.auth import get_password_hash
+    from app.models import User, Video, WatchHistory
+
+    rng = random.Random(seed)
+    hashed = get_password_hash(BENCH_PASSWORD)  # bcrypt is slow; every user shares one hash
+
+    user_rows = [User(email=f"bench{i}@example.com", hashed_password=hashed,
+                      full_name=f"Bench User {i}") for i in range(users)]
+    db.add_all(user_rows)
+    db.flush()
+
+    corpus = generate_corpus(videos, sentences=30, seed=seed)
+    video_rows = [Video(
+        title=doc["title"],
+        description=f"Lecture by Professor {doc['lecturer']}",
+        file_path=f"uploads/videos/bench_{doc['id']}.mp4",
+        duration=float(rng.randint(300, 5400)),
+        subject=doc["subject"],
+        topic=doc["formula"],
+        level=rng.choice(["High School", "College"]),
+        transcript=doc["content"],
+        transcript_model="small",
+        transcript_status="completed",
+        uploader_id=rng.choice(user_rows).id,
+        views_count=rng.randint(0, 500),
+    ) for doc in corpus]
+    db.add_all(video_rows)
+    db.flush()
+
+    pairs = set()
+    while len(pairs) < min(watches, users * videos):
+        pairs.add((rng.choice(user_rows).id, rng.choice(video_rows).id))
+    db.add_all([WatchHistory(
+        user_id=user_id,
+        video_id=video_id,
+        watch_duration=float(rng.randint(30, 3600)),
+        completion_percentage=float(rng.randint(5, 100)),
+    ) for user_id, video_id in sorted(pairs)])
+    db.commit()
+
+    return {
+        "users": [{"id": u.id, "email": u.email, "password": BENCH_PASSWORD} for u in user_rows],
+        "video_ids": [v.id for v in video_rows],
+        "corpus": corpus,
+    }
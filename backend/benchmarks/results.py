@@ -0,0 +1,69 @@
+"""
+JSON result files for benchmark runs, so runs can be compared over time
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def summarize(seconds: Iterable[float]) -> Dict:
+    """Latency summary in milliseconds"""
+    values = sorted(seconds)
+    if not values:
+        return {"count": 0}
+
+    def pct(p: float) -> float:
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 3)
+
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.mean(values) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+def environment() -> Dict:
+    """Where a run happened, to tell hardware changes from code changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "git_commit": commit,
+        "git_dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(benchmark: str, params: Dict, results: Dict, output: Optional[str] = None) -> Path:
+    """Write one run to benchmarks/results/<benchmark>-<timestamp>.json (or to output)"""
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    path = Path(output) if output else RESULTS_DIR / f"{benchmark}-{stamp}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({
+            "benchmark": benchmark,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "environment": environment(),
+            "params": params,
+            "results": results,
+        }, file, indent=2, default=str)
+    print(f"\nResults written to {path}")
+    return path
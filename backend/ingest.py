@@ -0,0 +1,58 @@
+"""
+Bulk-ingest a directory or manifest of lecture videos and documents
+
+Examples:
+    python ingest.py /data/courses --owner teacher@school.edu --subject Physics
+    python ingest.py --manifest backfill.csv --owner admin@school.edu
+"""
+
+import argparse
+from pathlib import Path
+
+from app.database import init_db
+from app.services.ingest_service import Checkpoint, IngestPipeline, discover, read_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest videos and documents")
+    parser.add_argument("root", nargs="?", help="Directory to walk for videos and documents")
+    parser.add_argument("--manifest", help="CSV or JSON lines manifest instead of a directory")
+    parser.add_argument("--owner", required=True, help="Email of the user who will own the content")
+    parser.add_argument("--subject")
+    parser.add_argument("--topic")
+    parser.add_argument("--level")
+    parser.add_argument("--checkpoint", default="ingest_checkpoint.jsonl",
+                        help="Progress log used to resume an interrupted run")
+    parser.add_argument("--extract-workers", type=int, default=4)
+    parser.add_argument("--transcribe-workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--no-copy", action="store_true",
+                        help="Reference files in place instead of copying them into uploads/")
+    args = parser.parse_args()
+
+    if not args.root and not args.manifest:
+        parser.error("give a directory or --manifest")
+
+    init_db()
+
+    defaults = {k: v for k, v in
+                {"subject": args.subject, "topic": args.topic, "level": args.level}.items() if v}
+    if args.manifest:
+        items = read_manifest(Path(args.manifest), args.owner, defaults)
+    else:
+        items = discover(Path(args.root), args.owner, defaults)
+
+    pipeline = IngestPipeline(
+        Checkpoint(Path(args.checkpoint)),
+        extract_workers=args.extract_workers,
+        transcribe_workers=args.transcribe_workers,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        copy_files=not args.no_copy
+    )
+    pipeline.run(items)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Rebuild precomputed recommendations once, e.g. from cron
+
+With several API servers, set RECOMMEND_REBUILD_SECONDS=0 on them and run
+this on one node instead:
+
+    python recommend.py
+"""
+
+import argparse
+import json
+
+from app.database import SessionLocal, init_db
+from app.services.recommendation_service import recommendation_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild related-video lists and user picks")
+    parser.add_argument("--top-n", type=int, default=recommendation_service.top_n,
+                        help="Videos kept per list")
+    args = parser.parse_args()
+
+    init_db()
+    recommendation_service.top_n = args.top_n
+    db = SessionLocal()
+    try:
+        stats = recommendation_service.build(db)
+    finally:
+        db.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Production server: several API worker processes sharing one model server
+
+    python serve.py --workers 4
+    python serve.py --workers 8 --transcribe-workers 2 --port 8000
+
+run.py starts one auto-reloading process for development. This supervisor
+binds the port once and starts:
+- one model server holding the embedder, the vector store and the BM25 indexes
+  (app/services/model_server.py), so memory does not grow with --workers
+- --transcribe-workers worker.py processes that run Whisper off the job broker
+- --workers uvicorn API processes sharing the listening socket
+
+Children are started with spawn. Forking after loading torch models is
+unsafe with their threads, so the models live in one process instead of
+being shared copy-on-write.
+
+Signals:
+- SIGHUP restarts API and transcription workers one at a time. Each new
+  API worker is serving before the old one stops accepting and finishes
+  its in-flight requests.
+- SIGUSR2 also restarts the model server. Model calls wait for it to come back.
+- SIGINT or SIGTERM stops gracefully. API workers finish their requests
+  and transcription workers finish their current jobs.
+Any child that exits is started again.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+
+import uvicorn
+
+RESTART_BACKOFF_SECONDS = 5  # a child that dies sooner than this after starting is restarted after a pause
+
+
+def _child_setup(title: str, env: dict):
+    """Name the process for ps/top (Linux), apply its environment and leave restarts to the supervisor"""
+    try:
+        with open("/proc/self/comm", "w") as f:
+            f.write(title[:15])
+    except OSError:
+        pass
+    # A hangup sent to the whole process group must not take workers down with it
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+    os.environ.update(env)
+
+
+class _ApiServer(uvicorn.Server):
+    """uvicorn server that tells the supervisor once it is accepting requests"""
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.ready.set()
+
+
+def _run_api(slot: int, config: dict, sockets, env: dict, ready):
+    _child_setup(f"nest-api-{slot}", env)
+    _ApiServer(uvicorn.Config("app.main:app", **config), ready).run(sockets=sockets)
+
+
+def _run_model_server(env: dict):
+    _child_setup("nest-models", env)
+    from app.services.model_server import ModelServer
+
+    server = ModelServer()
+    signal.signal(signal.SIGINT, lambda signum, frame: server.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    server.serve()
+
+
+def _run_transcription(slot: int, concurrency: int, env: dict):
+    _child_setup(f"nest-whisper-{slot}", env)
+    from worker import run_workers
+
+    run_workers(concurrency)
+
+
+class Supervisor:
+    """Starts, restarts and stops the model server, transcription workers and API workers"""
+
+    def __init__(self, args):
+        self.args = args
+        self.ctx = multiprocessing.get_context("spawn")
+        self.processes = {}  # (role, slot) -> process
+        self.started = {}  # (role, slot) -> monotonic start time
+        self.ready = {}  # (role, slot) -> event an API worker sets once serving; held until the child reads it
+        self.retiring = []  # replaced processes still finishing their work
+        self.pending = []  # "restart", "restart_models" or "stop", appended by signal handlers
+        self.config = {"host": args.host, "port": args.port, "log_level": args.log_level,
+                       "access_log": not args.no_access_log,
+                       "timeout_graceful_shutdown": args.graceful_timeout}
+        self.socket = uvicorn.Config("app.main:app", **self.config).bind_socket()
+
+        self.models_address = ""
+        if not args.no_model_server:
+            self.models_address = os.getenv("MODEL_SERVER_ADDRESS") or os.path.join(
+                tempfile.gettempdir(), f"nest-models-{os.getpid()}.sock")
+
+    def env(self, role: str, slot: int) -> dict:
+        # An empty address makes a process load its own models
+        env = {"TRANSCRIBE_WORKERS": "0", "MODEL_SERVER_ADDRESS": self.models_address}
+        if role == "api" and slot > 0:
+            # Periodic recommendation builds and chat archiving run in the first worker only
+            env["RECOMMEND_REBUILD_SECONDS"] = "0"
+            env["CHAT_ARCHIVE_INTERVAL_SECONDS"] = "0"
+        return env
+
+    def start(self, role: str, slot: int):
+        """Start one child; returns it with an event set once an API worker is serving"""
+        ready = None
+        env = self.env(role, slot)
+        if role == "models":
+            target, args = _run_model_server, (env,)
+        elif role == "transcribe":
+            target, args = _run_transcription, (slot, self.args.transcribe_concurrency, env)
+        else:
+            ready = self.ctx.Event()
+            target, args = _run_api, (slot, self.config, [self.socket], env, ready)
+        process = self.ctx.Process(target=target, args=args, name=f"{role}-{slot}")
+        process.start()
+        self.processes[(role, slot)] = process
+        self.started[(role, slot)] = time.monotonic()
+        self.ready[(role, slot)] = ready
+        return process, ready
+
+    def wait_for_models(self) -> bool:
+        from app.services.model_server import ModelClient
+
+        client = ModelClient(self.models_address, connect_seconds=self.args.start_timeout)
+        return client.wait(self.args.start_timeout)
+
+    def replace(self, role: str, slot: int):
+        """Start a replacement, then let the old process finish its work and exit"""
+        old = self.processes.get((role, slot))
+        if role == "models":
+            # Same address, so the old server must be gone first
+            self._stop(old)
+            self.start(role, slot)
+            if not self.wait_for_models():
+                print("Error restarting model server: not answering")
+            return
+        process, ready = self.start(role, slot)
+        if ready is not None and not ready.wait(self.args.start_timeout):
+            print(f"Error restarting API worker {slot}: not ready after {self.args.start_timeout:.0f} s")
+            process.terminate()
+            self.processes[(role, slot)] = old
+            return
+        if old is not None and old.is_alive():
+            old.terminate()
+            self.retiring.append(old)
+
+    def restart_all(self, models: bool = False):
+        if models and self.models_address:
+            print("Restarting model server...")
+            self.replace("models", 0)
+        print("Restarting workers one at a time...")
+        for slot in range(self.args.transcribe_workers):
+            self.replace("transcribe", slot)
+        for slot in range(self.args.workers):
+            self.replace("api", slot)
+        print("Restart complete")
+
+    def restart_exited(self):
+        for (role, slot), process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            print(f"{role} worker {slot} exited with code {process.exitcode}; restarting")
+            if time.monotonic() - self.started[(role, slot)] < RESTART_BACKOFF_SECONDS:
+                time.sleep(RESTART_BACKOFF_SECONDS)
+            if role == "models":
+                self.replace(role, slot)
+            else:
+                self.start(role, slot)
+        self.retiring = [p for p in self.retiring if p.is_alive()]
+
+    def _stop(self, process):
+        if process is None or not process.is_alive():
+            return
+        process.terminate()
+        process.join(self.args.graceful_timeout + 5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def shutdown(self):
+        print("Stopping gracefully...")
+        for role in ("api", "transcribe", "models"):
+            processes = [p for (r, _), p in self.processes.items() if r == role]
+            if role == "api":
+                processes += self.retiring
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                self._stop(process)
+        self.socket.close()
+
+    def run(self):
+        def request(action):
+            def handler(signum, frame):
+                self.pending.append(action)
+            return handler
+
+        signal.signal(signal.SIGHUP, request("restart"))
+        signal.signal(signal.SIGUSR2, request("restart_models"))
+        signal.signal(signal.SIGINT, request("stop"))
+        signal.signal(signal.SIGTERM, request("stop"))
+
+        if self.models_address:
+            self.start("models", 0)
+            if not self.wait_for_models():
+                print(f"Error starting model server: not answering after {self.args.start_timeout:.0f} s")
+                self.shutdown()
+                return 1
+        for slot in range(self.args.transcribe_workers):
+            self.start("transcribe", slot)
+        # The first worker creates missing tables and indexes before the others import the app
+        self.start("api", 0)[1].wait(self.args.start_timeout)
+        ready = [self.start("api", slot)[1] for slot in range(1, self.args.workers)]
+        for event in ready:
+            event.wait(self.args.start_timeout)
+        print(f"Serving on http://{self.args.host}:{self.args.port} with {self.args.workers} API workers "
+              f"(supervisor pid {os.getpid()})")
+
+        while True:
+            time.sleep(0.5)
+            # Swapping the list keeps signals that arrive meanwhile for the next pass
+            actions, self.pending = self.pending, []
+            if "stop" in actions:
+                break
+            if actions:
+                self.restart_all(models="restart_models" in actions)
+            self.restart_exited()
+        self.shutdown()
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run API workers, transcription workers and a model server")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="API worker processes")
+    parser.add_argument("--transcribe-workers", type=int, default=1,
+                        help="Transcription processes; 0 when worker.py runs on media nodes")
+    parser.add_argument("--transcribe-concurrency", type=int, default=1, help="Jobs run at once per transcription process")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-model-server", action="store_true",
+                        help="Load the models in every API worker instead (more memory; for comparison)")
+    parser.add_argument("--graceful-timeout", type=float, default=30, help="Seconds a stopping worker may spend draining")
+    parser.add_argument("--start-timeout", type=float, default=300, help="Seconds to wait for a process to be ready")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", action="store_true")
+    args = parser.parse_args()
+
+    # The in-memory broker lives in one process; workers and API processes must share a queue
+    broker = os.environ.setdefault("JOB_BROKER", "database")
+    if broker == "memory":
+        parser.error("JOB_BROKER=memory cannot be shared between processes; use database or redis")
+    if args.no_model_server and os.getenv("VECTOR_STORE") == "mmap":
+        parser.error("VECTOR_STORE=mmap has one writer, the model server; drop --no-model-server")
+    if not args.no_model_server:
+        from app.services.model_server import insecure_address
+        insecure = insecure_address(os.getenv("MODEL_SERVER_ADDRESS", ""))
+        if insecure:
+            parser.error(insecure)
+
+    raise SystemExit(Supervisor(args).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Inspect, compact or fill the vector store
+
+Stop the API and model server first; the mmap store allows one writer.
+
+    python vectors.py stats
+    python vectors.py compact
+    python vectors.py copy --from chroma --to mmap
+    python vectors.py backfill   # save the store's vectors with rows that have none
+    python vectors.py rebuild    # refill the store from vectors saved with the rows, no model
+"""
+
+import argparse
+import json
+
+from app.database import SessionLocal, init_db
+from app.models import Document, User, Video
+from app.services.embedding_store import save_embeddings, stored_contexts
+from app.services.vector_stores import STORES, VECTOR_STORE, copy_store, open_vector_store
+
+BATCH = 500
+
+
+def backfill(db, store) -> dict:
+    """Copy vectors from the store into rows whose embedding column is empty"""
+    queries = (
+        ("video", db.query(Video.id, Video.uploader_id).filter(
+            Video.transcript.isnot(None), Video.transcript_embeddings.is_(None))),
+        ("document", db.query(Document.id, Document.owner_id).filter(
+            Document.content.isnot(None), Document.content_embeddings.is_(None))),
+    )
+    saved = {}
+    for kind, query in queries:
+        by_owner = {}
+        for row_id, owner_id in query:
+            by_owner.setdefault(owner_id, []).append(row_id)
+        saved[kind] = 0
+        for owner_id, ids in by_owner.items():
+            for offset in range(0, len(ids), BATCH):
+                found = store.embeddings(owner_id, [f"{kind}_{i}" for i in ids[offset:offset + BATCH]])
+                save_embeddings(db, kind, {int(doc_id.split("_", 1)[1]): v for doc_id, v in found.items()})
+                db.commit()
+                saved[kind] += len(found)
+    return saved
+
+
+def rebuild(db, store) -> dict:
+    """Write every row with a saved vector into the store, as AIService.store_contexts would"""
+    written = 0
+    for owner_id, items in stored_contexts(db, BATCH):
+        store.upsert(
+            owner_id,
+            [f"{item['type']}_{item['id']}" for item in items],
+            [item["embedding"] for item in items],
+            [item["content"] for item in items],
+            [{"type": item["type"], "id": item["id"],
+              **{k: v for k, v in item["metadata"].items() if v is not None}} for item in items]
+        )
+        written += len(items)
+    return {"written": written, **store.compact()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, compact or fill the vector store")
+    parser.add_argument("command", choices=["stats", "compact", "copy", "backfill", "rebuild"])
+    parser.add_argument("--store", default=VECTOR_STORE, choices=list(STORES),
+                        help="Store for stats, compact, backfill and rebuild (default VECTOR_STORE)")
+    parser.add_argument("--from", dest="source", default="chroma", choices=list(STORES))
+    parser.add_argument("--to", dest="target", default="mmap", choices=list(STORES))
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(open_vector_store(args.store, readonly=True).stats(), indent=2))
+    elif args.command == "compact":
+        print(json.dumps(open_vector_store(args.store).compact(), indent=2))
+    elif args.command in ("backfill", "rebuild"):
+        init_db()
+        db = SessionLocal()
+        try:
+            if args.command == "backfill":
+                result = backfill(db, open_vector_store(args.store, readonly=True))
+            else:
+                result = rebuild(db, open_vector_store(args.store))
+        finally:
+            db.close()
+        print(json.dumps(result, indent=2))
+    else:
+        if args.source == args.target:
+            parser.error("--from and --to must differ")
+        init_db()
+        db = SessionLocal()
+        try:
+            user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id)]
+        finally:
+            db.close()
+        target = open_vector_store(args.target)
+        copied = copy_store(open_vector_store(args.source, readonly=True), target, user_ids)
+        print(json.dumps({"copied": copied, "users": len(user_ids), **target.compact()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Run transcription workers against the shared job broker
+
+Start one or more of these on media nodes, with the API servers set to
+TRANSCRIBE_WORKERS=0 and every process using the same JOB_BROKER.
+Finished transcripts are indexed through the model server (serve.py) at
+MODEL_SERVER_ADDRESS, so the API's vector store, keyword index and chat
+cache see them:
+
+    JOB_BROKER=redis REDIS_URL=redis://queue:6379/0 MODEL_SERVER_ADDRESS=api:7070 \
+        python worker.py --concurrency 2
+
+--single-node instead loads the embedder here and writes to this node's
+Chroma directory. API processes on the same node then find the new
+vectors, but their keyword indexes and cached answers only catch up when
+they restart.
+"""
+
+import os
+
+import argparse
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.database import init_db
+from app.services.job_broker import JOB_BROKER, JobWorker
+from app.services.model_server import MODEL_SERVER_ADDRESS
+from app.services.telemetry import registry
+from app.services.transcription_scheduler import JOB_KIND, transcription_scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background transcription workers")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Jobs run at once by this process")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics for this worker on this port")
+    parser.add_argument("--single-node", action="store_true",
+                        help="Index transcripts in this process instead of through MODEL_SERVER_ADDRESS")
+    args = parser.parse_args()
+
+    if JOB_BROKER == "memory":
+        parser.error("JOB_BROKER=memory only serves the API process; use database or redis")
+    if not MODEL_SERVER_ADDRESS and not args.single_node:
+        parser.error("set MODEL_SERVER_ADDRESS so transcripts reach the API's vector store, "
+                     "or pass --single-node on the API's own node")
+    if args.single_node and os.getenv("VECTOR_STORE") == "mmap":
+        parser.error("VECTOR_STORE=mmap has one writer, the model server; set MODEL_SERVER_ADDRESS")
+
+    run_workers(args.concurrency, args.metrics_port)
+
+
+def run_workers(concurrency: int, metrics_port: int = 0):
+    """Poll the broker with concurrency threads until SIGINT/SIGTERM, then finish current jobs"""
+    init_db()
+
+    # The scheduler is the job handler; its own worker threads are not started
+    scheduler = transcription_scheduler
+    workers = [JobWorker(scheduler.broker, {JOB_KIND: scheduler}) for _ in range(concurrency)]
+    threads = [threading.Thread(target=w.run, name=f"worker-{i}") for i, w in enumerate(workers)]
+
+    def shutdown(signum, frame):
+        print("Stopping after the current jobs...")
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    if metrics_port:
+        serve_metrics(metrics_port)
+
+    for worker, thread in zip(workers, threads):
+        print(f"Worker {worker.worker_id} polling {scheduler.broker.name} broker")
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def serve_metrics(port: int):
+    """Expose the worker's stage histograms and model load times at /metrics"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Serving metrics on :{port}/metrics")
+
+
+if __name__ == "__main__":
+    main()
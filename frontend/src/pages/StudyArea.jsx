@@ -1,4 +1,5 @@
 import { useState, useEffect, useRef } from 'react'
+import { Link } from 'react-router-dom'
 import { sendChatMessage, getChatHistory } from '../api/api'
 import { Send, Bot, User } from 'lucide-react'
 
@@ -17,6 +18,11 @@ const StudyArea = () => {
     scrollToBottom()
   }, [messages])
 
+  const formatTimestamp = (seconds) => {
+    const minutes = Math.floor(seconds / 60)
+    return `${minutes}:${String(Math.floor(seconds % 60)).padStart(2, '0')}`
+  }
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }
@@ -66,6 +72,7 @@ const StudyArea = () => {
       const aiMessage = {
         id: Date.now() + 1,
         message: response.response,
+        citations: response.citations,
         isUser: false,
         timestamp: new Date().toISOString(),
       }
@@ -140,6 +147,21 @@ const StudyArea = () => {
                   }`}
                 >
                   <p className="whitespace-pre-wrap">{msg.message}</p>
+                  {msg.citations?.some((c) => c.type === 'video' && c.start != null) && (
+                    <div className="mt-2 flex flex-wrap gap-2 text-sm">
+                      {msg.citations
+                        .filter((c) => c.type === 'video' && c.start != null)
+                        .map((c, i) => (
+                          <Link
+                            key={i}
+                            to={`/video/${c.id}?t=${Math.floor(c.start)}`}
+                            className="text-primary-400 hover:underline"
+                          >
+                            {c.title} at {formatTimestamp(c.start)}
+                          </Link>
+                        ))}
+                    </div>
+                  )}
                 </div>
                 {msg.isUser && (
                   <div className="flex-shrink-0">
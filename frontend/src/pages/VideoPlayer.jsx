@@ -1,11 +1,13 @@
 import { useState, useEffect, useRef } from 'react'
-import { useParams, useNavigate } from 'react-router-dom'
+import { useParams, useNavigate, useSearchParams } from 'react-router-dom'
 import ReactPlayer from 'react-player'
 import { getVideo, recordWatch } from '../api/api'
 import { ArrowLeft, Clock } from 'lucide-react'
 
 const VideoPlayer = () => {
   const { id } = useParams()
+  const [searchParams] = useSearchParams()
+  const startAt = parseFloat(searchParams.get('t')) || 0
   const navigate = useNavigate()
   const [video, setVideo] = useState(null)
   const [loading, setLoading] = useState(true)
@@ -63,6 +65,13 @@ const VideoPlayer = () => {
     setPlayedSeconds(state.playedSeconds)
   }
 
+  const handleReady = () => {
+    // Deep links such as /video/12?t=305 open at that moment
+    if (startAt > 0 && playerRef.current) {
+      playerRef.current.seekTo(startAt, 'seconds')
+    }
+  }
+
   const handleDuration = (dur) => {
     setDuration(dur)
   }
@@ -113,6 +122,7 @@ const VideoPlayer = () => {
                 controls
                 width="100%"
                 height="100%"
+                onReady={handleReady}
                 onProgress={handleProgress}
                 onDuration={handleDuration}
                 onEnded={handleEnded}
@@ -6,7 +6,7 @@ import shutil
 from typing import Dict, Optional
 import asyncio
 
-from app.workers.worker_transcribe import transcribe_audio_task, get_task_status
+from app.workers.worker_transcribe import transcribe_audio_task, get_task_status, submit_task
 
 router = APIRouter()
 
@@ -52,8 +52,11 @@ async def upload_and_transcribe(file: UploadFile = File(...)):
         "error": None
     }
     
-    # Start transcription task asynchronously
-    asyncio.create_task(process_transcription(job_id, str(file_path)))
+    # Hand off to the Celery workers when configured, otherwise run in this process
+    if submit_task(job_id, str(file_path)):
+        transcription_jobs[job_id]["distributed"] = True
+    else:
+        asyncio.create_task(process_transcription(job_id, str(file_path)))
     
     return {
         "job_id": job_id,
@@ -67,21 +70,21 @@ async def get_transcription_status(job_id: str):
     """
     Check the status of a transcription job
     """
-    if job_id not in transcription_jobs:
+    job = _get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return transcription_jobs[job_id]
+    return job
 
 @router.get("/transcribe/{job_id}/result")
 async def get_transcription_result(job_id: str):
     """
     Get the full transcription result
     """
-    if job_id not in transcription_jobs:
+    job = _get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = transcription_jobs[job_id]
-    
     if job["status"] != "completed":
         raise HTTPException(
             status_code=400,
@@ -90,11 +93,28 @@ async def get_transcription_result(job_id: str):
     
     return {
         "job_id": job_id,
-        "filename": job["filename"],
+        "filename": job.get("filename"),
         "transcription": job["result"],
         "status": "completed"
     }
 
+def _get_job(job_id: str) -> Optional[dict]:
+    """
+    Job record, refreshed from the Celery result backend for distributed jobs
+    (also finds jobs queued by another API process)
+    """
+    job = transcription_jobs.get(job_id)
+    if job is not None and not job.get("distributed"):
+        return job
+    
+    status = get_task_status(job_id)
+    if status["status"] == "unknown":
+        return job
+    if job is None:
+        return status
+    job.update(status)
+    return job
+
 async def process_transcription(job_id: str, file_path: str):
     """
     Process transcription in background
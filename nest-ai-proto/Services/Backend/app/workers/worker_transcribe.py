@@ -2,6 +2,8 @@ import whisper
 import torch
 from pathlib import Path
 import logging
+import os
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -10,6 +12,46 @@ logger = logging.getLogger(__name__)
 # Global model instance (loaded once on startup)
 model = None
 
+# CPU inference settings
+# WHISPER_BACKEND: "whisper" (fp32) or "whisper_int8" (dynamic int8 quantization, CPU only)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "whisper")
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))  # 0 = torch default
+
+# Distributed workers: set CELERY_BROKER_URL (e.g. redis://localhost:6379/0) and run
+#   celery -A app.workers.worker_transcribe worker --concurrency 1
+# on each media node. Without it, transcription runs in the API process.
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+# A task not acknowledged within this many seconds is redelivered to another
+# worker, so it must exceed the longest transcription
+CELERY_VISIBILITY_TIMEOUT = int(os.getenv("CELERY_VISIBILITY_TIMEOUT", "7200"))
+
+celery_app = None
+if CELERY_BROKER_URL:
+    from celery import Celery
+
+    celery_app = Celery("nest_transcribe", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+    celery_app.conf.update(
+        task_acks_late=True,  # acknowledge after the work is done, not when received
+        task_reject_on_worker_lost=True,  # a killed worker's task goes back on the queue
+        task_track_started=True,
+        worker_prefetch_multiplier=1,  # one long job at a time per worker process
+        broker_transport_options={"visibility_timeout": CELERY_VISIBILITY_TIMEOUT},
+        worker_send_task_events=True,  # heartbeats and task events for monitoring
+        result_extended=True,
+    )
+
+
+def configure_threads(threads: int = WHISPER_THREADS):
+    """Pin intra-op threads for this worker; one inter-op thread per decode"""
+    if threads <= 0:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # can only be set before torch starts parallel work
+
 def load_whisper_model(model_name: str = "base"):
     """
     Load Whisper model on worker startup
@@ -22,18 +64,30 @@ def load_whisper_model(model_name: str = "base"):
         device = "cuda" if torch.cuda.is_available() else "cpu"
         logger.info(f"Using device: {device}")
         
-        model = whisper.load_model(model_name, device=device)
-        logger.info(f"Whisper model {model_name} loaded successfully")
+        configure_threads()
+        started = time.perf_counter()
+        if WHISPER_BACKEND == "whisper_int8" and device == "cpu":
+            model = whisper.load_model(model_name, device="cpu")
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        else:
+            model = whisper.load_model(model_name, device=device)
+        logger.info(
+            f"Whisper model {model_name} ({WHISPER_BACKEND}) loaded in "
+            f"{time.perf_counter() - started:.1f}s with {torch.get_num_threads()} threads"
+        )
     
     return model
 
-def transcribe_audio_task(file_path: str, language: str = None) -> dict:
+def transcribe_audio_task(file_path: str, language: str = None, progress=None) -> dict:
     """
     Transcribe audio/video file using Whisper
     
     Args:
         file_path: Path to audio/video file
         language: Optional language code (en, es, fr, etc.). Auto-detect if None
+        progress: Optional callback taking a 0-100 progress value
     
     Returns:
         Dictionary with transcription text and metadata
@@ -41,13 +95,16 @@ def transcribe_audio_task(file_path: str, language: str = None) -> dict:
     try:
         # Ensure model is loaded
         whisper_model = load_whisper_model()
+        if progress:
+            progress(20)
         
         logger.info(f"Starting transcription for: {file_path}")
         
         # Transcribe with Whisper
         transcribe_options = {
             "verbose": False,
-            "task": "transcribe"
+            "task": "transcribe",
+            "fp16": torch.cuda.is_available()
         }
         
         if language:
@@ -75,13 +132,72 @@ def transcribe_audio_task(file_path: str, language: str = None) -> dict:
         logger.error(f"Transcription failed for {file_path}: {str(e)}")
         raise
 
+if celery_app is not None:
+    @celery_app.task(bind=True, name="nest.transcribe")
+    def transcribe_celery_task(self, file_path: str, language: str = None) -> dict:
+        """Celery entry point; progress is published as task state PROGRESS"""
+        def progress(value: int):
+            self.update_state(state="PROGRESS", meta={"progress": value})
+
+        progress(10)
+        return transcribe_audio_task(file_path, language, progress=progress)
+
+
+# Celery task states mapped to the job statuses used by the API. PENDING is
+# left out: Celery reports it for any id it has no record of, and
+# submit_task records RECEIVED first, so only ids it never issued are PENDING
+CELERY_STATUS = {
+    "RECEIVED": "queued",
+    "RETRY": "queued",
+    "STARTED": "processing",
+    "PROGRESS": "processing",
+    "SUCCESS": "completed",
+    "FAILURE": "failed",
+    "REVOKED": "failed",
+}
+
+
+def submit_task(task_id: str, file_path: str, language: str = None) -> bool:
+    """
+    Queue a transcription on the Celery workers
+    Returns False when no broker is configured and the caller should run it locally
+    """
+    if celery_app is None:
+        return False
+    # Record the id before the worker can start, so status lookups can tell it from a made-up one
+    celery_app.backend.store_result(task_id, None, "RECEIVED")
+    transcribe_celery_task.apply_async(args=[file_path, language], task_id=task_id)
+    return True
+
+
 def get_task_status(task_id: str):
     """
-    Get status of a transcription task
-    This is a placeholder - in production use Celery task.AsyncResult
+    Get status of a transcription task from the Celery result backend
+    Returns status "unknown" for ids that submit_task never queued
     """
-    # Placeholder for task status checking
-    return {"status": "unknown"}
+    if celery_app is None:
+        return {"status": "unknown"}
+
+    result = celery_app.AsyncResult(task_id)
+    if result.state not in CELERY_STATUS:
+        return {"status": "unknown"}
+    status = {
+        "job_id": task_id,
+        "status": CELERY_STATUS[result.state],
+        "progress": 0,
+        "result": None,
+        "error": None
+    }
+    if result.state == "PROGRESS" and isinstance(result.info, dict):
+        status["progress"] = result.info.get("progress", 0)
+    elif result.state == "STARTED":
+        status["progress"] = 10
+    elif result.state == "SUCCESS":
+        status["progress"] = 100
+        status["result"] = result.result
+    elif result.state == "FAILURE":
+        status["error"] = str(result.info)
+    return status
 
 # Pre-load model on module import (optional - can be lazy loaded)
 # Uncomment to pre-load on startup: